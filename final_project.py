@@ -6,11 +6,64 @@ Reads in event data about pandemics and wars, as well as data from the United St
 Gross Domestic Product (GPD), and stock market S&P500 and Dow Jones.  Then creates a series of plots combining
 these data sets.
 """
+import io
+import os
+import ast
+import json
+import argparse
+import contextlib
+import hashlib
+import inspect
 import numpy as np
 import pandas as pd
 from datetime import date
-from typing import Union, Literal
-import matplotlib.pyplot as plt
+from typing import Union, Literal, Callable
+from concurrent.futures import ProcessPoolExecutor
+import importlib
+from final_project_cache import read_csv_cached, window_cache, series_key, window_cache_bytes, WINDOW_CACHE_ENV_VAR
+from final_project_intervals import resolve_overlaps
+from final_project_profile import profile_stage, start_profiling, stop_profiling, summary_table, write_trace, \
+    profile_file_from_environment, profiling_enabled, add_records, profile_clock
+
+# Roughly the number of days the stock market is open in a year, used to size windows of daily data
+TRADING_DAYS_PER_YEAR = 252
+
+# Records a fingerprint of the inputs of every plot drawn, so unchanged plots can be skipped (see render_plots())
+PLOT_MANIFEST = 'Plots/.manifest.json'
+
+# The analyses that can be run, and the data files they use by default
+ANALYSES = ['index', 'gdp', 'cpi']
+DEFAULT_INPUTS = {'events': 'data/event_facts.csv', 'cpi': 'data/bls_us_cpi.csv', 'gdp': 'data/gdp_usafacts.csv',
+                  'sp500': 'data/sp500_monthly.csv', 'dowjones': 'data/dow_jone_monthly.csv'}
+DAILY_INDEX_INPUTS = {'sp500': 'data/sp_500_index_daily.csv', 'dowjones': 'data/dow_jones_industrial_average_daily.csv'}
+
+# The fatality buckets used in the events file, from least to most, and the fewest deaths in each bucket
+FATALITY_BUCKETS = ['<10,000', '10,000-1m', '1-10m', '10-100m', '>100m']
+FATALITY_LOWER_BOUNDS = np.array([0, 10 ** 4, 10 ** 6, 10 ** 7, 10 ** 8])
+
+# The GDP components plotted for each event, by the names used in the plots and their line items in gdp_usafacts.csv
+GDP_COMPONENTS = {'GDP': 'Gross domestic product ($)',
+                  'Personal consumption expenditures': 'Personal consumption expenditures ($)',
+                  'Gross private domestic investment': 'Gross private domestic investment ($)',
+                  'Government consumption expenditures and gross investment':
+                      'Government consumption expenditures and gross investment ($)'}
+
+# Country codes of the regional and income group aggregates in the World Data Bank files, which aren't countries
+WORLDDB_AGGREGATE_CODES = frozenset([
+    'AFE', 'AFW', 'ARB', 'CSS', 'CEB', 'EAR', 'EAS', 'EAP', 'TEA', 'EMU', 'ECS', 'ECA', 'TEC', 'EUU', 'FCS', 'HPC',
+    'HIC', 'IBD', 'IBT', 'IDB', 'IDX', 'IDA', 'LTE', 'LCN', 'LAC', 'TLA', 'LDC', 'LMY', 'LIC', 'LMC', 'MEA', 'MNA',
+    'TMN', 'MIC', 'NAC', 'INX', 'OED', 'OSS', 'PSS', 'PST', 'PRE', 'SST', 'SAS', 'TSA', 'SSF', 'SSA', 'TSS', 'UMC',
+    'WLD'])
+
+# Compiled versions of the hot loops, if they have been built with "python setup.py build_ext --inplace"
+try:
+    from final_project_cython import final_project_cython_functions as compiled_kernels
+except ImportError:
+    compiled_kernels = None
+
+# Chooses between the compiled and pure Python kernels at startup: "auto", "cython" or "python" (see set_kernels())
+KERNELS_ENV_VAR = 'FINAL_PROJECT_KERNELS'
+use_compiled_kernels = False
 
 
 def min_max_year_checking(min_year: int = None, min_year_possible: int = None, max_year: Union[int, None] = None,
@@ -64,9 +117,261 @@ def min_max_year_checking(min_year: int = None, min_year_possible: int = None, m
         raise ValueError('Invalid years: Minimum year must be less than maximum year.')
 
 
+def parse_fatalities(fatalities: pd.Series) -> pd.Categorical:
+    """ Converts the fatality buckets of the events file into an ordered categorical, so that they can be compared and
+    sorted from least to most deaths.
+
+    :param fatalities: The Fatalities column as text
+    :return: The column as an ordered categorical of FATALITY_BUCKETS
+    >>> parse_fatalities(pd.Series(['1-10m', '<10,000'])) > '10,000-1m'
+    array([ True, False])
+    >>> parse_fatalities(pd.Series(['1-10m', 'lots']))
+    Traceback (most recent call last):
+    ...
+    ValueError: Invalid fatalities given: lots. Valid fatalities: <10,000, 10,000-1m, 1-10m, 10-100m, >100m
+    """
+    parsed = pd.Categorical(fatalities, categories=FATALITY_BUCKETS, ordered=True)
+    invalid = pd.unique(fatalities[(parsed.codes < 0) & fatalities.notna().to_numpy(dtype=bool)])
+    if len(invalid) > 0:
+        raise ValueError('Invalid fatalities given: ' + ', '.join(invalid) + '. Valid fatalities: ' +
+                         ', '.join(FATALITY_BUCKETS))
+    return parsed
+
+
+def fatality_codes(fatalities: pd.Series) -> np.ndarray:
+    """ Ranks fatality buckets, from 0 for the fewest deaths up (and -1 for missing ones), so that thresholds are
+    integer comparisons.
+
+    :param fatalities: A Fatalities column, as text or as parsed by parse_fatalities()
+    :return: The rank of each bucket in FATALITY_BUCKETS
+    >>> fatality_codes(pd.Series(['>100m', '<10,000', None]))
+    array([ 4,  0, -1], dtype=int8)
+    """
+    if isinstance(fatalities.dtype, pd.CategoricalDtype) and list(fatalities.cat.categories) == FATALITY_BUCKETS:
+        return fatalities.cat.codes.to_numpy()
+    return parse_fatalities(fatalities).codes
+
+
+def fatality_code_range(min_fatalities: Union[int, None] = None, max_fatalities: Union[int, None] = None) -> tuple:
+    """ Finds the fatality buckets lying wholly within a range of deaths.
+
+    :param min_fatalities: The fewest deaths, or None for no limit
+    :param max_fatalities: The most deaths, or None for no limit
+    :return: The lowest and highest bucket codes (see fatality_codes()) in the range
+    >>> fatality_code_range(min_fatalities=10 ** 6)  # '1-10m' and up
+    (2, 4)
+    >>> fatality_code_range(10 ** 4, 10 ** 7)  # '10,000-1m' and '1-10m'
+    (1, 2)
+    >>> fatality_code_range(10 ** 7, 10 ** 6)
+    Traceback (most recent call last):
+    ...
+    ValueError: Invalid fatalities: Minimum fatalities must be less than maximum fatalities.
+    """
+    if min_fatalities is not None and max_fatalities is not None and min_fatalities > max_fatalities:
+        raise ValueError('Invalid fatalities: Minimum fatalities must be less than maximum fatalities.')
+
+    # A bucket is in the range if its fewest deaths are at least the minimum, and the next bucket's are at most the
+    # maximum (the last bucket has no upper bound)
+    lowest = 0 if min_fatalities is None else int(np.searchsorted(FATALITY_LOWER_BOUNDS, min_fatalities, 'left'))
+    if max_fatalities is None:
+        highest = len(FATALITY_BUCKETS) - 1
+    else:
+        highest = int(np.searchsorted(FATALITY_LOWER_BOUNDS, max_fatalities, 'right')) - 2
+    return lowest, highest
+
+
+def fatality_strata(fatalities: pd.Series) -> dict:
+    """ Splits events by fatality bucket, with a single sort of the bucket codes rather than a selection per bucket.
+
+    :param fatalities: A Fatalities column, as text or as parsed by parse_fatalities()
+    :return: The positions of the events in each bucket that has any, from least to most deaths
+    >>> fatality_strata(pd.Series(['1-10m', '<10,000', '1-10m', '>100m']))
+    {'<10,000': array([1]), '1-10m': array([0, 2]), '>100m': array([3])}
+    """
+    codes = fatality_codes(fatalities)
+    order = np.argsort(codes, kind='stable')
+    counts = np.bincount(codes[codes >= 0], minlength=len(FATALITY_BUCKETS))
+    ends = np.cumsum(counts) + np.count_nonzero(codes < 0)
+    return {bucket: order[end - count:end] for bucket, count, end in zip(FATALITY_BUCKETS, counts, ends) if count}
+
+
+# Event catalogs by file path, along with the file's modification time and size when it was loaded
+event_catalogs = {}
+
+
+class EventCatalog:
+    """ The events from an events file, loaded once and indexed for filtering.  Type and Range are kept as integer codes
+    with a mask of the events for each code, Fatalities as an ordered categorical whose codes rank the buckets (see
+    fatality_codes()), and the start and end years are kept sorted, so a filter is a few binary searches, integer
+    comparisons and the intersection of a few masks.  Selections are arrays of row positions, which are only turned
+    into a dataframe by frame().
+
+    >>> catalog = EventCatalog.load('data/event_facts.csv')
+    >>> catalog is EventCatalog.load('data/event_facts.csv')
+    True
+    >>> catalog.type_names, catalog.range_names
+    (['Pandemics', 'War'], ['Affect United States'])
+    >>> catalog.select(types='War', min_start_year=1950, max_start_year=1990)
+    array([12, 13, 15])
+    >>> catalog.select(types='War', min_fatalities=10 ** 6)
+    array([11, 12, 13, 14, 19])
+    >>> catalog.frame(catalog.select(max_end_year=1919))[['Event_Name', 'Start_Year', 'End_Year']]
+         Event_Name  Start_Year  End_Year
+    11  World War I        1914      1918
+    """
+    def __init__(self, df: pd.DataFrame):
+        """ Indexes the events.
+
+        :param df: The events file as read in, with a default index
+        """
+        df["Duration"] = df["End_Year"] - df["Start_Year"]
+        df["Fatalities"] = parse_fatalities(df["Fatalities"])
+        self.df = df
+
+        # Integer codes (numbered in order of first appearance) and a mask of the events for each code
+        self.type_codes, self.type_names = self.encode(df['Type'])
+        self.range_codes, self.range_names = self.encode(df['Range'])
+        self.fatality_codes = fatality_codes(df['Fatalities'])
+        self.type_masks = [self.type_codes == code for code in range(len(self.type_names))]
+        self.range_masks = [self.range_codes == code for code in range(len(self.range_names))]
+
+        # Years in sorted order, along with the positions of the events they belong to
+        self.start_order = np.argsort(df['Start_Year'].to_numpy(), kind='stable')
+        self.start_years = df['Start_Year'].to_numpy()[self.start_order]
+        self.end_order = np.argsort(df['End_Year'].to_numpy(), kind='stable')
+        self.end_years = df['End_Year'].to_numpy()[self.end_order]
+
+    @staticmethod
+    def encode(column: pd.Series) -> tuple:
+        """ Converts a text column into integer codes.
+
+        :param column: The column
+        :return: The code of each value (-1 for missing ones), and the values for the codes in order
+        """
+        codes, names = pd.factorize(column)
+        return codes, [str(name) for name in names]
+
+    @classmethod
+    def load(cls, filename: str) -> 'EventCatalog':
+        """ Returns the catalog for an events file, only reading the file again if it has changed since it was last
+        loaded.
+
+        :param filename: The csv file of events
+        :return: The catalog
+        """
+        stat = os.stat(filename)
+        key = os.path.abspath(filename)
+        cached = event_catalogs.get(key)
+        if cached and cached['mtime'] == stat.st_mtime_ns and cached['size'] == stat.st_size:
+            return cached['catalog']
+
+        df = read_csv_cached(filename, usecols=['Event_Name', 'Type', 'Range', 'Start_Year', 'End_Year', 'Fatalities'],
+                             dtype={'Event_Name': 'string', 'Type': 'string', 'Range': 'string', 'Start_Year': 'int16',
+                                    'End_Year': 'int16', 'Fatalities': 'string'})
+        catalog = cls(df)
+        event_catalogs[key] = {'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'catalog': catalog}
+        return catalog
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def year_mask(self, order: np.ndarray, years: np.ndarray, min_year: Union[int, None],
+                  max_year: Union[int, None]) -> np.ndarray:
+        """ Finds the events with a year in a range, with binary searches of the sorted years.
+
+        :param order: The positions of the events in the order of their sorted years
+        :param years: The sorted years
+        :param min_year: The earliest year, or None for no limit
+        :param max_year: The latest year, or None for no limit
+        :return: A mask of the events in the range
+        """
+        first = np.searchsorted(years, min_year, side='left') if min_year else 0
+        last = np.searchsorted(years, max_year, side='right') if max_year else len(years)
+        mask = np.zeros(len(years), dtype=bool)
+        mask[order[first:last]] = True
+        return mask
+
+    @staticmethod
+    def code_mask(masks: list, names: list, wanted: list) -> np.ndarray:
+        """ Combines the masks of several codes.
+
+        :param masks: The mask of the events for each code
+        :param names: The value for each code
+        :param wanted: The values wanted
+        :return: A mask of the events with one of the values
+        """
+        mask = np.zeros(len(masks[0]) if masks else 0, dtype=bool)
+        for code, name in enumerate(names):
+            if name in wanted:
+                mask |= masks[code]
+        return mask
+
+    def select(self, types: Union[str, list] = None, ranges: Union[str, list] = None,
+               min_start_year: Union[int, None] = None, max_start_year: Union[int, None] = None,
+               min_end_year: Union[int, None] = None, max_end_year: Union[int, None] = None,
+               min_fatalities: Union[int, None] = None, max_fatalities: Union[int, None] = None) -> np.ndarray:
+        """ Selects events by type, range, years and fatalities, the same way as read_event_facts() (which also checks
+        the years).
+
+        :param types: The types of events
+        :param ranges: The geographical range impacted
+        :param min_start_year: Minimum start year to filter by
+        :param max_start_year: Maximum start year to filter by
+        :param min_end_year: Minimum end year to filter by
+        :param max_end_year: Maximum end year to filter by
+        :param min_fatalities: Only events in buckets of at least this many deaths (see fatality_code_range())
+        :param max_fatalities: Only events in buckets of at most this many deaths
+        :return: The positions of the selected events, in the order of the file
+        """
+        mask = np.ones(len(self), dtype=bool)
+
+        # If types were given, convert to a list and error if invalid ones are given
+        if types:
+            if isinstance(types, str):
+                types = [types]
+
+            invalid_types = np.setdiff1d(types, self.type_names)
+            if len(invalid_types) > 0:
+                raise ValueError('Invalid type(s) given: ' + ', '.join(invalid_types) + '. Valid type(s): ' +
+                                 ', '.join(self.type_names))
+            mask &= self.code_mask(self.type_masks, self.type_names, types)
+
+        # Same for ranges, where the valid ones are those of the events of the types selected
+        if ranges:
+            if isinstance(ranges, str):
+                ranges = [ranges]
+
+            valid_codes = pd.unique(self.range_codes[mask])
+            valid_ranges = [self.range_names[code] for code in valid_codes if code >= 0]
+            invalid_ranges = np.setdiff1d(ranges, valid_ranges)
+            if len(invalid_ranges) > 0:
+                raise ValueError('Invalid range(s) given: ' + ', '.join(invalid_ranges) + '. Valid ranges(s): ' +
+                                 ', '.join(valid_ranges))
+            mask &= self.code_mask(self.range_masks, self.range_names, ranges)
+
+        if min_start_year or max_start_year:
+            mask &= self.year_mask(self.start_order, self.start_years, min_start_year, max_start_year)
+        if min_end_year or max_end_year:
+            mask &= self.year_mask(self.end_order, self.end_years, min_end_year, max_end_year)
+        if min_fatalities is not None or max_fatalities is not None:
+            lowest, highest = fatality_code_range(min_fatalities, max_fatalities)
+            mask &= (self.fatality_codes >= lowest) & (self.fatality_codes <= highest)
+
+        return np.flatnonzero(mask)
+
+    def frame(self, positions: np.ndarray) -> pd.DataFrame:
+        """ Creates a dataframe of selected events.
+
+        :param positions: The positions of the events, from select()
+        :return: A new dataframe of the events, with their index from the file
+        """
+        return self.df.take(positions)
+
+
 def read_event_facts(filename: str, types: Union[str, list] = None, ranges: Union[str, list] = None,
                      min_start_year: Union[int, None] = None, max_start_year: Union[int, None] = None,
-                     min_end_year: Union[int, None] = None, max_end_year: Union[int, None] = None) -> pd.DataFrame:
+                     min_end_year: Union[int, None] = None, max_end_year: Union[int, None] = None,
+                     min_fatalities: Union[int, None] = None, max_fatalities: Union[int, None] = None) -> pd.DataFrame:
     """ Reads in a csv file of events with the below format and optionally filters it by years, types, and ranges.
     Converts it into a Pandas dataframe and returns it after calculating a Duration column
 
@@ -83,7 +388,10 @@ def read_event_facts(filename: str, types: Union[str, list] = None, ranges: Unio
     :param max_start_year: Maximum start year to filter by
     :param min_end_year: Minimum end year to filter by
     :param max_end_year: Maximum end year to filter by
-    :return: A pandas dataframe from the events file
+    :param min_fatalities: Only events whose fatality bucket is at least this many deaths (e.g. 10 ** 6 for '1-10m' and
+                           up)
+    :param max_fatalities: Only events whose fatality bucket is at most this many deaths
+    :return: A pandas dataframe from the events file, with Fatalities as an ordered categorical (see parse_fatalities())
 
     >>> read_event_facts('test.txt')  # doctest: +ELLIPSIS
     Traceback (most recent call last):
@@ -133,7 +441,23 @@ def read_event_facts(filename: str, types: Union[str, list] = None, ranges: Unio
     15                 Gulf War        1990      1991
     """
 
-    # Raise an error if one of the optional year parameters given is invalid
+    check_event_year_filters(min_start_year, max_start_year, min_end_year, max_end_year)
+
+    catalog = EventCatalog.load(filename)
+    return catalog.frame(catalog.select(types, ranges, min_start_year, max_start_year, min_end_year, max_end_year,
+                                        min_fatalities, max_fatalities))
+
+
+def check_event_year_filters(min_start_year: Union[int, None] = None, max_start_year: Union[int, None] = None,
+                             min_end_year: Union[int, None] = None, max_end_year: Union[int, None] = None) -> None:
+    """ Raises an error if one of the optional year filters of read_event_facts() is invalid.
+
+    :param min_start_year: Minimum start year to filter by
+    :param max_start_year: Maximum start year to filter by
+    :param min_end_year: Minimum end year to filter by
+    :param max_end_year: Maximum end year to filter by
+    :return: None but raises a ValueError for invalid years
+    """
     try:
         min_max_year_checking(min_year=min_start_year, max_year=max_start_year)
     except ValueError as e:
@@ -143,66 +467,32 @@ def read_event_facts(filename: str, types: Union[str, list] = None, ranges: Unio
     except ValueError as e:
         raise ValueError('Invalid end year value(s):  {}'.format(str(e)))
 
-    df = pd.read_csv(filename, usecols=['Event_Name', 'Type', 'Range', 'Start_Year', 'End_Year', 'Fatalities'],
-                     dtype={'Event_Name': 'string', 'Type': 'string', 'Range': 'string', 'Start_Year': 'int16',
-                            'End_Year': 'int16', 'Fatalities': 'string'})
-
-    # If types were given, convert to a list and error if invalid ones are given
-    if types:
-        if isinstance(types, str):
-            types = [types]
-
-        # Find any given types that are not actually present in the dataset
-        valid_types = list(df['Type'].unique())
-        invalid_types = np.setdiff1d(types, valid_types)
-        if len(invalid_types) > 0:
-            raise ValueError('Invalid type(s) given: ' + ', '.join(invalid_types) + '. Valid type(s): ' +
-                             ', '.join(valid_types))
-
-        relevant_types = df['Type'].isin(types)  # Filter down to the ones we want
-        df = df[relevant_types]
-
-    # If ranges are given, convert to a list and error if invalid ones are given
-    if ranges:
-        if isinstance(ranges, str):
-            ranges = [ranges]
-
-        # Find any given types that are not actually present in the dataset
-        valid_ranges = list(df['Range'].unique())
-        invalid_ranges = np.setdiff1d(ranges, valid_ranges)
-        if len(invalid_ranges) > 0:
-            raise ValueError('Invalid range(s) given: ' + ', '.join(invalid_ranges) + '. Valid ranges(s): ' +
-                             ', '.join(valid_ranges))
-
-        relevant_ranges = df['Range'].isin(ranges)  # Filter down to the ones we want
-        df = df[relevant_ranges]
-
-    # Filter by starting year if applicable
-    if min_start_year or max_start_year:
-        # Find the minimum and maximum years if one of these wasn't given as a parameter
-        if not min_start_year:
-            min_start_year = int(df['Start_Year'].min())
-        elif not max_start_year:
-            max_start_year = int(df['Start_Year'].max())
-
-        df = df[df['Start_Year'] >= min_start_year]
-        df = df[df['Start_Year'] <= max_start_year]
-
-    # Filter by ending year if applicable
-    if min_end_year or max_end_year:
-        # Find the minimum and maximum years if one of these wasn't given as a parameter
-        if not min_end_year:
-            min_end_year = int(df['End_Year'].min())
-        elif not max_end_year:
-            max_end_year = int(df['End_Year'].max())
 
-        df = df[df['End_Year'] >= min_end_year]
-        df = df[df['End_Year'] <= max_end_year]
-
-    # Add duration column
-    df["Duration"] = df["End_Year"] - df["Start_Year"]
+def zero_point_years(e_df: pd.DataFrame, t0: Literal['start_year', 'end_year', 'year_before_end_year',
+                                                     'year_after_start_year']) -> pd.Series:
+    """
+    Finds the year used as the zero point for each event.
+    :param e_df: the pd.DataFrame storing the event facts
+    :param t0: the specific year used as the zero point, one of "start_year", "end_year", "year_before_end_year" or
+    "year_after_start_year"
+    :return: the zero point year of each event
+    >>> df = pd.DataFrame({'Start_Year': [1950, 1999], 'End_Year': [1950, 2000]})
+    >>> zero_point_years(df, 'year_before_end_year').tolist()
+    [1949, 1999]
+    """
+    zero_points = ["start_year", "end_year", "year_before_end_year", "year_after_start_year"]
 
-    return df
+    # Select starting year (y0) based on the t0 parameter
+    if t0 == zero_points[0]:
+        return e_df["Start_Year"]
+    elif t0 == zero_points[1]:
+        return e_df["End_Year"]
+    elif t0 == zero_points[2]:
+        return e_df["End_Year"] - 1
+    elif t0 == zero_points[3]:
+        return e_df["Start_Year"] + 1
+    else:
+        raise ValueError('y0 must be one of ' + ', '.join(zero_points))
 
 
 def add_time_range(e_df: pd.DataFrame, t0: Literal['start_year', 'end_year', 'year_before_end_year',
@@ -217,7 +507,8 @@ def add_time_range(e_df: pd.DataFrame, t0: Literal['start_year', 'end_year', 'ye
     :param length: the number of years to study before and after t0
     :param add_extra_yr_before: Indicates whether an extra year should be added before the beginning
             (to account for pct_change)
-    :return: the event facts dataframe with two extra columns storing the start year and end year for further study
+    :return: a copy of the event facts dataframe with two extra int16 columns storing the start year and end year for
+    further study (the dataframe given is left as it is)
     >>> df = pd.DataFrame({'Events': ['Event A', 'Event B', 'Event C'], 'Start_Year': [1950, 1999, 2001], \
                            'End_Year': [1950, 2000, 2010]})
     >>> add_time_range(df, 'invalid_input', 5)  # doctest: +ELLIPSIS
@@ -248,29 +539,17 @@ def add_time_range(e_df: pd.DataFrame, t0: Literal['start_year', 'end_year', 'ye
     0  Event A        1950      1950     1949   1949
     1  Event B        1999      2000     1999   1999
     2  Event C        2001      2010     2009   2009
+    >>> list(df.columns)
+    ['Events', 'Start_Year', 'End_Year']
     """
-    zero_points = ["start_year", "end_year", "year_before_end_year", "year_after_start_year"]
-
-    # Select starting year (y0) based on the t0 parameter
-    if t0 == zero_points[0]:
-        y0 = e_df["Start_Year"]
-    elif t0 == zero_points[1]:
-        y0 = e_df["End_Year"]
-    elif t0 == zero_points[2]:
-        y0 = e_df["End_Year"] - 1
-    elif t0 == zero_points[3]:
-        y0 = e_df["Start_Year"] + 1
-    else:
-        raise ValueError('y0 must be one of ' + ', '.join(zero_points))
+    y0 = zero_point_years(e_df, t0)
 
     if add_extra_yr_before:
-        e_df["y_start"] = y0 - length - 1
+        y_start = y0 - length - 1
     else:
-        e_df["y_start"] = y0 - length
-    e_df["y_end"] = y0 + length
-    e_df.astype({'y_start': 'int16', 'y_end': 'int16'})
+        y_start = y0 - length
 
-    return e_df
+    return e_df.assign(y_start=y_start, y_end=y0 + length).astype({'y_start': 'int16', 'y_end': 'int16'})
 
 
 def trim_to_years(df: pd.DataFrame, start_year: int, end_year: int, year_col_name: str = 'Year',
@@ -378,11 +657,179 @@ def trim_to_years(df: pd.DataFrame, start_year: int, end_year: int, year_col_nam
     return df_selected
 
 
-def add_mean_and_quartiles(df: pd.DataFrame) -> pd.DataFrame:
+def set_kernels(kind: Literal['auto', 'cython', 'python'] = 'auto') -> str:
+    """ Chooses whether extract_windows(), pct_change_windows() and row_statistics() use the compiled kernels from
+    final_project_cython or the pure Python (numpy) versions.  Both give the same results.
+
+    :param kind: "cython" to require the compiled kernels, "python" to not use them, or "auto" to use them if built
+    :return: The kind of kernels now in use, "cython" or "python"
+
+    >>> set_kernels('python')
+    'python'
+    >>> set_kernels('fortran')
+    Traceback (most recent call last):
+    ...
+    ValueError: Kernels must be one of 'auto', 'cython' or 'python'
+    >>> _ = set_kernels(os.environ.get(KERNELS_ENV_VAR, 'auto'))
+    """
+    global use_compiled_kernels
+    if kind not in ('auto', 'cython', 'python'):
+        raise ValueError("Kernels must be one of 'auto', 'cython' or 'python'")
+    if kind == 'cython' and compiled_kernels is None:
+        raise ImportError('The compiled kernels have not been built - run "python setup.py build_ext --inplace"')
+
+    use_compiled_kernels = compiled_kernels is not None and kind != 'python'
+    return 'cython' if use_compiled_kernels else 'python'
+
+
+set_kernels(os.environ.get(KERNELS_ENV_VAR, 'auto'))
+
+
+def extract_windows(periods: np.ndarray, values: np.ndarray, start_periods: np.ndarray, length: int) -> np.ndarray:
+    """ Gathers a window of values for every starting period in one step, rather than trimming the data once per event.
+    Periods are whole numbers such as years, or month ordinals from add_month_ordinal().  The values are first laid out
+    in a dense array indexed by period, so that each window is a single offset into it.  Periods that fall outside of
+    the data (or are missing from it) are filled with NaN.
+
+    :param periods: The period (e.g. year) of each value
+    :param values: The values, in the same order as the periods
+    :param start_periods: The first period of each window
+    :param length: The number of periods in each window
+    :return: A 2-D array with one row per starting period and one column per period in the window
+
+    >>> extract_windows(np.array([2000, 2001, 2002]), np.array([1, 2, 3]), np.array([1999, 2001]), 3)
+    array([[nan,  1.,  2.],
+           [ 2.,  3., nan]])
+    >>> extract_windows(np.array([2000, 2002]), np.array([1., 3.]), np.array([1990, 2000]), 4)
+    array([[nan, nan, nan, nan],
+           [ 1., nan,  3., nan]])
+    >>> extract_windows(np.array([2000]), np.array([1.]), np.array([], dtype=int), 4).shape
+    (0, 4)
+    """
+    periods = np.asarray(periods, dtype='int64')
+    start_periods = np.asarray(start_periods, dtype='int64')
+    if len(periods) == 0:
+        return np.full((len(start_periods), length), np.nan)
+
+    if use_compiled_kernels:
+        values = np.asarray(values, dtype=np.result_type(values, np.float32))
+        return compiled_kernels.extract_windows(periods, values, start_periods, length)
+
+    # Lay the values out by period, with a NaN slot on either side for anything out of range to land on
+    # Keep the precision of the values given, but don't go below float32 (see read_us_cpi())
+    first_period = int(periods.min())
+    by_period = np.full(int(periods.max()) - first_period + 3, np.nan, dtype=np.result_type(values, np.float32))
+    by_period[periods - first_period + 1] = values
+
+    positions = start_periods[:, np.newaxis] - first_period + 1 + np.arange(length)
+    np.clip(positions, 0, len(by_period) - 1, out=positions)
+
+    return by_period[positions]
+
+
+def pct_change_windows(windows: np.ndarray) -> np.ndarray:
+    """ Calculates the percentage change along the last axis of an array of windows.  Unlike pandas' pct_change(),
+    a change into or out of a NaN is NaN rather than being filled, and the (empty) first position is dropped.
+
+    :param windows: An array of windows, e.g. from extract_windows()
+    :return: The fractional change from each position to the next, one shorter than the windows along the last axis
+
+    >>> pct_change_windows(np.array([[1., 2., 3., np.nan], [np.nan, 4., 2., 1.]]))
+    array([[ 1. ,  0.5,  nan],
+           [ nan, -0.5, -0.5]])
+    """
+    windows = np.asarray(windows)
+    if not np.issubdtype(windows.dtype, np.floating):
+        windows = windows.astype('float64')
+
+    if use_compiled_kernels and windows.size and windows.dtype in (np.float32, np.float64):
+        # The kernel works on rows, so flatten any leading axes and restore them afterwards
+        rows = np.ascontiguousarray(windows.reshape(-1, windows.shape[-1]))
+        return compiled_kernels.pct_change_windows(rows).reshape(windows.shape[:-1] + (max(windows.shape[-1] - 1, 0),))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return windows[..., 1:] / windows[..., :-1] - 1
+
+
+def row_statistics(values: np.ndarray, percentiles: Union[list, tuple] = (25, 50, 75)) -> dict:
+    """ Calculates NaN-aware statistics across each row of a 2-D array, ignoring NaNs the same way
+    pd.DataFrame.describe() does.  Every row is sorted once, and all the percentiles are then read off the sorted rows,
+    so asking for more percentiles doesn't cost another pass over the data.  Percentiles use linear interpolation.
+
+    :param values: A 2-D array, with the statistics calculated across each row
+    :param percentiles: The percentiles (0 to 100) to calculate
+    :return: A dict of arrays with one value per row: 'count', 'mean' and 'std', and one entry for each percentile
+
+    >>> stats = row_statistics(np.array([[0, 1, 1], [3, 1, 8], [np.nan, 2, np.nan], [np.nan, np.nan, np.nan]]),
+    ...                        percentiles=[5, 25, 50, 75, 95])
+    >>> stats['count']
+    array([3, 3, 1, 0])
+    >>> stats['mean']
+    array([0.66666667, 4.        , 2.        ,        nan])
+    >>> stats[50]
+    array([ 1.,  3.,  2., nan])
+    >>> stats[25], stats[75]
+    (array([0.5, 2. , 2. , nan]), array([1. , 5.5, 2. , nan]))
+    >>> stats[5]
+    array([0.1, 1.2, 2. , nan])
+    >>> stats['std']
+    array([0.57735027, 3.60555128,        nan,        nan])
+    >>> row_statistics(np.array([[0, 1, 1]]), percentiles=[50, 150])
+    Traceback (most recent call last):
+    ...
+    ValueError: Percentiles must be between 0 and 100, not 150
+    """
+    # Neither kernel checks its indexes, so a percentile outside of 0-100 would read outside of the rows
+    invalid = [pct for pct in percentiles if not 0 <= pct <= 100]
+    if invalid:
+        raise ValueError('Percentiles must be between 0 and 100, not ' + ', '.join(str(pct) for pct in invalid))
+
+    # Rows must be contiguous for the sums to add up in the same order as Pandas
+    values = np.ascontiguousarray(values, dtype='float64')
+    valid = ~np.isnan(values)
+    count = valid.sum(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Mean and sample standard deviation, computed the same way as Pandas to give identical values
+        mean = np.where(valid, values, 0).sum(axis=1) / count
+        squared_diffs = np.where(valid, values - mean[:, np.newaxis], 0) ** 2
+        std = np.sqrt(squared_diffs.sum(axis=1) / (count - 1))
+        std[count < 2] = np.nan
+
+    stats = {'count': count, 'mean': mean, 'std': std}
+
+    if use_compiled_kernels:
+        _, results = compiled_kernels.row_percentiles(values, np.asarray(percentiles, dtype='float64'))
+        stats.update(zip(percentiles, results))
+        return stats
+
+    # NaNs sort to the end of each row, so the valid values of each row come first
+    sorted_values = np.sort(values, axis=1)
+    rows = np.arange(len(values))
+    last = np.maximum(count - 1, 0)
+    for pct in percentiles:
+        position = (pct / 100) * last
+        lower = np.floor(position).astype('int64')
+        upper = np.minimum(lower + 1, last)
+        fraction = position - lower
+        below, above = sorted_values[rows, lower], sorted_values[rows, upper]
+
+        # Same linear interpolation as numpy, which works from whichever neighbour is closer
+        diff = above - below
+        result = np.where(fraction >= 0.5, above - diff * (1 - fraction), below + diff * fraction)
+        result[count == 0] = np.nan
+        stats[pct] = result
+
+    return stats
+
+
+def add_mean_and_quartiles(df: pd.DataFrame, extra_percentiles: Union[list, None] = None) -> pd.DataFrame:
     """
-    Takes a dataframe with a series of values in columns and adds new columns for the median and quartiles.
+    Takes a dataframe with a series of values in columns and adds new columns for the median and quartiles.  Extra
+    percentiles (e.g. 5 and 95 for fan charts) can be requested as well, and are added as columns named like "5pct".
 
     :param df: The dataframe with values in columns
+    :param extra_percentiles: Any other percentiles (0 to 100) to add as columns
     :return: An updated dataframe with 25pct, median, and 75pct columns
 
     >>> df = pd.DataFrame({'Col1': [0, 1, 2, 3], 'Col2': [1, 1, 1, 1], 'Col3': [1, 2, 4, 8]})
@@ -392,14 +839,23 @@ def add_mean_and_quartiles(df: pd.DataFrame) -> pd.DataFrame:
     1     1     1     2  1.333333     1.0    1.0    1.5
     2     2     1     4  2.333333     2.0    1.5    3.0
     3     3     1     8  4.000000     3.0    2.0    5.5
+    >>> df = pd.DataFrame({'Col1': [0, 1], 'Col2': [1, np.nan], 'Col3': [1, 2]})
+    >>> print(add_mean_and_quartiles(df, extra_percentiles=[5, 95]))
+       Col1  Col2  Col3      mean  median  25pct  75pct  5pct  95pct
+    0     0   1.0     1  0.666667     1.0   0.50   1.00  0.10   1.00
+    1     1   NaN     2  1.500000     1.5   1.25   1.75  1.05   1.95
     """
+    extra_percentiles = list(extra_percentiles) if extra_percentiles else []
+
     # Get statistics on the df, then grab the appropriate columns from them
-    stats_df = df.apply(pd.DataFrame.describe, axis=1)
+    stats = row_statistics(df.to_numpy(dtype='float64', na_value=np.nan), percentiles=[25, 50, 75] + extra_percentiles)
 
-    df['mean'] = stats_df['mean']
-    df['median'] = stats_df['50%']  # median is equivalent to 50% percentile
-    df['25pct'] = stats_df['25%']
-    df['75pct'] = stats_df['75%']
+    df['mean'] = stats['mean']
+    df['median'] = stats[50]  # median is equivalent to 50% percentile
+    df['25pct'] = stats[25]
+    df['75pct'] = stats[75]
+    for pct in extra_percentiles:
+        df['{:g}pct'.format(pct)] = stats[pct]
 
     return df
 
@@ -497,7 +953,7 @@ def read_worlddb_gdp(filename: str, min_year: Union[int, None] = None, max_year:
                           max_year_possible=(date.today().year - 1))
 
     # Rather than specifying by year, be more usable for the future by dropping unneeded columns
-    df = pd.read_csv(filename, header=0, dtype={'Country Name': 'string', 'Country Code': 'string'})
+    df = read_csv_cached(filename, header=0, dtype={'Country Name': 'string', 'Country Code': 'string'})
     df.drop(columns=['Series Name', 'Series Code'], inplace=True)
 
     # Trim off the excess year header data (e.g. [YR1971]), and set correct type for the years
@@ -518,33 +974,238 @@ def read_worlddb_gdp(filename: str, min_year: Union[int, None] = None, max_year:
         relevant_countries = df['Country Code'].isin(countries)  # Filter down to the ones we want
         df = df[relevant_countries]
 
-    if max_year:
-        max_year_pos = df.columns.get_loc(int(max_year))
-        df = df.iloc[:, 0:(max_year_pos + 1)]
+    # Select the years wanted in one step, keeping the country name and code
+    if min_year or max_year:
+        years = [col for col in df.columns[2:] if (not min_year or col >= int(min_year)) and
+                 (not max_year or col <= int(max_year))]
+        df = df[list(df.columns[:2]) + years]
 
-    # Minimum year is trickier because we need to keep country info in the first two cols
-    if min_year:
-        min_year_pos = df.columns.get_loc(int(min_year))
-        df_right = df.iloc[:, min_year_pos:]  # Grab the year columns
-        df_left = df.iloc[:, 0:2]  # These are the country name and country code
+    return df
 
-        # Append the year columns on the right to the country name/codes on the left
-        df_left[df_right.columns] = df_right.values
-        df = df_left
 
-    return df
+def worlddb_country_mask(gdp_df: pd.DataFrame, countries: Union[list, None] = None, exclude_aggregates: bool = True,
+                         min_years: int = 0) -> np.ndarray:
+    """ Selects rows of World Data Bank GDP data (from read_worlddb_gdp()) in one vectorized step.
 
+    :param gdp_df: The GDP data
+    :param countries: Country codes to keep (defaults to all of them)
+    :param exclude_aggregates: Whether to drop the regional and income group aggregates, such as "World"
+    :param min_years: The least number of years with GDP data a country must have
+    :return: A boolean mask with one value per row
 
-def get_gdp_info(us_gdp: pd.DataFrame, df: pd.DataFrame):
+    >>> df = read_worlddb_gdp('data/WorldDataBank-GDP.csv')
+    >>> int(worlddb_country_mask(df).sum()), int(worlddb_country_mask(df, exclude_aggregates=False).sum())
+    (217, 266)
+    >>> df[worlddb_country_mask(df, countries=['usa', 'WLD', 'SOM'], min_years=50)]['Country Name'].tolist()
+    ['United States']
+    """
+    mask = np.ones(len(gdp_df), dtype=bool)
+    codes = gdp_df['Country Code']
+    if countries:
+        mask &= codes.isin([c.upper() for c in countries]).to_numpy(dtype=bool)
+    if exclude_aggregates:
+        mask &= ~codes.isin(WORLDDB_AGGREGATE_CODES).to_numpy(dtype=bool)
+    if min_years:
+        mask &= gdp_df.iloc[:, 2:].notna().sum(axis=1).to_numpy() >= min_years
+
+    return mask
+
+
+def panel_growth_chunk(gdp_values: np.ndarray, first_year: int, zero_years: np.ndarray, length: int) -> np.ndarray:
+    """ Calculates the yearly GDP growth around every event for a block of countries at once.  Every country's window
+    for every event is gathered with a single index into the block, and the growth into or out of a missing year (or one
+    outside of the data) is NaN.
+
+    :param gdp_values: A (country x year) array of GDP values, with NaN for missing years
+    :param first_year: The year of the first column
+    :param zero_years: The zero point year of each event
+    :param length: The number of years before and after the zero point
+    :return: A (country x event x relative year) array of the fractional growth in GDP from the year before
+
+    >>> gdp = np.array([[100., 110., 121., np.nan], [10., 20., 30., 40.]])
+    >>> panel_growth_chunk(gdp, 2000, np.array([2001, 2003]), 1)
+    array([[[       nan, 0.1       , 0.1       ],
+            [0.1       ,        nan,        nan]],
+    <BLANKLINE>
+           [[       nan, 1.        , 0.5       ],
+            [0.5       , 0.33333333,        nan]]])
+    """
+    # Pad with a NaN year on either side for out of range years to land on
+    padded = np.full((gdp_values.shape[0], gdp_values.shape[1] + 2), np.nan)
+    padded[:, 1:-1] = gdp_values
+
+    # The window includes the year before the first one, for the growth into it
+    positions = np.asarray(zero_years, dtype='int64')[:, np.newaxis] - length - 1 - first_year + 1 + \
+        np.arange(2 * length + 2)
+    np.clip(positions, 0, padded.shape[1] - 1, out=positions)
+
+    return pct_change_windows(padded[:, positions])
+
+
+def gdp_panel_growth(gdp_df: pd.DataFrame, events_df: pd.DataFrame, t0: Literal['start_year', 'end_year',
+                     'year_before_end_year', 'year_after_start_year'] = 'start_year', length: int = 10,
+                     country_mask: Union[np.ndarray, None] = None, chunk_size: int = 64, workers: int = 1) -> tuple:
+    """ Runs the event window analysis on the GDP of many countries at once, giving the yearly growth in GDP around
+    every event for every country.  Countries are processed in chunks, which bounds the memory used and lets the chunks
+    be spread over several processes.
+
+    :param gdp_df: World Data Bank GDP data from read_worlddb_gdp()
+    :param events_df: The events, e.g. from read_event_facts()
+    :param t0: The zero point of each event, as in add_time_range()
+    :param length: The number of years before and after the zero point
+    :param country_mask: Which rows of gdp_df to use, e.g. from worlddb_country_mask() (defaults to all of them)
+    :param chunk_size: The number of countries to process together
+    :param workers: The number of processes to spread the chunks over
+    :return: The countries used (name and code), and a (country x event x relative year) array of the fractional growth
+             in GDP, with relative years from -length to length
+
+    >>> gdp_df = read_worlddb_gdp('data/WorldDataBank-GDP.csv')
+    >>> events_df = read_event_facts('data/event_facts.csv', types='War')
+    >>> countries, growth = gdp_panel_growth(gdp_df, events_df, 'end_year', 2, worlddb_country_mask(gdp_df))
+    >>> len(countries), growth.shape
+    (217, (217, 9, 5))
+    >>> us = countries['Country Code'].tolist().index('USA')
+    >>> events_df['Event_Name'].tolist()[4], growth[us, 4].round(3)
+    ('Gulf War', array([0.077, 0.057, 0.033, 0.059, 0.052]))
+    >>> _, growth_in_parallel = gdp_panel_growth(gdp_df, events_df, 'end_year', 2, chunk_size=50, workers=2)
+    >>> np.array_equal(growth_in_parallel[worlddb_country_mask(gdp_df)], growth, equal_nan=True)
+    True
+    >>> gdp_panel_growth(gdp_df.drop(columns=[1990]), events_df)
+    Traceback (most recent call last):
+    ...
+    ValueError: The GDP data must have a column for every year from 1960 to 2020, but 1990 is missing
+    >>> gdp_panel_growth(gdp_df[['Country Name', 'Country Code']], events_df)
+    Traceback (most recent call last):
+    ...
+    ValueError: The GDP data must have at least one year column
+    """
+    if country_mask is not None:
+        gdp_df = gdp_df[country_mask]
+
+    # Windows are taken by column position, so the years have to run in order with no gaps
+    years = sorted(col for col in gdp_df.columns if isinstance(col, (int, np.integer)))
+    if not years:
+        raise ValueError('The GDP data must have at least one year column')
+    missing = sorted(set(range(years[0], years[-1] + 1)) - set(years))
+    if missing:
+        raise ValueError('The GDP data must have a column for every year from {} to {}, but {} {} missing'
+                         .format(years[0], years[-1], ', '.join(str(year) for year in missing),
+                                 'is' if len(missing) == 1 else 'are'))
+    gdp_values = gdp_df[years].to_numpy(dtype='float64', na_value=np.nan)
+    zero_years = zero_point_years(events_df, t0).to_numpy(dtype='int64')
+    chunks = [gdp_values[i:i + chunk_size] for i in range(0, len(gdp_values), chunk_size)]
+
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(panel_growth_chunk, chunks, [years[0]] * len(chunks),
+                                    [zero_years] * len(chunks), [length] * len(chunks)))
+    else:
+        results = [panel_growth_chunk(chunk, years[0], zero_years, length) for chunk in chunks]
+
+    growth = np.concatenate(results) if results else np.empty((0, len(zero_years), 2 * length + 1))
+    return gdp_df[['Country Name', 'Country Code']].reset_index(drop=True), growth
+
+
+def read_gdp_line_items(filename: str) -> pd.DataFrame:
+    """
+    Reads a NIPA table exported from USAFacts (e.g. gdp_usafacts.csv, from BEA table 1.1.5) into a numeric matrix with
+    one row per line item and one column per year.  The whole table is converted to numbers once, so any component can
+    then be fetched for any years with .loc.  Line items are indented in the csv file to show how they nest; they are
+    indexed by their names without the indentation.  A name that appears more than once (e.g. "Services ($)" under
+    both consumption and exports) is prefixed with the line items it is nested under, e.g.
+    "Personal consumption expenditures ($) / Services ($)".  Heading rows without any values (e.g. "By type") and the
+    notes at the end of the file are dropped.
+    :param filename: the USAFacts csv file
+    :return: a dataframe of the values, indexed by line item, with the years as integer columns
+    >>> gdp = read_gdp_line_items('data/gdp_usafacts.csv')
+    >>> gdp.shape
+    (124, 92)
+    >>> gdp.loc['Gross domestic product ($)', 1929:1931]
+    Year
+    1929    1.046000e+11
+    1930    9.220000e+10
+    1931    7.740000e+10
+    Name: Gross domestic product ($), dtype: float64
+    >>> [name for name in gdp.index if name.endswith('/ Services ($)')]  # doctest: +NORMALIZE_WHITESPACE
+    ['Personal consumption expenditures ($) / Services ($)', 'Exports ($) / Services ($)',
+     'Imports ($) / Services ($)']
+    """
+    df = read_csv_cached(filename, header=0)
+    labels = df.iloc[:, 0]
+    years = [name for name in df.columns[1:] if str(name).strip().isdigit()]
+
+    # Convert every year at once - the notes at the end of the file (in the first few year columns) become NaN
+    values = df[years].apply(pd.to_numeric, errors='coerce')
+    has_values = (labels.notna() & values.notna().any(axis=1)).to_numpy()
+
+    # Work out which line items each one is nested under from the indentation
+    names = labels.fillna('').str.strip().tolist()
+    depths = (labels.fillna('').str.len() - labels.fillna('').str.lstrip().str.len()).tolist()
+    parents = []
+    paths = []
+    for name, depth, valued in zip(names, depths, has_values):
+        while parents and parents[-1][0] >= depth:
+            parents.pop()
+        paths.append([parent for _, parent in parents])
+        if valued:
+            parents.append((depth, name))
+
+    # Qualify any names that appear more than once with as many of their parents as it takes to tell them apart
+    index = list(names)
+    for n_parents in range(1, max(len(path) for path in paths) + 1):
+        duplicated = pd.Series(index)[has_values].duplicated(keep=False)
+        if not duplicated.any():
+            break
+        for i in duplicated[duplicated].index:
+            index[i] = ' / '.join(paths[i][-n_parents:] + [names[i]])
+
+    matrix = pd.DataFrame(values.to_numpy(dtype='float64')[has_values], columns=[int(year) for year in years],
+                          index=pd.Index(index, name='Line item')[has_values])
+    matrix.columns.name = 'Year'
+
+    return matrix
+
+
+def gdp_window(gdp_items: pd.DataFrame, first_year: int, last_year: int, items: Union[dict, None] = None) \
+        -> pd.DataFrame:
+    """
+    Fetches some of the line items from read_gdp_line_items() for a range of years.
+    :param gdp_items: the line item matrix from read_gdp_line_items()
+    :param first_year: the first year to include
+    :param last_year: the last year to include
+    :param items: the line items to fetch, as a dict from the column names to use to their line items (defaults to
+    GDP_COMPONENTS)
+    :return: a dataframe with one row per year and one column per line item
+    >>> gdp = read_gdp_line_items('data/gdp_usafacts.csv')
+    >>> defense = {'GDP': 'Gross domestic product ($)', 'Defense': 'Federal ($) / National defense ($)'}
+    >>> gdp_window(gdp, 1940, 1942, defense)  # doctest: +NORMALIZE_WHITESPACE
+                   GDP       Defense
+    Year
+    1940  1.029000e+11  2.800000e+09
+    1941  1.293000e+11  1.540000e+10
+    1942  1.660000e+11  5.350000e+10
+    """
+    items = items or GDP_COMPONENTS
+    window = gdp_items.loc[list(items.values()), first_year:last_year].T
+    window.columns = list(items.keys())
+
+    return window
+
+
+def get_gdp_info(us_gdp: pd.DataFrame, df: pd.DataFrame, plots: Union[list, None] = None):
     """
     Get GDP info from US GDP data for each event in df.
-    :param us_gdp: US GDP data
+    :param us_gdp: US GDP data, from read_gdp_line_items()
     :param df: the gdp dataframe for selected events
+    :param plots: if a list is given, the plots are added to it to be drawn later by render_plots()
     :return:
     >>> pandemics_gdp = read_event_facts('data/event_facts.csv', types='Pandemics')
-    >>> us_gdp_test = pd.read_csv('data/gdp_usafacts.csv')
+    >>> us_gdp_test = read_gdp_line_items('data/gdp_usafacts.csv')
     >>> get_gdp_info(us_gdp_test, pandemics_gdp)
     """
+    # Only the components that are plotted are needed
+    components = us_gdp.loc[list(GDP_COMPONENTS.values())]
+
     # go through event file and get start_year, end_year
     for index, row in df.iterrows():
         event_name = row['Event_Name']
@@ -562,19 +1223,23 @@ def get_gdp_info(us_gdp: pd.DataFrame, df: pd.DataFrame):
             if before_event < 1929:
                 before_event = 1929
 
-            # Slice GDP df according to event
-            event_gdp = us_gdp.loc[[0, 124, 131, 152], str(before_event): str(after_event)]
-            event_gdp = event_gdp.apply(pd.to_numeric)  # convert all columns of DataFrame
-            event_gdp = event_gdp.T
-            event_gdp.columns = ['GDP', 'Personal consumption expenditures',
-                                 'Gross private domestic investment',
-                                 'Government consumption expenditures and gross investment']
+            # Slice GDP df according to event, labelling the years as text so they are plotted one per position
+            event_gdp = gdp_window(components, before_event, after_event)
+            event_gdp.index = event_gdp.index.astype(str)
 
             end_interval = end_year - before_event
             start_interval = start_year - before_event
 
             # call plot_gdp for each event
-            plot_gdp(event_gdp, event_name, end_interval, start_interval)
+            queue_plot(plots, plot_gdp, event_gdp, event_name, end_interval, start_interval)
+
+
+def plotting():
+    """ Imports the drawing code, and with it Matplotlib, the first time a plot is drawn.
+
+    :return: The final_project_plots module
+    """
+    return importlib.import_module('final_project_plots')
 
 
 def plot_gdp(gdp_df: pd.DataFrame, event_name: str, end_interval: int, start_interval: int):
@@ -590,31 +1255,13 @@ def plot_gdp(gdp_df: pd.DataFrame, event_name: str, end_interval: int, start_int
     >>> event_gdp = us_gdp_df.loc[0, '1947': '1968']
     >>> event_gdp = event_gdp.to_frame()
     >>> plot_gdp(event_gdp, "Test Flu", 4, 2)
-    >>> image = plt.imread('Plots/GDP/Test Flu.png')
+    >>> from matplotlib.image import imread
+    >>> image = imread('Plots/GDP/Test Flu.png')
     >>> print(image[0][0])  # doctest: +ELLIPSIS
     [1. 1. 1. 1.]
 
     """
-
-    fig, ax = plt.subplots(figsize=(15, 10))
-    ax.plot(gdp_df)
-
-    ax.set_xlabel("Year")
-    ax.set_ylabel("Gross domestic product ($)")
-    ax.ticklabel_format(style='plain', axis='y')
-
-    x_bounds = ax.get_xlim()
-    y_bounds = ax.get_ylim()
-    ax.vlines(end_interval, y_bounds[0], y_bounds[1], colors='red', linestyles='dashed')
-    ax.annotate(text='End Year', xy=(end_interval + 0.5, (y_bounds[0] + y_bounds[1]) * 2 / 3))
-    ax.vlines(start_interval, y_bounds[0], y_bounds[1], colors='green', linestyles='solid')
-    ax.annotate(text='Start Year', xy=(start_interval - 2, (y_bounds[0] + y_bounds[1]) * 2 / 3))
-
-    plt.title("GDP fluctuations for " + event_name)
-    plt.xticks(rotation=45)  # Rotates X-Axis Ticks by 45-degrees
-    plt.legend(['GDP', 'Personal consumption expenditures', 'Gross private domestic investment',
-                'Government consumption expenditures and gross investment'], loc='upper left')
-    plt.savefig('Plots/GDP/' + event_name + '.png')
+    plotting().plot_gdp(gdp_df, event_name, end_interval, start_interval)
 
 
 def read_us_cpi(filename: str, min_year: Union[int, None] = None, max_year: Union[int, None] = None) -> pd.DataFrame:
@@ -662,7 +1309,7 @@ def read_us_cpi(filename: str, min_year: Union[int, None] = None, max_year: Unio
 
     # Use float32 instead of float16 due to bug with float16 and percentages -
     #    see https://github.com/pandas-dev/pandas/issues/9220
-    df = pd.read_csv(filename, header=0, usecols=['Year', 'Value'], dtype={'Year': 'int16', 'Value': 'float32'})
+    df = read_csv_cached(filename, header=0, usecols=['Year', 'Value'], dtype={'Year': 'int16', 'Value': 'float32'})
 
     # Calculate the averages for each year, and keep year as a column, not an index
     df = df.groupby('Year').mean()
@@ -682,14 +1329,79 @@ def read_us_cpi(filename: str, min_year: Union[int, None] = None, max_year: Unio
     return df
 
 
-def add_cpi_values(event_df: pd.DataFrame, cpi_df: pd.DataFrame) -> pd.DataFrame:
+def read_us_cpi_monthly(filename: str) -> pd.DataFrame:
+    """ Loads a CVS file with CPI information from the US Bureau of Labor Statistics into a Pandas dataframe, keeping
+    the value for every month rather than averaging them by year.  A "month_ordinal" column (as from
+    add_month_ordinal()) lines the months up with the monthly market index data.
+
+    :param filename: The csv file with the monthly CPI data
+    :return: A dataframe with 'Year', 'Period' (M01 to M12), 'Value' and 'month_ordinal' columns, in month order
+
+    >>> df = read_us_cpi_monthly('data/bls_us_cpi.csv')
+    >>> df.tail(3)
+          Year Period    Value  month_ordinal
+    1303  2021    M08  273.567          24259
+    1304  2021    M09  274.310          24260
+    1305  2021    M10  276.589          24261
+    """
+    df = read_csv_cached(filename, header=0, usecols=['Year', 'Period', 'Value'],
+                         dtype={'Year': 'int16', 'Period': 'string', 'Value': 'float64'})
+
+    # BLS files can also have an annual average as period M13, which isn't a month
+    df = df[df['Period'].str.fullmatch(r'M(0[1-9]|1[0-2])').fillna(False).to_numpy(dtype=bool)]
+    df = df.assign(month_ordinal=df['Year'].astype('int64') * 12 + df['Period'].str[1:].astype('int64') - 1)
+
+    return df.sort_values('month_ordinal', kind='stable', ignore_index=True)
+
+
+def add_cpi_inflation(cpi_df: pd.DataFrame) -> pd.DataFrame:
+    """ Adds the year-over-year and month-over-month inflation, in percent, to the monthly CPI.  The CPI is laid out
+    by month once, and each change is a shift along it, so a missing month gives missing changes rather than a change
+    from the wrong month.
+
+    :param cpi_df: The monthly CPI, from read_us_cpi_monthly()
+    :return: A copy of the monthly CPI with 'YoY' and 'MoM' columns
+
+    >>> df = add_cpi_inflation(read_us_cpi_monthly('data/bls_us_cpi.csv'))
+    >>> df.iloc[[0, 12, 1305]].round(3)
+          Year Period    Value  month_ordinal    YoY    MoM
+    0     1913    M01    9.800          22956    NaN    NaN
+    12    1914    M01   10.000          22968  2.041  0.000
+    1305  2021    M10  276.589          24261  6.222  0.831
+    """
+    months = cpi_df['month_ordinal'].to_numpy(dtype='int64')
+    if not len(months):
+        return cpi_df.assign(YoY=np.array([], dtype='float64'), MoM=np.array([], dtype='float64'))
+
+    first_month = int(months.min())
+    by_month = extract_windows(months, cpi_df['Value'].to_numpy(dtype='float64'), np.array([first_month]),
+                               int(months.max()) - first_month + 1)[0]
+    positions = months - first_month
+
+    inflation = {}
+    for column, lag in [('YoY', 12), ('MoM', 1)]:
+        before = np.full(len(by_month), np.nan)
+        before[lag:] = by_month[:-lag]
+        inflation[column] = ((by_month / before - 1) * 100)[positions]
+
+    return cpi_df.assign(**inflation)
+
+
+def add_cpi_values(event_df: pd.DataFrame, cpi_df: pd.DataFrame,
+                   resolution: Literal['yearly', 'monthly'] = 'yearly',
+                   inflation: Literal['YoY', 'MoM'] = 'YoY') -> pd.DataFrame:
     """ Takes a dataframe with an Event, End_Year, y_start, and y_end columns, and a dataframe with 'Year' and 'Value'
     column with CPI data, and returns a dataframe with the percentage change for each of those years for each event.
     Note: Each event must have an equal length between their start and end years
 
     :param event_df: A dataframe with 'Event_Name' column, and columns with 'y_start' and 'y_end' year
-    :param cpi_df: A dataframe with CPI data with a 'Year' column and 'Value' column
-    :return: A dataframe with the CPI percentage change for each year given for each event
+    :param cpi_df: A dataframe with CPI data with a 'Year' column and 'Value' column, or for monthly resolution, the
+                   monthly CPI from read_us_cpi_monthly() (or add_cpi_inflation())
+    :param resolution: 'yearly' for the change in the yearly average CPI, or 'monthly' for the inflation of every
+                       month of the same years (all but the first year of each event's range, as with yearly)
+    :param inflation: For monthly resolution, 'YoY' for the change from the same month a year before, or 'MoM' for
+                      the change from the month before
+    :return: A dataframe with the CPI percentage change for each year (or month) given for each event
 
     >>> args = {'Event_Name': ['Event A', 'Event B'], 'y_start': [1990, 1994], 'y_end': [2000, 2002], 'End_Year': [1992, 2001]}
     >>> events_df = pd.DataFrame(args)
@@ -713,38 +1425,96 @@ def add_cpi_values(event_df: pd.DataFrame, cpi_df: pd.DataFrame) -> pd.DataFrame
     8              26.562500                   NaN
     9              23.456790                   NaN
     10             21.000000                   NaN
+    >>> events_df = pd.DataFrame({'Event_Name': ['Gulf War'], 'y_start': [1989], 'y_end': [1991], 'End_Year': [1991]})
+    >>> cpi_monthly = read_us_cpi_monthly('data/bls_us_cpi.csv')
+    >>> add_cpi_values(events_df, cpi_monthly, resolution='monthly').iloc[[0, 1, 23]].round(3)
+        Gulf War (ended 1991)
+    1                   5.202
+    2                   5.263
+    24                  3.064
+    >>> add_cpi_values(events_df, cpi_monthly, resolution='monthly', inflation='MoM').iloc[[0, 1, 23]].round(3)
+        Gulf War (ended 1991)
+    1                   1.031
+    2                   0.471
+    24                  0.073
     """
-    results = {}
-    for _, row in event_df.iterrows():
-        event = row['Event_Name']
-        plot_start_year = row['y_start']
-        plot_end_year = row['y_end']
-        event_end_year = row['End_Year']
+    if resolution == 'monthly':
+        return add_cpi_monthly_values(event_df, cpi_df, inflation)
+    elif resolution != 'yearly':
+        raise ValueError('The resolution must be yearly or monthly')
 
-        # Select all the CPI values between the beginning and ending years
-        cpi_df_selected = trim_to_years(cpi_df, plot_start_year, plot_end_year, 'Year', pad='nan', pad_col_name='Value')
+    y_start = event_df['y_start'].to_numpy(dtype='int64')
+    y_end = event_df['y_end'].to_numpy(dtype='int64')
 
-        # Calculate the percentage changes.  Value must be changed to float32 away from float16 due to a bug -
-        #   see https://github.com/pandas-dev/pandas/issues/9220
-        if cpi_df_selected.dtypes['Value'] == 'float16':
-            cpi_df_selected = cpi_df_selected.astype({'Value': 'float32'})
+    # Every event needs the same number of years so that all the windows fit in one matrix
+    window_lengths = np.unique(y_end - y_start)
+    if len(window_lengths) > 1:
+        raise ValueError('All events must have the same number of years between their start and end years.')
+    length = int(window_lengths[0]) + 1 if len(window_lengths) else 0
 
-        # pct_change() will put in zeros from a value to NaN and we don't want that
-        # Save the nan positions, calculate pct_change, and then put all the NaNs back in
-        nan_value_positions = cpi_df_selected['Value'].isnull()
-        percent_change_df = cpi_df_selected['Value'].pct_change() * 100
-        percent_change_df[nan_value_positions] = np.nan
+    # Gather the CPI values of every event not already in the window cache at once (events x years), then take the
+    # percentage change along the years.  Windows running outside of the CPI data are NaN, so their changes are too
+    years, values = cpi_df['Year'].to_numpy(), cpi_df['Value'].to_numpy()
+    percent_changes = window_cache.windows(
+        ('cpi', series_key(years, values), length), y_start,
+        lambda starts: pct_change_windows(extract_windows(years, values, starts, length)) * 100)
 
-        results['{} (ended {})'.format(event, event_end_year)] = percent_change_df.tolist()
+    column_names = ['{} (ended {})'.format(event, end_year)
+                    for event, end_year in zip(event_df['Event_Name'], event_df['End_Year'])]
 
-    # Some results will have different values because e.g. there haven't been x number of years passed since the end
-    try:
-        results_df = pd.DataFrame.from_dict(results)
-    except ValueError:
+    # Events become columns, and the first row is dropped since there is nothing before it to compare with
+    results_df = pd.DataFrame(percent_changes.T.astype('float64'), columns=column_names,
+                              index=pd.RangeIndex(1, max(length, 1)))
+    return results_df
+
+
+def add_cpi_monthly_values(event_df: pd.DataFrame, cpi_df: pd.DataFrame,
+                           inflation: Literal['YoY', 'MoM'] = 'YoY') -> pd.DataFrame:
+    """ The monthly resolution of add_cpi_values(): the inflation of every month in the years each event's yearly
+    changes would cover (every year of its range but the first), gathered for all the events at once.
+
+    :param event_df: A dataframe with 'Event_Name' and 'End_Year' columns, and columns with 'y_start' and 'y_end' year
+    :param cpi_df: The monthly CPI, from read_us_cpi_monthly() (or add_cpi_inflation())
+    :param inflation: 'YoY' for the change from the same month a year before, or 'MoM' for the change from the month
+                      before
+    :return: A dataframe with the CPI percentage change for each month for each event, indexed from 1
+    """
+    if inflation not in ['YoY', 'MoM']:
+        raise ValueError('The inflation must be YoY or MoM')
+    if inflation not in cpi_df.columns:
+        cpi_df = add_cpi_inflation(cpi_df)
+
+    y_start = event_df['y_start'].to_numpy(dtype='int64')
+    y_end = event_df['y_end'].to_numpy(dtype='int64')
+    window_lengths = np.unique(y_end - y_start)
+    if len(window_lengths) > 1:
         raise ValueError('All events must have the same number of years between their start and end years.')
+    n_months = int(window_lengths[0]) * 12 if len(window_lengths) else 0
 
-    results_df = results_df.iloc[1:, :]  # drop first row in the dataframe since the values are NA
-    return results_df
+    # Every window starts in January of the year after y_start, and is one gather from the inflation by month
+    months, values = cpi_df['month_ordinal'].to_numpy(dtype='int64'), cpi_df[inflation].to_numpy(dtype='float64')
+    monthly_changes = window_cache.windows(
+        ('cpi months', series_key(months, values), n_months), (y_start + 1) * 12,
+        lambda starts: extract_windows(months, values, starts, n_months))
+
+    column_names = ['{} (ended {})'.format(event, end_year)
+                    for event, end_year in zip(event_df['Event_Name'], event_df['End_Year'])]
+    return pd.DataFrame(monthly_changes.T.astype('float64'), columns=column_names,
+                        index=pd.RangeIndex(1, n_months + 1))
+
+
+def monthly_index_available(y_start: Union[pd.Series, np.ndarray], y_end: Union[pd.Series, np.ndarray]) \
+        -> Union[pd.Series, np.ndarray]:
+    """
+    Checks which windows of years are covered by the monthly market index data.
+    :param y_start: the first year of each window
+    :param y_end: the last year of each window
+    :return: a boolean mask of the windows that are covered
+    >>> monthly_index_available(np.array([1927, 1928, 2000]), np.array([1930, 1940, 2021]))
+    array([False,  True, False])
+    """
+    # The earliest data available is in 1927/12 and the latest is in 2021/11, so only whole years 1928-2020 are used
+    return (y_start >= 1928) & (y_end < 2021)
 
 
 def get_index(df_selected: pd.DataFrame, df_index: pd.DataFrame, data_type: str) -> pd.DataFrame:
@@ -791,85 +1561,357 @@ def get_index(df_selected: pd.DataFrame, df_index: pd.DataFrame, data_type: str)
     9   0.029196  0.027585
     10  0.028776  0.027210
     """
-    index_dict = {}
-    df_selected = df_selected.loc[df_selected["y_start"] >= 1928]  # the earliest data available is in 1927/12
-    df_selected = df_selected.loc[df_selected["y_end"] < 2021]  # the latest data for available is in 2021/11
+    df_selected = df_selected.loc[monthly_index_available(df_selected["y_start"], df_selected["y_end"])]
     event_list = df_selected["Event_Name"].tolist()
     print(event_list)
-    for event in event_list:
-        row = df_selected[df_selected["Event_Name"] == event]
 
-        # Find the beginning and end years
-        start = row["y_start"].values[0]
-        end = row["y_end"].values[0]
-        df_index["year"] = df_index["year"].astype(int)
+    # Sort the index data by year once, so that each event's years are one block of rows found by a binary search
+    if data_type != "nominal":
+        df_index = with_real_column(df_index)
+    years = df_index["year"].to_numpy(dtype='int64')
+    order = np.argsort(years, kind='stable')
+    years = years[order]
+    values = df_index["nominal" if data_type == "nominal" else "real"].to_numpy(dtype='float64')[order]
+
+    first_rows = np.searchsorted(years, df_selected["y_start"].to_numpy(dtype='int64'), side='left')
+    last_rows = np.searchsorted(years, df_selected["y_end"].to_numpy(dtype='int64'), side='right')
+    lengths = np.unique(last_rows - first_rows)
+    if len(lengths) > 1:
+        raise ValueError('All arrays must be of the same length')
+    length = int(lengths[0]) if len(lengths) else 0
+
+    # Select all SP500/DJ values between the beginning and ending years for every event not already in the window
+    # cache, and calculate the changes
+    pct_change = window_cache.windows(
+        ('index rows', series_key(years, values), data_type, length), first_rows,
+        lambda rows: pct_change_windows(values[rows[:, np.newaxis] + np.arange(length)]))
+
+    # Events become columns, and the first row is dropped since there is nothing before it to compare with
+    final_df = pd.DataFrame(pct_change.T, columns=event_list, index=pd.RangeIndex(1, max(length, 1)))
+    return final_df
 
-        # Select all SP500/DJ values between the two beginning and ending years
-        index_selected = trim_to_years(df_index, start, end, 'year')
 
-        # Calculate the percentage changes
-        if data_type == "nominal":
-            pct_change = index_selected["nominal"].pct_change().tolist()
-        else:
-            pct_change = index_selected["real"].pct_change().tolist()
+def read_index_monthly(filename: str) -> pd.DataFrame:
+    """
+    Reads in a csv file of monthly market index data (e.g. SP500 or Dow Jones) with "date", "real" and "nominal"
+    columns, and adds the "year" and "month_ordinal" columns used to select windows of it.
+    :param filename: the name of the data file with the market index historical monthly data
+    :return: the dataframe of the market index data
+    >>> df = read_index_monthly('data/sp500_monthly.csv')
+    >>> df.head(3)
+            date    real  nominal  year  month_ordinal
+    0 1927-12-01  282.35    17.66  1927          23135
+    1 1928-01-01  280.91    17.57  1928          23136
+    2 1928-02-01  279.18    17.26  1928          23137
+    """
+    df_index = read_csv_cached(filename)
 
-        # Add all the resulting values to the dict, by event
-        index_dict[event] = pct_change
+    # Create a dataframe with the market index information by year and month
+    df_index["date"] = pd.to_datetime(df_index["date"], format='%Y-%m-%d')
+    df_index["year"] = df_index["date"].dt.year
+    add_month_ordinal(df_index)
 
-    # Add the dict to the dataframe
-    final_df = pd.DataFrame.from_dict(index_dict)
-    final_df = final_df.iloc[1:, :]  # drop first row in the dataframe since the values are NA
-    return final_df
+    return df_index
+
+
+def add_month_ordinal(df_index: pd.DataFrame, date_col_name: str = 'date') -> pd.DataFrame:
+    """
+    Adds a "month_ordinal" column counting the months since year 0 (year * 12 + month - 1) for a dataframe with a date
+    column, so that monthly data can be looked up by position with extract_windows().
+    :param df_index: a dataframe with a datetime column, e.g. the SP500 or Dow Jones monthly data
+    :param date_col_name: the name of the datetime column (defaults to 'date')
+    :return: the same dataframe with a "month_ordinal" column added
+    >>> df = pd.DataFrame({'date': pd.to_datetime(['1999-12-01', '2000-01-01', '2000-02-01'])})
+    >>> add_month_ordinal(df)
+            date  month_ordinal
+    0 1999-12-01          23999
+    1 2000-01-01          24000
+    2 2000-02-01          24001
+    """
+    df_index["month_ordinal"] = df_index[date_col_name].dt.year * 12 + df_index[date_col_name].dt.month - 1
+
+    return df_index
+
+
+def get_index_windows(df_selected: pd.DataFrame, df_indexes: list) -> tuple:
+    """
+    Get the monthly changes of several market indexes (e.g. SP500 and Dow Jones) for all the selected events in one
+    call, for both the "nominal" and "real" data.  Every window starts in January of the "y_start" year and ends in
+    December of the "y_end" year, and is gathered by month ordinal (see add_month_ordinal()) instead of being searched
+    for event by event.  Subsets of events can then be taken from the result without recomputing any windows.
+    :param df_selected: the selected events dataframe, with "y_start" and "y_end" columns
+    :param df_indexes: the given market index historical data, each with "month_ordinal", "nominal" and "real" columns
+    :return: the events which have index data available, and a dict holding a (index x event x month) array of the
+    changes for both "nominal" and "real"
+    >>> s = {'Event_Name': ['Event A', 'Event B', 'Event C'], 'y_start': [1909, 1990, 1994], 'y_end': [1911, 1991, 1995]}
+    >>> sdf = pd.DataFrame(s)
+    >>> months = pd.date_range('1980-01-01', '2009-12-01', freq='MS')
+    >>> idf = pd.DataFrame({'date': months, 'nominal': np.arange(1, 361) * 10., 'real': np.arange(1, 361) * 1.})
+    >>> idf = add_month_ordinal(idf)
+    >>> events, windows = get_index_windows(sdf, [idf, idf.iloc[::-1]])
+    >>> events["Event_Name"].tolist()
+    ['Event B', 'Event C']
+    >>> windows["real"].shape
+    (2, 2, 23)
+    >>> print(windows["nominal"][1, :, :3])
+    [[0.00826446 0.00819672 0.00813008]
+     [0.00591716 0.00588235 0.00584795]]
+    >>> get_index_windows(pd.DataFrame({'y_start': [1990, 1994], 'y_end': [2000, 2002]}), [idf])
+    Traceback (most recent call last):
+    ...
+    ValueError: All arrays must be of the same length
+    """
+    df_selected = df_selected.loc[monthly_index_available(df_selected["y_start"], df_selected["y_end"])]
+
+    # Every event needs the same number of years so that all the windows fit in one array
+    lengths = np.unique(df_selected["y_end"] - df_selected["y_start"])
+    if len(lengths) > 1:
+        raise ValueError('All arrays must be of the same length')
+    length = (int(lengths[0]) + 1) * 12 if len(lengths) else 0
+    start_months = df_selected["y_start"].to_numpy(dtype='int64') * 12
+
+    windows = {}
+    df_indexes = [with_real_column(df_index) for df_index in df_indexes]
+    for data_type in ["nominal", "real"]:
+        index_windows = []
+        for df_index in df_indexes:
+            months, values = df_index["month_ordinal"].to_numpy(), df_index[data_type].to_numpy()
+            index_windows.append(window_cache.windows(
+                ('index months', series_key(months, values), data_type, length), start_months,
+                lambda starts: pct_change_windows(extract_windows(months, values, starts, length).astype('float64'))))
+        windows[data_type] = np.stack(index_windows)
+
+    return df_selected, windows
+
+
+def index_window_frame(windows: np.ndarray, events: pd.DataFrame, selection: Union[np.ndarray, None] = None) \
+        -> pd.DataFrame:
+    """
+    Turns an (event x month) array of changes from get_index_windows() into the same dataframe get_index() returns,
+    optionally keeping only the events selected by a boolean mask.
+    :param windows: the (event x month) array of changes for one market index
+    :param events: the events returned by get_index_windows()
+    :param selection: a boolean mask of the events to keep (defaults to all of them)
+    :return: the dataframe of the changes, with one column for each selected event
+    >>> events = pd.DataFrame({'Event_Name': ['Event A', 'Event B']})
+    >>> index_window_frame(np.array([[0.1, 0.2], [0.3, 0.4]]), events, np.array([False, True]))
+       Event B
+    1      0.3
+    2      0.4
+    """
+    if selection is None:
+        selection = np.ones(len(events), dtype=bool)
+
+    return pd.DataFrame(windows[selection].T, columns=events["Event_Name"][selection].tolist(),
+                        index=pd.RangeIndex(1, windows.shape[-1] + 1))
+
+
+def sweep_index_windows(df_events: pd.DataFrame, df_indexes: list, zero_points: Union[list, None] = None,
+                        lengths: Union[list, range] = range(1, 21), data_types: Union[list, None] = None) -> dict:
+    """
+    Get the monthly changes of several market indexes around every event for a whole grid of zero points, window
+    lengths and data types in one pass.  The windows for every zero point are extracted together, at the longest length
+    only, and their changes calculated once.  The windows for shorter lengths are then slices of those, so the cost of a
+    sweep barely grows with the number of lengths.  Each result is the same as calling get_index_windows() on the events
+    after add_time_range() with that zero point and length.
+    :param df_events: the event facts, with "Start_Year" and "End_Year" columns
+    :param df_indexes: the given market index historical data, each with "month_ordinal", "nominal" and "real" columns
+    :param zero_points: the zero points to use (defaults to all four options of add_time_range())
+    :param lengths: the numbers of years before and after the zero point to use
+    :param data_types: "nominal" and/or "real" (defaults to both)
+    :return: a dict from (zero point, length, data type) to the events which have index data available for that window,
+    and a (index x event x month) array of their changes
+    >>> s = {'Event_Name': ['A', 'B', 'C'], 'Start_Year': [1935, 1990, 1994], 'End_Year': [1945, 1991, 2018]}
+    >>> sdf = pd.DataFrame(s)
+    >>> idf = read_index_monthly('data/sp500_monthly.csv')
+    >>> sweep = sweep_index_windows(sdf, [idf], lengths=[2, 5], data_types=['real'])
+    >>> sorted(sweep)[:3]
+    [('end_year', 2, 'real'), ('end_year', 5, 'real'), ('start_year', 2, 'real')]
+    >>> events, windows = sweep[('end_year', 5, 'real')]
+    >>> events["Event_Name"].tolist(), windows.shape
+    (['A', 'B'], (1, 2, 131))
+    >>> expected_events, expected = get_index_windows(add_time_range(sdf.copy(), 'end_year', 5), [idf])
+    >>> np.array_equal(windows, expected["real"], equal_nan=True)
+    True
+    """
+    zero_points = zero_points or ["start_year", "end_year", "year_before_end_year", "year_after_start_year"]
+    data_types = data_types or ["nominal", "real"]
+    lengths = sorted(set(lengths))
+    if not lengths:
+        return {}
+    longest = lengths[-1]
+
+    # The zero point years of every event for every zero point, stacked so that they can be extracted together
+    y0 = np.concatenate([zero_point_years(df_events, t0).to_numpy(dtype='int64') for t0 in zero_points])
+    start_months = (y0 - longest) * 12
+    window_months = (2 * longest + 1) * 12
+
+    changes = {}
+    if "real" in data_types:
+        df_indexes = [with_real_column(df_index) for df_index in df_indexes]
+    for data_type in data_types:
+        index_windows = [extract_windows(df_index["month_ordinal"].to_numpy(), df_index[data_type].to_numpy(),
+                                         start_months, window_months) for df_index in df_indexes]
+        changes[data_type] = pct_change_windows(np.stack(index_windows).astype('float64'))
+
+    sweep = {}
+    n_events = len(df_events)
+    for i, t0 in enumerate(zero_points):
+        rows = slice(i * n_events, (i + 1) * n_events)
+        for length in lengths:
+            available = monthly_index_available(y0[rows] - length, y0[rows] + length)
+            events = df_events.loc[available]
+
+            # A window of this length starts (longest - length) years into the longest window, and its first change
+            # is from its second month, so it is one month shorter than the window itself
+            first = (longest - length) * 12
+            months = slice(first, first + (2 * length + 1) * 12 - 1)
+            for data_type in data_types:
+                sweep[(t0, length, data_type)] = (events, changes[data_type][:, rows][:, available, months])
+
+    return sweep
+
+
+def read_index_daily(filename: str) -> pd.DataFrame:
+    """
+    Reads in a csv file of daily market index closing values (e.g. SP500 or Dow Jones) with "Date" (as MM/DD/YYYY) and
+    "Closing Value" columns.  The closing values are nominal, so they are returned in a "nominal" column to match the
+    monthly data from read_index_monthly().
+    :param filename: the name of the data file with the market index historical daily data
+    :return: the dataframe of the market index data, sorted by date
+    >>> df = read_index_daily('data/sp_500_index_daily.csv')
+    >>> df.head(3)
+            date  nominal  year
+    0 1927-12-30    17.66  1927
+    1 1927-12-31    17.66  1927
+    2 1928-01-03    17.76  1928
+    """
+    df_index = read_csv_cached(filename, dtype={'Date': 'string', 'Closing Value': 'float64'})
+
+    # Parsing with a fixed format converts the whole column at once, rather than guessing the format of every date
+    df_index = pd.DataFrame({"date": pd.to_datetime(df_index["Date"], format='%m/%d/%Y'),
+                             "nominal": df_index["Closing Value"]})
+    df_index = df_index.sort_values("date", kind='stable', ignore_index=True)
+    df_index["year"] = df_index["date"].dt.year
+
+    return df_index
+
+
+def with_real_column(df_index: pd.DataFrame) -> pd.DataFrame:
+    """
+    Makes sure market index data has a "real" column: the monthly files ship one, and for data without it (e.g. the
+    daily closing values from read_index_daily()) it is calculated from the "nominal" column and the monthly CPI, in
+    dollars of the latest month like the shipped one (see final_project_deflation.add_real_column()).
+    :param df_index: the market index data, from read_index_monthly() or read_index_daily()
+    :return: the same dataframe if it already has a "real" column, otherwise a copy with one added
+    >>> df = with_real_column(read_index_daily('data/sp_500_index_daily.csv'))
+    >>> df[df["date"] == '1990-01-02'].round(2)
+                date  nominal  year   real
+    16635 1990-01-02   359.69  1990  780.9
+    """
+    if "real" in df_index.columns:
+        return df_index
+    return importlib.import_module('final_project_deflation').add_real_column(df_index)
 
 
-def plot_sp_dj(df1: pd.DataFrame, df2: pd.DataFrame, year_num: int, plot_name: str):
+def get_index_daily_windows(df_selected: pd.DataFrame, df_indexes: list, year_l: int) -> tuple:
+    """
+    Get the daily changes of several market indexes for all the selected events in one call.  Windows are aligned on
+    trading days rather than calendar days: day 0 is the first trading day of the zero point year, and each window runs
+    from year_l years' worth of trading days (TRADING_DAYS_PER_YEAR each) before it, to the end of the zero point
+    year's worth of trading days plus year_l more.  This mirrors the monthly windows from get_index_windows().  Events
+    whose windows aren't fully covered by every index are dropped.
+    :param df_selected: the selected events dataframe, with the "y_end" column from add_time_range()
+    :param df_indexes: the given market index historical daily data from read_index_daily()
+    :param year_l: the number of years before and after the zero point that was given to add_time_range()
+    :return: the events which have index data available, and a dict holding a (index x event x trading day) array of
+    the changes for both "nominal" and "real" (see with_real_column())
+    >>> days = pd.bdate_range('1990-01-01', '2009-12-31')
+    >>> idf = pd.DataFrame({'date': days, 'nominal': np.arange(1., len(days) + 1)})
+    >>> sdf = pd.DataFrame({'Event_Name': ['Event A', 'Event B', 'Event C'], 'y_end': [1991, 2001, 2010]})
+    >>> events, windows = get_index_daily_windows(sdf, [idf, idf], 1)
+    >>> events["Event_Name"].tolist()
+    ['Event B']
+    >>> windows["nominal"].shape
+    (2, 1, 755)
+    >>> zero_row = np.searchsorted(idf["date"], np.datetime64('2000-01-01'))
+    >>> closing = idf["nominal"]
+    >>> windows["nominal"][0, 0, TRADING_DAYS_PER_YEAR - 1] == closing[zero_row] / closing[zero_row - 1] - 1
+    True
+    """
+    zero_years = (df_selected["y_end"].to_numpy(dtype='int64') - year_l)
+    zero_dates = (zero_years - 1970).astype('datetime64[Y]').astype('datetime64[ns]')
+    days_before = year_l * TRADING_DAYS_PER_YEAR
+    length = (2 * year_l + 1) * TRADING_DAYS_PER_YEAR
+
+    # Find the first trading day of each zero point year with a binary search, then check the windows fit in the data
+    first_rows = []
+    complete = np.ones(len(df_selected), dtype=bool)
+    for df_index in df_indexes:
+        zero_rows = np.searchsorted(df_index["date"].to_numpy(dtype='datetime64[ns]'), zero_dates, side='left')
+        first_rows.append(zero_rows - days_before)
+        complete &= (first_rows[-1] >= 0) & (first_rows[-1] + length <= len(df_index))
+
+    windows = {}
+    df_indexes = [with_real_column(df_index) for df_index in df_indexes]
+    for data_type in ["nominal", "real"]:
+        index_windows = [df_index[data_type].to_numpy(dtype='float64')[rows[complete][:, np.newaxis]
+                                                                        + np.arange(length)]
+                         for df_index, rows in zip(df_indexes, first_rows)]
+        index_windows = np.stack(index_windows) if index_windows else np.zeros((0, int(complete.sum()), length))
+        windows[data_type] = pct_change_windows(index_windows)
+
+    return df_selected[complete], windows
+
+
+def sp_dj_plot_frames(df1: pd.DataFrame, df2: pd.DataFrame, year_num: int, periods_per_year: int = 12) -> tuple:
+    """
+    Prepares the sp500 and dow jones changes for plot_sp_dj(): the index is shifted to make the January of "Year Zero"
+    0, and the mean and quartiles are added.  This is done before the plot is queued, so that the statistics are part
+    of the data the plot's fingerprint is taken from (see plot_fingerprint()).
+    :param df1: the dataframe with sp500 data for selected events, from index_window_frame()
+    :param df2: the dataframe with dow jones data for selected events, from index_window_frame()
+    :param year_num: the years before and after the selected zero point
+    :param periods_per_year: the number of rows per year, 12 for monthly data or TRADING_DAYS_PER_YEAR for daily data
+    :return: the two prepared dataframes
+    >>> df = pd.DataFrame({'Event A': [0.1, 0.2, 0.3], 'Event B': [0.3, 0.1, 0.2]}, index=[1, 2, 3])
+    >>> sp_df, _ = sp_dj_plot_frames(df, df, 1, 2)
+    >>> sp_df[['median', '25pct']]
+        median  25pct
+    -1    0.20  0.150
+     0    0.15  0.125
+     1    0.25  0.225
+    """
+    periods = periods_per_year * year_num
+    frames = []
+    for df in [df1, df2]:
+        # change index of data to make the January of "Year Zero" as 0 in x-axis.
+        df = df.set_axis(df.index - periods)
+
+        # get the 25 and 75 percentile bounds for plotting
+        frames.append(add_mean_and_quartiles(df))
+    return tuple(frames)
+
+
+def plot_sp_dj(df1: pd.DataFrame, df2: pd.DataFrame, year_num: int, plot_name: str, periods_per_year: int = 12):
     """
     Plot the given sp500 and dow jones for selected events dataframe.
-    :param df1: the dataframe with sp500 data for selected events
-    :param df2: the dataframe with dow jones data for selected events
+    :param df1: the dataframe with sp500 data for selected events, from sp_dj_plot_frames()
+    :param df2: the dataframe with dow jones data for selected events, from sp_dj_plot_frames()
     :param year_num: the years before and after the selected zero point
     :param plot_name: the string name of the plot
+    :param periods_per_year: the number of rows per year, 12 for monthly data or TRADING_DAYS_PER_YEAR for daily data
     :return: plot of the given dataframe
     """
-    # change index of data to make the January of "Year Zero" as 0 in x-axis.
-    df1.index = df1.index - (12 * year_num)
-    df2.index = df2.index - (12 * year_num)
-
-    # get the 25 and 75 percentile bounds for plotting
-    df1 = add_mean_and_quartiles(df1)
-    df2 = add_mean_and_quartiles(df2)
-
-    fig, (ax3, ax4) = plt.subplots(2, sharex=True, figsize=(10, 5))
-    fig.suptitle('Change of Stock Market Indexes')
-    # ax1.plot(df1, linewidth=0.5)
-    # ax1.set_ylabel("Change of SP500", fontsize = 'x-small')
-    # ax2.plot(df2, linewidth=0.5)
-    # ax2.set_ylabel("Change of Dow Jones", fontsize = 'x-small')
-    ax3.plot(df1.index, df1["75pct"], color='black', label='75% percentile', linewidth=0.5)
-    ax3.plot(df1.index, df1["25pct"], color='black', label='25% percentile', linewidth=0.5)
-    ax3.plot(df1.index, df1["median"], '--', color='orange', label='median', linewidth=0.5)
-    ax3.hlines(y=0, xmin=- (12 * year_num), xmax=12 * (year_num + 1), linewidth=2, color='r')
-    ax3.vlines(x=0, ymin=-0.1, ymax=0.1, linestyles='dashed', linewidth=2, color='r')
-    ax3.vlines(x=11, ymin=-0.1, ymax=0.1, linestyles='dashed', linewidth=2, color='r')
-    ax3.fill_between(df1.index, df1["75pct"], df1["25pct"], facecolor='lightgreen')
-    ax3.set_ylabel("Range of SP500", fontsize='x-small')
-
-    ax4.plot(df2.index, df2["75pct"], color='black', label='75% percentile', linewidth=0.5)
-    ax4.plot(df2.index, df2["25pct"], color='black', label='25% percentile', linewidth=0.5)
-    ax4.plot(df2.index, df2["median"], '--', color='orange', label='median', linewidth=0.5)
-    ax4.hlines(y=0, xmin=- (12 * year_num), xmax=12 * (year_num + 1), linewidth=2, color='r')
-    ax4.vlines(x=0, ymin=-0.1, ymax=0.1, linestyles='dashed', linewidth=2, color='r')
-    ax4.vlines(x=11, ymin=-0.1, ymax=0.1, linestyles='dashed', linewidth=2, color='r')
-    ax4.fill_between(df2.index, df2["75pct"], df2["25pct"], facecolor='lightblue')
-    ax4.set_xlim(-12 * year_num + 1, 12 * (year_num + 1))
-    ax4.set_xlabel(str(year_num) + " Year Before and After Events (month)")
-    ax4.set_ylabel("Range of Dow Jones", fontsize='x-small')
-
-    plt.savefig('Plots/StockIndex/' + plot_name + '.png', dpi=200)
+    period_name = "month" if periods_per_year == 12 else "trading day"
+    periods = periods_per_year * year_num
+
+    plotting().plot_sp_dj(df1, df2, year_num, plot_name, periods, periods_per_year, period_name)
 
 
 def output_sp_dj(df_e: pd.DataFrame, df_sp: pd.DataFrame, df_dj: pd.DataFrame, zero_point: str, year_l: int,
-                 d_type: str):
+                 d_type: str, plots: Union[list, None] = None, resolution: Literal['monthly', 'daily'] = 'monthly',
+                 windows: Union[tuple, None] = None):
     """
     manage plots of stock market indexes by changing parameters for event selection criteria.
     :param df_e: the detailed event facts in pd.DataFrame
@@ -879,37 +1921,64 @@ def output_sp_dj(df_e: pd.DataFrame, df_sp: pd.DataFrame, df_dj: pd.DataFrame, z
     ["start year", "end year", "the year before end year", "the year after start year"]
     :param year_l: the number of years to study before and after the year used as "zero point"
     :param d_type: the type of SP500 or Dow Jones historical data to study, could be "real" or "nominal"
+    :param plots: if a list is given, the plots are added to it to be drawn later by render_plots()
+    :param resolution: "monthly", or "daily" for the daily data from read_index_daily() (its "real" values are
+    calculated from the CPI, see with_real_column())
+    :param windows: the (events, SP500 and Dow Jones changes) for this configuration from sweep_index_windows(), if
+    they have already been extracted
     :return: plots for specified event selection criteria
     """
-    df_e = add_time_range(df_e, zero_point, year_l)
     name_str = str(year_l) + "y_" + zero_point + "_" + d_type
+    plot_args = ()
+
+    # Extract the windows for every event from both indexes once, and then only select from them below
+    if windows is not None:
+        events, (sp_windows, dj_windows) = windows
+    else:
+        with profile_stage("extract windows"):
+            df_e = add_time_range(df_e, zero_point, year_l)
+            if resolution == "daily":
+                events, all_windows = get_index_daily_windows(df_e, [df_sp, df_dj], year_l)
+            else:
+                events, all_windows = get_index_windows(df_e, [df_sp, df_dj])
+        sp_windows, dj_windows = all_windows[d_type]
+
+    if resolution == "daily":
+        name_str += "_daily"
+        plot_args = (TRADING_DAYS_PER_YEAR,)
+    is_pandemic = (events["Type"] == "Pandemics").to_numpy(dtype=bool)
+    is_war = (events["Type"] == "War").to_numpy(dtype=bool)
+    over_1m = fatality_codes(events["Fatalities"]) >= fatality_code_range(min_fatalities=10 ** 6)[0]
 
     print("The evolution of {} SP500 and Dow Jones {} years before and after all the Pandemics:".format(d_type, year_l))
-    selected_p = df_e.loc[df_e["Type"] == "Pandemics"]
-    p1_df = get_index(selected_p, df_sp, d_type)
-    p2_df = get_index(selected_p, df_dj, d_type)
-    plot_sp_dj(p1_df, p2_df, year_l, name_str + "_all_pandemics")
+    print(events["Event_Name"][is_pandemic].tolist())
+    p1_df = index_window_frame(sp_windows, events, is_pandemic)
+    p2_df = index_window_frame(dj_windows, events, is_pandemic)
+    p1_df, p2_df = sp_dj_plot_frames(p1_df, p2_df, year_l, *plot_args)
+    queue_plot(plots, plot_sp_dj, p1_df, p2_df, year_l, name_str + "_all_pandemics", *plot_args)
 
     print("The evolution of {} SP500 and Dow Jones {} years before and after all the Wars:".format(d_type, year_l))
-    selected_w = df_e.loc[df_e["Type"] == "War"]
-    w1_df = get_index(selected_w, df_sp, d_type)
-    w2_df = get_index(selected_w, df_dj, d_type)
-    plot_sp_dj(w1_df, w2_df, year_l, name_str + "_all_wars")
+    print(events["Event_Name"][is_war].tolist())
+    w1_df = index_window_frame(sp_windows, events, is_war)
+    w2_df = index_window_frame(dj_windows, events, is_war)
+    w1_df, w2_df = sp_dj_plot_frames(w1_df, w2_df, year_l, *plot_args)
+    queue_plot(plots, plot_sp_dj, w1_df, w2_df, year_l, name_str + "_all_wars", *plot_args)
 
     print("The evolution of {} SP500 and Dow Jones {} years before and after Pandemics with over 1m fatalities:"
           .format(d_type, year_l))
-    selected_1m = df_e.loc[df_e.Fatalities.isin(["1-10m", "10-100m", ">100m"])]
-    selected_1m_p = selected_1m.loc[selected_1m["Type"] == "Pandemics"]
-    p1_df_1 = get_index(selected_1m_p, df_sp, d_type)
-    p2_df_1 = get_index(selected_1m_p, df_dj, d_type)
-    plot_sp_dj(p1_df_1, p2_df_1, year_l, name_str + "_pandemics_over_1m_fatalities")
+    print(events["Event_Name"][over_1m & is_pandemic].tolist())
+    p1_df_1 = index_window_frame(sp_windows, events, over_1m & is_pandemic)
+    p2_df_1 = index_window_frame(dj_windows, events, over_1m & is_pandemic)
+    p1_df_1, p2_df_1 = sp_dj_plot_frames(p1_df_1, p2_df_1, year_l, *plot_args)
+    queue_plot(plots, plot_sp_dj, p1_df_1, p2_df_1, year_l, name_str + "_pandemics_over_1m_fatalities", *plot_args)
 
     print("The evolution of {} SP500 and Dow Jones {} years before and after Wars with over 1m fatalities:"
           .format(d_type, year_l))
-    selected_1m_w = selected_1m.loc[selected_1m["Type"] == "War"]
-    w1_df_1 = get_index(selected_1m_w, df_sp, d_type)
-    w2_df_1 = get_index(selected_1m_w, df_dj, d_type)
-    plot_sp_dj(w1_df_1, w2_df_1, year_l, name_str + "_wars_over_1m_fatalities")
+    print(events["Event_Name"][over_1m & is_war].tolist())
+    w1_df_1 = index_window_frame(sp_windows, events, over_1m & is_war)
+    w2_df_1 = index_window_frame(dj_windows, events, over_1m & is_war)
+    w1_df_1, w2_df_1 = sp_dj_plot_frames(w1_df_1, w2_df_1, year_l, *plot_args)
+    queue_plot(plots, plot_sp_dj, w1_df_1, w2_df_1, year_l, name_str + "_wars_over_1m_fatalities", *plot_args)
 
 
 def plot_cpi(df: pd.DataFrame, plot_name: str, title: str, x_label: str, y_label: str, plot_quartiles: bool = False,
@@ -926,91 +1995,309 @@ def plot_cpi(df: pd.DataFrame, plot_name: str, title: str, x_label: str, y_label
     :param plot_mean: Whether the the mean should be plotted - requires this as a column
     :return: None
     """
+    plotting().plot_cpi(df, plot_name, title, x_label, y_label, plot_quartiles, plot_mean)
 
-    # Create an empty graph and axes
-    figure, axes = plt.subplots(figsize=(15, 10))
-
-    # Either regular values can be plotted, or the quartiles and/or mean
-    if plot_quartiles or plot_mean:
-        if plot_quartiles:
-            axes.plot(df.index, df['75pct'], color='black', label='75% percentile', linewidth=1)
-            axes.plot(df.index, df['25pct'], color='black', label='25% percentile', linewidth=1)
-            axes.plot(df.index, df['median'],  color='darkgreen', label='median', linewidth=1)
-            axes.fill_between(df.index, df['75pct'], df['25pct'], facecolor='lightgreen')
-        if plot_mean:
-            axes.plot(df.index, df['mean'], '-.', color='purple', label='mean', linewidth=1)
-        axes.set_xlabel(x_label)
-        axes.set_ylabel(y_label)
-        axes.set_title(title)
-        axes.set_xticks(df.index.to_list())
-        axes.legend()
-    else:
-        # Plotting normal values
-        df.plot(ax=axes, xlabel=x_label, ylabel=y_label, title=title, xticks=df.index.to_list())
-
-    # Save to disk
-    figure.savefig(plot_name, dpi=200)
 
-
-def plot_all_cpi_graphs(pandemics_cpi_df, wars_cpi_df):
+def plot_all_cpi_graphs(pandemics_cpi_df, wars_cpi_df, plots: Union[list, None] = None):
     """ Takes dataframes with CPI information as well as pandemics and wars and is responsible for configuring
     all of the plots for these.
 
     :param pandemics_cpi_df: The dataframe with pandemic and CPI information
     :param wars_cpi_df: THe dataframe with war and CPI information
+    :param plots: If a list is given, the plots are added to it to be drawn later by render_plots()
     :return:
     """
     # Plot individual events as lines
-    plot_cpi(pandemics_cpi_df, 'Plots/CPI/all_pandemics.png', title='Individual Pandemics vs CPI Change',
-             x_label='Years +/- End of Pandemic', y_label='Year on Year CPI % Change')
-    plot_cpi(wars_cpi_df, 'Plots/CPI/all_wars.png', title='Individual Wars vs CPI Change',
-             x_label='Years +/- End of War', y_label='Year on Year CPI % Change')
+    queue_plot(plots, plot_cpi, pandemics_cpi_df, 'Plots/CPI/all_pandemics.png',
+               title='Individual Pandemics vs CPI Change', x_label='Years +/- End of Pandemic',
+               y_label='Year on Year CPI % Change')
+    queue_plot(plots, plot_cpi, wars_cpi_df, 'Plots/CPI/all_wars.png', title='Individual Wars vs CPI Change',
+               x_label='Years +/- End of War', y_label='Year on Year CPI % Change')
 
-    # Calculate quartiles so these can be plotted
-    pandemics_cpi_df = add_mean_and_quartiles(pandemics_cpi_df)
-    wars_cpi_df = add_mean_and_quartiles(wars_cpi_df)
+    # Calculate quartiles so these can be plotted - on copies, since the plots above may not have been drawn yet
+    with profile_stage('add_mean_and_quartiles'):
+        pandemics_cpi_df = add_mean_and_quartiles(pandemics_cpi_df.copy())
+        wars_cpi_df = add_mean_and_quartiles(wars_cpi_df.copy())
 
     # Plot averages for pandemics (quartiles and mean)
-    plot_cpi(pandemics_cpi_df, 'Plots/CPI/pandemics_quartiles_mean.png', title='Averaged Pandemics vs CPI Change '
-                                                                               'Quartiles and Mean',
-             x_label='Years +/- End of Pandemic',
-             y_label='Year on Year CPI % Change', plot_quartiles=True, plot_mean=True)
+    queue_plot(plots, plot_cpi, pandemics_cpi_df, 'Plots/CPI/pandemics_quartiles_mean.png',
+               title='Averaged Pandemics vs CPI Change Quartiles and Mean', x_label='Years +/- End of Pandemic',
+               y_label='Year on Year CPI % Change', plot_quartiles=True, plot_mean=True)
 
     # Plot averages for wars (quartiles and mean)
-    plot_cpi(wars_cpi_df, 'Plots/CPI/wars_quartiles_mean.png', title='Averaged Wars vs CPI Change Quartiles and Mean',
-             x_label='Years +/- End of War',
-             y_label='Year on Year CPI % Change', plot_quartiles=True, plot_mean=True)
+    queue_plot(plots, plot_cpi, wars_cpi_df, 'Plots/CPI/wars_quartiles_mean.png',
+               title='Averaged Wars vs CPI Change Quartiles and Mean', x_label='Years +/- End of War',
+               y_label='Year on Year CPI % Change', plot_quartiles=True, plot_mean=True)
+
 
+def queue_plot(plots: Union[list, None], plot_function: Callable, *args, **kwargs) -> None:
+    """ Either draws a plot right away, or adds it to a list of plots to be drawn later by render_plots().  This lets
+    the analyses describe all their plots first, so that the drawing can be spread over several processes.
 
-def analyze_gdp(gdp_file: str, events_file: str) -> None:
+    :param plots: The list of plots to add to, or None to draw the plot now
+    :param plot_function: The function that draws and saves the plot, e.g. plot_cpi
+    :param args: The arguments to the plot function
+    :param kwargs: The keyword arguments to the plot function
+    :return: None
+
+    >>> plots = []
+    >>> queue_plot(plots, print, 'Plot A', sep='')
+    >>> queue_plot(None, print, 'Plot B', sep='')
+    Plot B
+    >>> plots
+    [(<built-in function print>, ('Plot A',), {'sep': ''})]
+    """
+    if plots is None:
+        plot_function(*args, **kwargs)
+    else:
+        plots.append((plot_function, args, kwargs))
+
+
+def use_agg_backend() -> None:
+    """ Switches Matplotlib to the non-interactive Agg backend, which only draws to files.  Used to set up the
+    processes in render_plots().
+
+    :return: None
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def plot_output_file(plot_function: Callable, args: tuple, kwargs: dict) -> Union[str, None]:
+    """ Works out which file a queued plot will be saved to, from the arguments of its plot function.
+
+    :param plot_function: The function that draws and saves the plot
+    :param args: The arguments to the plot function
+    :param kwargs: The keyword arguments to the plot function
+    :return: The file name, or None for a function that isn't one of the plot functions in this module
+
+    >>> plot_output_file(plot_gdp, (None, 'Korean War', 13, 10), {})
+    'Plots/GDP/Korean War.png'
+    >>> plot_output_file(plot_sp_dj, (None, None, 5), {'plot_name': '5y_start_year_real_all_wars'})
+    'Plots/StockIndex/5y_start_year_real_all_wars.png'
+    >>> plot_output_file(plot_cpi, (None, 'Plots/CPI/all_wars.png', 'Title', 'x', 'y'), {})
+    'Plots/CPI/all_wars.png'
+    >>> plot_output_file(print, ('Plot A',), {}) is None
+    True
+    """
+    if plot_function not in (plot_gdp, plot_sp_dj, plot_cpi):
+        return None
+
+    arguments = inspect.signature(plot_function).bind(*args, **kwargs).arguments
+    if plot_function is plot_gdp:
+        return 'Plots/GDP/' + arguments['event_name'] + '.png'
+    elif plot_function is plot_sp_dj:
+        return 'Plots/StockIndex/' + arguments['plot_name'] + '.png'
+    else:
+        return arguments['plot_name']
+
+
+def drawing_source(plot_function: Callable) -> str:
+    """ Finds the drawing code behind one of the plot functions in this module, by reading final_project_plots.py
+    rather than importing it (and Matplotlib).
+
+    :param plot_function: The plot function
+    :return: The source of the final_project_plots function of the same name, or '' for any other function
+
+    >>> drawing_source(plot_cpi).splitlines()[0]
+    'def plot_cpi(df: pd.DataFrame, plot_name: str, title: str, x_label: str, y_label: str, plot_quartiles: bool = False,'
+    >>> drawing_source(print)
+    ''
+    """
+    if plot_function not in (plot_gdp, plot_sp_dj, plot_cpi):
+        return ''
+
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'final_project_plots.py')) as f:
+        source = f.read()
+    for node in ast.parse(source).body:
+        if isinstance(node, ast.FunctionDef) and node.name == plot_function.__name__:
+            return ast.get_source_segment(source, node)
+    return ''
+
+
+def plot_fingerprint(plot_function: Callable, args: tuple, kwargs: dict) -> str:
+    """ Hashes everything that goes into a plot: the exact data (values, index, column names and types) of every
+    dataframe passed to the plot function, all the other parameters, and the plot function's own code (including its
+    drawing code in final_project_plots).  If any of these change, so does the fingerprint.
+
+    :param plot_function: The function that draws and saves the plot
+    :param args: The arguments to the plot function
+    :param kwargs: The keyword arguments to the plot function
+    :return: A hex string fingerprint
+
+    >>> df = pd.DataFrame({'Event A': [0.1, 0.2], 'Event B': [0.3, np.nan]})
+    >>> fingerprint = plot_fingerprint(plot_sp_dj, (df, df, 10, 'test'), {})
+    >>> fingerprint == plot_fingerprint(plot_sp_dj, (df.copy(), df.copy(), 10), {'plot_name': 'test'})
+    True
+    >>> fingerprint == plot_fingerprint(plot_sp_dj, (df, df, 5, 'test'), {})
+    False
+    >>> df.loc[1, 'Event B'] = 0.4
+    >>> fingerprint == plot_fingerprint(plot_sp_dj, (df, df, 10, 'test'), {})
+    False
+    """
+    sha = hashlib.sha1()
+    try:
+        sha.update(inspect.getsource(plot_function).encode('utf-8'))
+    except (OSError, TypeError):
+        sha.update(getattr(plot_function, '__qualname__', repr(plot_function)).encode('utf-8'))
+    sha.update(drawing_source(plot_function).encode('utf-8'))
+
+    # Bind the arguments to their names, so that passing one by position or by keyword makes no difference
+    try:
+        arguments = inspect.signature(plot_function).bind(*args, **kwargs).arguments
+    except (TypeError, ValueError):
+        arguments = {'args': args, **kwargs}
+
+    for name, value in arguments.items():
+        sha.update(name.encode('utf-8'))
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            sha.update(repr(value.dtypes.to_dict() if isinstance(value, pd.DataFrame) else value.dtype).encode('utf-8'))
+            sha.update(repr(list(value.columns) if isinstance(value, pd.DataFrame) else value.name).encode('utf-8'))
+            sha.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+        else:
+            sha.update(repr(value).encode('utf-8'))
+
+    return sha.hexdigest()
+
+
+def select_changed_plots(plots: list, manifest: dict, rebuild_all: bool = False) -> tuple:
+    """ Compares queued plots against the fingerprints recorded when they were last drawn, and keeps only the ones that
+    need to be drawn again: a plot is skipped when its fingerprint is unchanged and its file still exists.
+
+    :param plots: The (plot function, args, kwargs) tuples from queue_plot()
+    :param manifest: The fingerprints recorded so far, by output file
+    :param rebuild_all: Whether to draw every plot anyway (their fingerprints are still recorded)
+    :return: The plots that need drawing, and the fingerprints to record for them once they are drawn
+
+    >>> df = pd.DataFrame({'Event A': [0.1, 0.2]}, index=[-1, 0])
+    >>> plots = []
+    >>> queue_plot(plots, plot_cpi, df, 'Plots/CPI/all_wars.png', 'Title', 'x', 'y')
+    >>> queue_plot(plots, plot_cpi, df, 'Plots/CPI/no_such_plot.png', 'Title', 'x', 'y')
+    >>> queue_plot(plots, print, 'Plot A')
+    >>> manifest = {'Plots/CPI/all_wars.png': plot_fingerprint(*plots[0]),
+    ...             'Plots/CPI/no_such_plot.png': plot_fingerprint(*plots[1])}
+    >>> to_draw, updates = select_changed_plots(plots, manifest)
+    >>> [plot_output_file(*plot) for plot in to_draw]
+    ['Plots/CPI/no_such_plot.png', None]
+    >>> list(updates)
+    ['Plots/CPI/no_such_plot.png']
+    >>> to_draw, updates = select_changed_plots(plots, manifest, rebuild_all=True)
+    >>> len(to_draw), list(updates)
+    (3, ['Plots/CPI/all_wars.png', 'Plots/CPI/no_such_plot.png'])
+    """
+    to_draw = []
+    updates = {}
+    for plot_function, args, kwargs in plots:
+        output_file = plot_output_file(plot_function, args, kwargs)
+        if output_file is None:
+            to_draw.append((plot_function, args, kwargs))  # Nothing to check against, so always draw it
+            continue
+
+        fingerprint = plot_fingerprint(plot_function, args, kwargs)
+        if not rebuild_all and manifest.get(output_file) == fingerprint and os.path.exists(output_file):
+            continue
+
+        to_draw.append((plot_function, args, kwargs))
+        updates[output_file] = fingerprint
+
+    return to_draw, updates
+
+
+def render_plots(plots: list, workers: Union[int, None] = None, manifest_file: Union[str, None] = None,
+                 rebuild_all: bool = False) -> None:
+    """ Draws a list of plots collected by queue_plot().  With more than one worker, the plots are drawn in a pool of
+    processes using the Agg backend, so the files saved are the same as when drawing them one by one.  Each plot
+    function closes its figure after saving it, so memory use doesn't grow with the number of plots.
+
+    If a manifest file is given, only the plots whose inputs changed since they were last drawn are drawn again (see
+    select_changed_plots()), and the manifest is updated once they have all been drawn.
+
+    :param plots: The (plot function, args, kwargs) tuples to draw
+    :param workers: The number of processes to draw with (defaults to the number of CPUs, 1 draws in this process)
+    :param manifest_file: A json file of the fingerprints of the plots drawn before (e.g. PLOT_MANIFEST)
+    :param rebuild_all: Whether to draw every plot, whatever the manifest says, and record all of their fingerprints
+    :return: None
+
+    >>> plots = []
+    >>> queue_plot(plots, print, 'Plot A')
+    >>> queue_plot(plots, print, 'Plot B')
+    >>> render_plots(plots, workers=1)
+    Plot A
+    Plot B
+    """
+    manifest = {}
+    updates = {}
+    if manifest_file:
+        if os.path.exists(manifest_file):
+            with open(manifest_file) as f:
+                manifest = json.load(f)
+        plots, updates = select_changed_plots(plots, manifest, rebuild_all)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(plots))
+
+    if workers <= 1:
+        for plot_function, args, kwargs in plots:
+            plot_function(*args, **kwargs)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=use_agg_backend) as pool:
+            futures = [pool.submit(plot_function, *args, **kwargs) for plot_function, args, kwargs in plots]
+
+            # Wait for all of the plots, raising the first error if any of them failed
+            for future in futures:
+                future.result()
+
+    # Only record the new fingerprints once everything has been drawn successfully
+    if manifest_file and updates:
+        manifest.update(updates)
+        with open(manifest_file, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+def analyze_gdp(gdp_file: str, events_file: str, plots: Union[list, None] = None) -> None:
     """
     For each event, select gdp data 10 year before and after, and pass the df to plot_gdp().
     :param gdp_file: gdp data file name
     :param events_file: events file name
+    :param plots: if a list is given, the plots are added to it to be drawn later by render_plots()
     :return:
     """
     # read in us gdp file
-    us_gdp_df = pd.read_csv(gdp_file, header=0)
+    with profile_stage('read data'):
+        us_gdp_df = read_gdp_line_items(gdp_file)
+        event_df = read_event_facts(events_file)
 
     # separate pandemics and wars gdp dataframe
-    pandemics_gdp = read_event_facts(events_file, types='Pandemics')
-    wars_gdp = read_event_facts(events_file, types='War')
+    pandemics_gdp = event_df[event_df['Type'] == 'Pandemics']
+    wars_gdp = event_df[event_df['Type'] == 'War']
 
     # get gdp_info for each pandemic/war events
-    get_gdp_info(us_gdp_df, pandemics_gdp)
-    get_gdp_info(us_gdp_df, wars_gdp)
+    with profile_stage('get_gdp_info'):
+        get_gdp_info(us_gdp_df, pandemics_gdp, plots)
+        get_gdp_info(us_gdp_df, wars_gdp, plots)
 
 
 def analyze_cpi(us_cpi_file: str, events_file: str, year_boundaries: int,
-                graph_type: Literal['start_year', 'end_year', 'year_before_end_year', 'year_after_start_year']) -> tuple:
+                graph_type: Literal['start_year', 'end_year', 'year_before_end_year', 'year_after_start_year'],
+                overlaps: Literal[None, 'exclude', 'merge'] = None, across_types: bool = False,
+                resolution: Literal['yearly', 'monthly'] = 'yearly', inflation: Literal['YoY', 'MoM'] = 'YoY') -> tuple:
     """ This takes an events file and file with CPI information and prepares two dataframes for plotting, one for wars
-    and one for pandemics.  The dataframes returned have the percentage CPI change from year to year.
+    and one for pandemics.  The dataframes returned have the percentage CPI change from year to year, or for monthly
+    resolution, the inflation of every month.
 
     :param us_cpi_file: The location on disk of the CPI file
     :param events_file: The location on disk of the events file
     :param year_boundaries: How many years before/after from the event to graph
     :param graph_type: One of 'start_year', 'end_year', 'year_before_end_year', or 'year_after_start_year'
-    :return: Two dataframes, one for pandemics and one for wars, with the CPI change attached
+    :param overlaps: None to use every event, or 'exclude' or 'merge' to drop or combine the pandemics (and the wars)
+                     that overlap each other, whose CPI windows would otherwise be much the same
+    :param across_types: Whether a pandemic overlapping a war (such as the Spanish Flu and World War I) counts as an
+                         overlap too.  A merged event covering both is then in both of the dataframes returned.
+    :param resolution: 'yearly' for the change in the yearly average CPI, or 'monthly' for the monthly inflation
+    :param inflation: For monthly resolution, 'YoY' (year over year) or 'MoM' (month over month) inflation
+    :return: Two dataframes, one for pandemics and one for wars, with the CPI change attached.  They are indexed by
+             year relative to the zero point, or for monthly resolution, by month relative to January of the zero point
 
     >>> cpi_file = 'data/bls_us_cpi.csv'
     >>> events_file = 'data/event_facts.csv'
@@ -1032,36 +2319,76 @@ def analyze_cpi(us_cpi_file: str, events_file: str, year_boundaries: int,
     9                  -1.930320  ...                          NaN
     10                 -1.152188  ...                          NaN
     [5 rows x 9 columns]
+    >>> pans_df, wars_df = analyze_cpi(cpi_file, events_file, 10, 'end_year', overlaps='merge')
+    >>> list(pans_df.columns)[:2]
+    ['Diphtheria epidemic / Polio / Spanish Flu (H1N1) (ended 1955)', 'Asian Flu (H2N2) (ended 1958)']
+    >>> pans_df, wars_df = analyze_cpi(cpi_file, events_file, 10, 'end_year', overlaps='exclude', across_types=True)
+    >>> list(pans_df.columns), list(wars_df.columns)
+    (['Asian Flu (H2N2) (ended 1958)'], [])
+    >>> pans_df, wars_df = analyze_cpi(cpi_file, events_file, 10, 'end_year', resolution='monthly')
+    >>> wars_df.iloc[[0, 120, 251], :2].round(3)
+          World War I (ended 1918)  Korean War (ended 1953)
+    -120                       NaN                    7.643
+     0                      19.658                    0.377
+     131                    -1.156                    1.645
     """
-    us_cpi_df = read_us_cpi(us_cpi_file)
-    min_cpi_year = us_cpi_df['Year'].min()
-
-    pandemics_df = read_event_facts(events_file, types='Pandemics', min_start_year=min_cpi_year,
-                                    min_end_year=min_cpi_year)
-    wars_df = read_event_facts(events_file, types='War', min_start_year=min_cpi_year, min_end_year=min_cpi_year)
+    with profile_stage('read data'):
+        us_cpi_df = read_us_cpi(us_cpi_file) if resolution == 'yearly' else add_cpi_inflation(
+            read_us_cpi_monthly(us_cpi_file))
+        min_cpi_year = us_cpi_df['Year'].min()
+
+        pandemics_df = read_event_facts(events_file, types='Pandemics', min_start_year=min_cpi_year,
+                                        min_end_year=min_cpi_year)
+        wars_df = read_event_facts(events_file, types='War', min_start_year=min_cpi_year, min_end_year=min_cpi_year)
+
+    if overlaps and across_types:
+        # Resolve the pandemics and wars together, then split them up again by the types of the events left
+        events_df = resolve_overlaps(pd.concat([pandemics_df, wars_df]), overlaps)
+        event_types = events_df['Type'].astype(str).str.split(' / ')
+        pandemics_df = events_df[event_types.apply(lambda types: 'Pandemics' in types).to_numpy(dtype=bool)]
+        wars_df = events_df[event_types.apply(lambda types: 'War' in types).to_numpy(dtype=bool)]
+    elif overlaps:
+        pandemics_df = resolve_overlaps(pandemics_df, overlaps)
+        wars_df = resolve_overlaps(wars_df, overlaps)
 
     # Add the start and end years for plotting
-    pandemics_df = add_time_range(pandemics_df, graph_type, year_boundaries, add_extra_yr_before=True)
-    wars_df = add_time_range(wars_df, graph_type, year_boundaries, add_extra_yr_before=True)
+    with profile_stage('add_time_range'):
+        pandemics_df = add_time_range(pandemics_df, graph_type, year_boundaries, add_extra_yr_before=True)
+        wars_df = add_time_range(wars_df, graph_type, year_boundaries, add_extra_yr_before=True)
 
     # Add the individual values for those years
-    pandemics_cpi_df = add_cpi_values(pandemics_df, us_cpi_df)
-    wars_cpi_df = add_cpi_values(wars_df, us_cpi_df)
-
-    # Update the index so that it goes from negative years from zero, to zero, to years past zero
-    adjust_index(pandemics_cpi_df)
-    adjust_index(wars_cpi_df)
+    with profile_stage('add_cpi_values'):
+        pandemics_cpi_df = add_cpi_values(pandemics_df, us_cpi_df, resolution, inflation)
+        wars_cpi_df = add_cpi_values(wars_df, us_cpi_df, resolution, inflation)
+
+    # A type with no events left (e.g. after excluding overlaps) still gets the rows for every year (or month)
+    n_rows = (2 * year_boundaries + 1) * (12 if resolution == 'monthly' else 1)
+    if pandemics_cpi_df.columns.empty:
+        pandemics_cpi_df = pd.DataFrame(index=pd.RangeIndex(1, n_rows + 1), dtype='float64')
+    if wars_cpi_df.columns.empty:
+        wars_cpi_df = pd.DataFrame(index=pd.RangeIndex(1, n_rows + 1), dtype='float64')
+
+    # Update the index so that it goes from negative years (or months) from zero, to zero, to years past zero
+    if resolution == 'monthly':
+        pandemics_cpi_df.index = wars_cpi_df.index = pd.RangeIndex(-year_boundaries * 12, (year_boundaries + 1) * 12)
+    else:
+        adjust_index(pandemics_cpi_df)
+        adjust_index(wars_cpi_df)
 
     return pandemics_cpi_df, wars_cpi_df
 
 
-def analyze_index(sp500_file: str, dowjones_file: str, events_file: str):
+def analyze_index(sp500_file: str, dowjones_file: str, events_file: str, plots: Union[list, None] = None,
+                  resolution: Literal['monthly', 'daily'] = 'monthly'):
     """
     manage the outputs of stock index analysis by passing different parameters of interest to the previous functions and
     print out results in a readable way.
-    :param sp500_file: the name of the data file contains SP500 historical monthly data
-    :param dowjones_file: the name of the data file contains Dow Jones historical monthly data
+    :param sp500_file: the name of the data file contains SP500 historical monthly (or daily) data
+    :param dowjones_file: the name of the data file contains Dow Jones historical monthly (or daily) data
     :param events_file: the name of the data file contains detailed event facts
+    :param plots: if a list is given, the plots are added to it to be drawn later by render_plots()
+    :param resolution: "monthly", or "daily" to study the daily closing values by trading day (deflated with the CPI,
+    see with_real_column())
     :return: print out results in a readable format
 
     >>> str1 = 'data/sp500_monthly.csv'
@@ -1071,71 +2398,257 @@ def analyze_index(sp500_file: str, dowjones_file: str, events_file: str):
     1. If we use the year before the event end year as zero point, and select the inflation adjusted SP500 and Dow Jones historical data 10 years before and after the zero point year, plots would be
     The evolution of real SP500 and Dow Jones 10 years before and after all the Pandemics:
     ['Polio', 'Asian Flu (H2N2)', 'Hong Kong Flu (H3N2)', 'London flu', 'Second measles outbreak', 'SARS outbreak', 'Swine flu pandemic (H1N1)']
-    ['Polio', 'Asian Flu (H2N2)', 'Hong Kong Flu (H3N2)', 'London flu', 'Second measles outbreak', 'SARS outbreak', 'Swine flu pandemic (H1N1)']
     The evolution of real SP500 and Dow Jones 10 years before and after all the Wars:
     ['Korean War', 'Vietnam War', 'World War II', 'Gulf War', 'Civil war in Afghanistan', 'Iraq War']
-    ['Korean War', 'Vietnam War', 'World War II', 'Gulf War', 'Civil war in Afghanistan', 'Iraq War']
     The evolution of real SP500 and Dow Jones 10 years before and after Pandemics with over 1m fatalities:
     ['Asian Flu (H2N2)', 'Hong Kong Flu (H3N2)']
-    ['Asian Flu (H2N2)', 'Hong Kong Flu (H3N2)']
     The evolution of real SP500 and Dow Jones 10 years before and after Wars with over 1m fatalities:
     ['Korean War', 'Vietnam War', 'World War II']
-    ['Korean War', 'Vietnam War', 'World War II']
     3. If we use the event start year as zero point, and select the real SP500 and Dow Jones historical data 5 years before and after the zero point year, plots would be
     The evolution of real SP500 and Dow Jones 5 years before and after all the Pandemics:
     ['Asian Flu (H2N2)', 'Hong Kong Flu (H3N2)', 'London flu', 'Second measles outbreak', 'HIV AIDS pandemic', 'SARS outbreak', 'Swine flu pandemic (H1N1)']
-    ['Asian Flu (H2N2)', 'Hong Kong Flu (H3N2)', 'London flu', 'Second measles outbreak', 'HIV AIDS pandemic', 'SARS outbreak', 'Swine flu pandemic (H1N1)']
     The evolution of real SP500 and Dow Jones 5 years before and after all the Wars:
     ['Korean War', 'Vietnam War', 'World War II', 'Gulf War', 'Civil war in Afghanistan', 'War on Terror', 'Iraq War', 'War in Somalia']
-    ['Korean War', 'Vietnam War', 'World War II', 'Gulf War', 'Civil war in Afghanistan', 'War on Terror', 'Iraq War', 'War in Somalia']
     The evolution of real SP500 and Dow Jones 5 years before and after Pandemics with over 1m fatalities:
     ['Asian Flu (H2N2)', 'Hong Kong Flu (H3N2)', 'HIV AIDS pandemic']
-    ['Asian Flu (H2N2)', 'Hong Kong Flu (H3N2)', 'HIV AIDS pandemic']
     The evolution of real SP500 and Dow Jones 5 years before and after Wars with over 1m fatalities:
     ['Korean War', 'Vietnam War', 'World War II', 'War in Somalia']
-    ['Korean War', 'Vietnam War', 'World War II', 'War in Somalia']
     """
-    event_df = read_event_facts(events_file)
-    sp_df = pd.read_csv(sp500_file)
-    dj_df = pd.read_csv(dowjones_file)
-
-    # Create a dataframe with information on both Dow Jones and SP500 by year
-    sp_df["date"] = pd.to_datetime(sp_df["date"], format='%Y-%m-%d')
-    sp_df["year"] = sp_df["date"].dt.year
-
-    dj_df["date"] = pd.to_datetime(dj_df["date"], format='%Y-%m-%d')
-    dj_df["year"] = dj_df["date"].dt.year
+    with profile_stage('read data'):
+        event_df = read_event_facts(events_file)
+        if resolution == 'daily':
+            sp_df = read_index_daily(sp500_file)
+            dj_df = read_index_daily(dowjones_file)
+        else:
+            sp_df = read_index_monthly(sp500_file)
+            dj_df = read_index_monthly(dowjones_file)
+
+    if resolution == 'daily':
+        print("1. If we use the year before the event end year as zero point, and select the daily inflation adjusted "
+              "SP500 and Dow Jones historical data 10 years before and after the zero point year, plots would be")
+        with profile_stage('10y_year_before_end_year_real_daily'):
+            output_sp_dj(event_df, sp_df, dj_df, "year_before_end_year", 10, "real", plots, resolution)
+        print("3. If we use the event start year as zero point, and select the daily real SP500 and "
+              "Dow Jones historical data 5 years before and after the zero point year, plots would be")
+        with profile_stage('5y_start_year_real_daily'):
+            output_sp_dj(event_df, sp_df, dj_df, "start_year", 5, "real", plots, resolution)
+        return
+
+    # Extract the windows for all the configurations below in one pass
+    with profile_stage('sweep_index_windows'):
+        sweep = sweep_index_windows(event_df, [sp_df, dj_df], ["year_before_end_year", "start_year"], [10, 5],
+                                    ["real"])
 
     print("1. If we use the year before the event end year as zero point, and select the inflation adjusted SP500 and "
           "Dow Jones historical data 10 years before and after the zero point year, plots would be")
-    output_sp_dj(event_df, sp_df, dj_df, "year_before_end_year", 10, "real")
+    with profile_stage('10y_year_before_end_year_real'):
+        output_sp_dj(event_df, sp_df, dj_df, "year_before_end_year", 10, "real", plots,
+                     windows=sweep[("year_before_end_year", 10, "real")])
     # print("2. If we use the year before the event end year as zero point, and select the nominal SP500 and "
     #       "Dow Jones historical data 10 years before and after the zero point year, plots would be")
     # output_sp_dj(event_df, sp_df, dj_df, "year_before_end_year", 10, "nominal")
     print("3. If we use the event start year as zero point, and select the real SP500 and "
           "Dow Jones historical data 5 years before and after the zero point year, plots would be")
-    output_sp_dj(event_df, sp_df, dj_df, "start_year", 5, "real")
+    with profile_stage('5y_start_year_real'):
+        output_sp_dj(event_df, sp_df, dj_df, "start_year", 5, "real", plots, windows=sweep[("start_year", 5, "real")])
     # print("4. If we use the year before the event end year as zero point, and select the inflation adjusted SP500 and "
     #       "Dow Jones historical data 5 years before and after the zero point year, plots would be")
     # output_sp_dj(event_df, sp_df, dj_df, "year_before_end_year", 5, "real")
 
 
-def main():
+def run_analysis(analysis: Literal['index', 'gdp', 'cpi'], inputs: dict,
+                 resolution: Literal['monthly', 'daily'] = 'monthly', profile: bool = False) -> tuple:
+    """
+    Runs one of the analyses, collecting its plots to be drawn later and what it prints, so that several analyses can
+    run at once in worker processes without their output getting mixed up.
+    :param analysis: "index", "gdp" or "cpi"
+    :param inputs: the data files to use, as in DEFAULT_INPUTS
+    :param resolution: "monthly" or "daily", for the stock index analysis
+    :param profile: whether to profile the analysis in this process (for workers - see run_analyses())
+    :return: what the analysis printed, the plots it queued, and its profile records (if profiled)
+    >>> output, plots, records = run_analysis('cpi', DEFAULT_INPUTS)
+    >>> output, len(plots), records
+    ('', 4, [])
+    >>> run_analysis('bonds', DEFAULT_INPUTS)
+    Traceback (most recent call last):
+    ...
+    ValueError: The analysis must be one of index, gdp, cpi
+    """
+    if analysis not in ANALYSES:
+        raise ValueError('The analysis must be one of ' + ', '.join(ANALYSES))
+
+    plots = []
+    output = io.StringIO()
+    if profile:
+        start_profiling()
+    try:
+        with contextlib.redirect_stdout(output):
+            if analysis == 'index':
+                with profile_stage('analyze_index'):
+                    analyze_index(inputs['sp500'], inputs['dowjones'], inputs['events'], plots, resolution)
+            elif analysis == 'gdp':
+                with profile_stage('analyze_gdp'):
+                    analyze_gdp(inputs['gdp'], inputs['events'], plots)
+            else:
+                with profile_stage('analyze_cpi'):
+                    pandemics_cpi_df, wars_cpi_df = analyze_cpi(inputs['cpi'], inputs['events'], 10, 'end_year')
+                with profile_stage('plot_all_cpi_graphs'):
+                    plot_all_cpi_graphs(pandemics_cpi_df, wars_cpi_df, plots)
+    finally:
+        records = stop_profiling() if profile else []
+
+    return output.getvalue(), plots, records
+
+
+def run_analyses(analyses: list, inputs: dict, jobs: Union[int, None] = None,
+                 resolution: Literal['monthly', 'daily'] = 'monthly') -> list:
+    """
+    Runs several analyses, at the same time in separate worker processes if more than one job is allowed, so that the
+    run takes as long as the slowest analysis rather than all of them together.  What each analysis prints is printed
+    in the order the analyses were given, whichever finishes first.  When profiling, the workers profile themselves and
+    send their records back.
+    :param analyses: the analyses to run, from ANALYSES
+    :param inputs: the data files to use, as in DEFAULT_INPUTS
+    :param jobs: the most worker processes to use (defaults to the number of CPUs, 1 runs them in this process)
+    :param resolution: "monthly" or "daily", for the stock index analysis
+    :return: the plots queued by all the analyses, to be drawn by render_plots()
+    >>> plots = run_analyses(['gdp', 'cpi'], DEFAULT_INPUTS, jobs=2)
+    >>> len(plots)
+    20
+    """
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    workers = min(jobs, len(analyses))
+
+    if workers <= 1:
+        results = [run_analysis(analysis, inputs, resolution) for analysis in analyses]
+    else:
+        profile = profiling_enabled()
+        started = profile_clock() if profile else 0.0
+
+        # The workers use the same kernels as this process, even if they were chosen with set_kernels()
+        kernels = 'cython' if use_compiled_kernels else 'python'
+        with ProcessPoolExecutor(max_workers=workers, initializer=set_kernels, initargs=(kernels,)) as pool:
+            futures = [pool.submit(run_analysis, analysis, inputs, resolution, profile) for analysis in analyses]
+            results = [future.result() for future in futures]
+
+        for _, _, records in results:
+            add_records(records, started)
+
+    plots = []
+    for output, analysis_plots, _ in results:
+        print(output, end='')
+        plots.extend(analysis_plots)
+
+    return plots
+
+
+def run_profiled(run: Callable, profile_file: Union[str, None] = None) -> None:
+    """ Runs a function with the stages inside it profiled (see final_project_profile), if a trace file is given or set
+    in the FINAL_PROJECT_PROFILE environment variable.  The trace is saved and a summary table printed at the end, even
+    if the run fails part way.
+
+    :param run: The function to run, which takes no arguments
+    :param profile_file: The json file to save the trace to, or None to use the environment variable
+    :return: None
+    """
+    profile_file = profile_file or profile_file_from_environment()
+    if not profile_file:
+        run()
+        return
+
+    start_profiling()
+    try:
+        with profile_stage('main'):
+            run()
+    finally:
+        records = stop_profiling()
+        write_trace(records, profile_file)
+        print(summary_table(records))
+        print('Profile trace saved to', profile_file)
+
+
+def main(plot_workers: Union[int, None] = None, rebuild_all: bool = False, profile_file: Union[str, None] = None,
+         analyses: Union[list, None] = None, inputs: Union[dict, None] = None, jobs: Union[int, None] = None,
+         resolution: Literal['monthly', 'daily'] = 'monthly'):
+    """
+    Main function for starting all data processing and plotting.  The analyses are run at the same time in worker
+    processes, and all their plots are collected and then drawn together by render_plots(), which skips the plots whose
+    inputs haven't changed since the last run.
+    :param plot_workers: The number of processes to draw the plots with (defaults to the number of CPUs)
+    :param rebuild_all: Whether to draw every plot, even the ones that haven't changed
+    :param profile_file: If given, each stage is timed and the trace saved to this json file (see run_profiled())
+    :param analyses: The analyses to run, from ANALYSES (defaults to all of them)
+    :param inputs: Data files to use instead of the ones in DEFAULT_INPUTS, by the same keys
+    :param jobs: The number of processes to run the analyses in (defaults to the number of CPUs)
+    :param resolution: "monthly", or "daily" to use the daily stock index data
+    :return: None
+    """
+    analyses = analyses or ANALYSES
+    default_inputs = dict(DEFAULT_INPUTS, **(DAILY_INDEX_INPUTS if resolution == 'daily' else {}))
+    inputs = dict(default_inputs, **(inputs or {}))
+
+    def run():
+        with profile_stage('analyses'):
+            plots = run_analyses(analyses, inputs, jobs, resolution)
+        with profile_stage('render_plots'):
+            render_plots(plots, plot_workers, manifest_file=PLOT_MANIFEST, rebuild_all=rebuild_all)
+
+    run_profiled(run, profile_file)
+
+
+def parse_arguments(argv: Union[list, None] = None) -> argparse.Namespace:
+    """
+    Reads the command line options for cli().
+    :param argv: The command line arguments (defaults to sys.argv)
+    :return: The options
+    >>> args = parse_arguments(['--analyses', 'cpi', 'gdp', '--jobs', '2', '--cpi', 'cpi.csv'])
+    >>> args.analyses, args.jobs, args.cpi, args.events
+    (['cpi', 'gdp'], 2, 'cpi.csv', 'data/event_facts.csv')
+    >>> parse_arguments(['--resolution', 'daily']).sp500
+    """
+    parser = argparse.ArgumentParser(description='Plots inflation, GDP and stock market indexes before and after '
+                                                 'wars and pandemics.')
+    parser.add_argument('--analyses', nargs='+', choices=ANALYSES, default=ANALYSES,
+                        help='the analyses to run (default: all of them)')
+    parser.add_argument('--jobs', '-j', type=int, default=None,
+                        help='the number of processes to run the analyses and draw the plots with (default: the '
+                             'number of CPUs)')
+    parser.add_argument('--events', default=DEFAULT_INPUTS['events'], help='events file (default: %(default)s)')
+    parser.add_argument('--cpi', default=DEFAULT_INPUTS['cpi'], help='CPI file (default: %(default)s)')
+    parser.add_argument('--gdp', default=DEFAULT_INPUTS['gdp'], help='GDP file (default: %(default)s)')
+    parser.add_argument('--sp500', help='SP500 file (default: {}, or {} with --resolution daily)'
+                        .format(DEFAULT_INPUTS['sp500'], DAILY_INDEX_INPUTS['sp500']))
+    parser.add_argument('--dowjones', help='Dow Jones file (default: {}, or {} with --resolution daily)'
+                        .format(DEFAULT_INPUTS['dowjones'], DAILY_INDEX_INPUTS['dowjones']))
+    parser.add_argument('--resolution', choices=['monthly', 'daily'], default='monthly',
+                        help='resolution of the stock index data (default: %(default)s)')
+    parser.add_argument('--rebuild-all', action='store_true', help="draw every plot, even those that haven't changed")
+    parser.add_argument('--profile', metavar='TRACE_FILE', help='time each stage and save the trace to this file')
+    parser.add_argument('--kernels', choices=['auto', 'cython', 'python'],
+                        help='use the compiled kernels or not (default: auto, or ${})'.format(KERNELS_ENV_VAR))
+    parser.add_argument('--window-cache-mb', metavar='MB', type=float,
+                        help='memory limit of the cache of event windows, 0 to turn it off (default: 64, or ${})'
+                        .format(WINDOW_CACHE_ENV_VAR))
+
+    return parser.parse_args(argv)
+
+
+def cli(argv: Union[list, None] = None) -> None:
     """
-    Main function for starting all data processing and plotting
+    Command line entry point, e.g. "python final_project.py --analyses cpi gdp --jobs 2".  See parse_arguments().
+    :param argv: The command line arguments (defaults to sys.argv)
     :return: None
     """
-    us_cpi_data = 'data/bls_us_cpi.csv'
-    events_data = 'data/event_facts.csv'
-    sp500_data = 'data/sp500_monthly.csv'
-    dowjones_data = 'data/dow_jone_monthly.csv'
-    us_gdp_data = 'data/gdp_usafacts.csv'
+    args = parse_arguments(argv)
+    if args.kernels:
+        set_kernels(args.kernels)
+    if args.window_cache_mb is not None:
+        window_cache.resize(window_cache_bytes(args.window_cache_mb))
 
-    analyze_index(sp500_data, dowjones_data, events_data)
-    analyze_gdp(us_gdp_data, events_data)
-    pandemics_cpi_df, wars_cpi_df = analyze_cpi(us_cpi_data, events_data, 10, 'end_year')
-    plot_all_cpi_graphs(pandemics_cpi_df, wars_cpi_df)
+    inputs = {name: getattr(args, name) for name in DEFAULT_INPUTS if getattr(args, name)}
+    main(args.jobs, args.rebuild_all, args.profile, args.analyses, inputs, args.jobs, args.resolution)
 
 
 if __name__ == '__main__':
-    main()
+    cli()
@@ -0,0 +1,361 @@
+"""
+IS597 Spring 2021 Final Project
+Group members: Kangyang Wang, Wendy Zhu, and Kay Avila
+
+Benchmarks for the analysis pipeline in final_project.py.  Synthetic data sets are generated at several multiples of
+the size of the data shipped in data/ (more events, and longer CPI and stock index series), and each stage of the
+pipeline is timed on them, along with its peak memory use.  Results can be saved as a baseline, and later runs compared
+against it to catch regressions:
+
+    python final_project_benchmark.py --scales 1 100 --save-baseline
+    python final_project_benchmark.py --scales 1 100 --compare
+
+The timings are absolute seconds, so a baseline only means something on the machine it was recorded on: the one in
+benchmarks/baseline.json is an example from one machine, and on any other, --save-baseline should be run first (with
+the code from before the changes being checked) before using --compare.
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+import contextlib
+import numpy as np
+import pandas as pd
+from typing import Callable, Union
+
+import final_project as fp
+
+DEFAULT_SCALES = [1, 100, 10000]
+BASELINE_FILE = 'benchmarks/baseline.json'
+
+# A stage counts as a regression when it is this many times slower than the baseline
+REGRESSION_THRESHOLD = 1.25
+
+# Sizes of the shipped data, which the scales are multiples of
+SHIPPED_EVENTS = 20
+SHIPPED_CPI_YEARS = 109  # 1913 - 2021
+SHIPPED_INDEX_YEARS = 94  # 1927 - 2021
+
+FATALITIES = ['<10,000', '10,000-1m', '1-10m', '10-100m', '>100m']
+
+
+def series_years(scale: int, shipped_years: int, earliest_year: int) -> int:
+    """ Works out how many years long a generated series should be.  The number of events grows with the scale, and the
+    series length grows with its square root, so the total work grows with the scale.  Series end in 2021 like the
+    shipped data, and can't begin before the earliest year given.
+
+    :param scale: The multiple of the shipped data size
+    :param shipped_years: The number of years in the shipped series
+    :param earliest_year: The earliest year the series can begin
+    :return: The number of years in the generated series
+
+    >>> series_years(1, 109, 1)
+    109
+    >>> series_years(100, 109, 1)
+    1090
+    >>> series_years(10000, 109, 1)
+    2021
+    >>> series_years(10000, 94, 1700)
+    322
+    """
+    return int(min(shipped_years * np.sqrt(scale), 2021 - earliest_year + 1))
+
+
+def generate_events(scale: int, first_year: int, rng: np.random.Generator) -> pd.DataFrame:
+    """ Generates a catalog of random events in the same format as data/event_facts.csv.
+
+    :param scale: The multiple of the shipped number of events
+    :param first_year: The earliest starting year for an event
+    :param rng: The random number generator to use
+    :return: A dataframe of events
+
+    >>> df = generate_events(2, 1913, np.random.default_rng(0))
+    >>> len(df), list(df.columns)
+    (40, ['Event_Name', 'Type', 'Range', 'Start_Year', 'End_Year', 'Fatalities'])
+    >>> bool((df['Start_Year'] <= df['End_Year']).all() and df['End_Year'].max() <= 2021)
+    True
+    """
+    n_events = SHIPPED_EVENTS * scale
+    start_years = rng.integers(first_year, 2021, size=n_events)
+    durations = rng.integers(0, 21, size=n_events)
+
+    return pd.DataFrame({'Event_Name': ['Event {}'.format(i) for i in range(n_events)],
+                         'Type': rng.choice(['Pandemics', 'War'], size=n_events),
+                         'Range': 'Affect United States',
+                         'Start_Year': start_years,
+                         'End_Year': np.minimum(start_years + durations, 2021),
+                         'Fatalities': rng.choice(FATALITIES, size=n_events)})
+
+
+def generate_cpi(n_years: int, rng: np.random.Generator) -> pd.DataFrame:
+    """ Generates monthly CPI values ending in 2021 in the same format as data/bls_us_cpi.csv.
+
+    :param n_years: The number of years of data
+    :param rng: The random number generator to use
+    :return: A dataframe of monthly CPI values
+
+    >>> df = generate_cpi(2, np.random.default_rng(0))
+    >>> df[['Year', 'Period', 'Label']].iloc[[0, -1]]
+        Year Period     Label
+    0   2020    M01  2020 Jan
+    23  2021    M12  2021 Dec
+    """
+    years = np.repeat(np.arange(2022 - n_years, 2022), 12)
+    months = np.tile(np.arange(1, 13), n_years)
+    month_names = np.array(['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'])
+
+    # A random walk of monthly inflation, kept positive
+    values = 10 * np.exp(np.cumsum(rng.normal(0.002, 0.005, size=len(years))))
+
+    return pd.DataFrame({'Series ID': 'CUUR0000SA0', 'Year': years,
+                         'Period': ['M{:02d}'.format(m) for m in months],
+                         'Label': [str(y) + ' ' + name for y, name in zip(years, month_names[months - 1])],
+                         'Value': values.round(3)})
+
+
+def generate_index(n_years: int, rng: np.random.Generator) -> pd.DataFrame:
+    """ Generates monthly stock index values ending in November 2021 in the same format as data/sp500_monthly.csv.
+
+    :param n_years: The number of years of data
+    :param rng: The random number generator to use
+    :return: A dataframe of monthly real and nominal index values
+
+    >>> df = generate_index(2, np.random.default_rng(0))
+    >>> df['date'].iloc[[0, -1]].tolist()
+    ['2019-12-01', '2021-11-01']
+    """
+    dates = pd.date_range(end='2021-11-01', periods=n_years * 12, freq='MS')
+    nominal = 20 * np.exp(np.cumsum(rng.normal(0.005, 0.04, size=len(dates))))
+    real = nominal * np.exp(np.cumsum(rng.normal(-0.002, 0.003, size=len(dates))))
+
+    return pd.DataFrame({'date': dates.strftime('%Y-%m-%d'), 'real': real.round(2), 'nominal': nominal.round(3)})
+
+
+def generate_data(scale: int, folder: str, seed: int = 597) -> dict:
+    """ Writes a full set of synthetic input files for the pipeline to a folder.  The GDP file is copied from data/,
+    since get_gdp_info() needs the NIPA line items in it.
+
+    :param scale: The multiple of the shipped data size
+    :param folder: The folder to write the files to
+    :param seed: The random seed, so that runs are comparable
+    :return: A dict of the file names by their role ('events', 'cpi', 'sp500', 'dowjones', 'gdp')
+
+    >>> with tempfile.TemporaryDirectory() as folder:
+    ...     files = generate_data(1, folder)
+    ...     sorted(files), len(fp.read_event_facts(files['events']))
+    (['cpi', 'dowjones', 'events', 'gdp', 'sp500'], 20)
+    """
+    rng = np.random.default_rng(seed)
+    cpi_years = series_years(scale, SHIPPED_CPI_YEARS, 1)
+    index_years = series_years(scale, SHIPPED_INDEX_YEARS, 1700)  # Pandas dates only go back to 1677
+
+    files = {role: os.path.join(folder, role + '.csv') for role in ['events', 'cpi', 'sp500', 'dowjones', 'gdp']}
+    generate_events(scale, 2022 - cpi_years, rng).to_csv(files['events'], index=False)
+    generate_cpi(cpi_years, rng).to_csv(files['cpi'], index=False)
+    generate_index(index_years, rng).to_csv(files['sp500'], index=False)
+    generate_index(index_years, rng).to_csv(files['dowjones'], index=False)
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'gdp_usafacts.csv'), 'rb') as src:
+        with open(files['gdp'], 'wb') as dst:
+            dst.write(src.read())
+
+    return files
+
+
+def measure(function: Callable, *args, **kwargs) -> tuple:
+    """ Runs a function once, measuring its wall-clock time and the peak memory allocated while it ran.  Anything the
+    function prints is discarded.
+
+    :param function: The function to run
+    :param args: The arguments to the function
+    :param kwargs: The keyword arguments to the function
+    :return: The function's result, the time taken in seconds, and the peak memory in megabytes
+
+    >>> result, seconds, peak_mb = measure(np.zeros, 1000000)
+    >>> len(result), seconds > 0, 7.5 < peak_mb < 8.5
+    (1000000, True, True)
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = function(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return result, seconds, peak / 2 ** 20
+
+
+def measure_import(module: str = 'final_project', repeats: int = 3) -> tuple:
+    """ Times importing a module in a fresh Python process, as a script or batch job would, and checks whether the
+    import pulled in Matplotlib (which should only be imported once something is plotted).
+
+    :param module: The module to import
+    :param repeats: The number of processes to time the import in - the fastest is kept
+    :return: The import time in seconds, the peak memory allocated by the import in megabytes, and whether Matplotlib
+             was imported
+
+    >>> seconds, peak_mb, loaded_matplotlib = measure_import(repeats=1)
+    >>> seconds > 0, peak_mb > 0, loaded_matplotlib
+    (True, True, False)
+    """
+    code = ('import sys, time, tracemalloc\n'
+            'if sys.argv[1] == "memory":\n'
+            '    tracemalloc.start()\n'
+            'start = time.perf_counter()\n'
+            'import {}\n'
+            'print(time.perf_counter() - start, tracemalloc.get_traced_memory()[1] / 2 ** 20, '
+            '"matplotlib" in sys.modules)'.format(module))
+    folder = os.path.dirname(os.path.abspath(__file__))
+
+    def run(mode: str) -> list:
+        output = subprocess.run([sys.executable, '-c', code, mode], cwd=folder, capture_output=True, text=True,
+                                check=True).stdout
+        return output.split()
+
+    # Memory tracing slows the import down, so the time comes from separate runs without it
+    seconds = min(float(run('time')[0]) for _ in range(repeats))
+    _, peak_mb, loaded_matplotlib = run('memory')
+    return seconds, float(peak_mb), loaded_matplotlib == 'True'
+
+
+def trim_each_event(cpi_df: pd.DataFrame, events_df: pd.DataFrame) -> None:
+    """ Calls trim_to_years() once for each event, the way the pipeline used to before it was vectorized.
+
+    :param cpi_df: The CPI data
+    :param events_df: The events, with y_start and y_end columns
+    :return: None
+    """
+    for start_year, end_year in zip(events_df['y_start'], events_df['y_end']):
+        fp.trim_to_years(cpi_df, start_year, end_year, 'Year', pad='nan', pad_col_name='Value')
+
+
+def run_benchmarks(scale: int, trim_events: int = 1000) -> dict:
+    """ Generates the data for one scale and times each stage of the pipeline on it.  The analyze_* functions are given
+    a list to queue their plots in, so only the analysis is timed and not the drawing.
+
+    :param scale: The multiple of the shipped data size
+    :param trim_events: trim_to_years() works on one event at a time, so it is only timed over this many events
+    :return: A dict of {'seconds': ..., 'peak_mb': ...} by stage name
+
+    >>> results = run_benchmarks(1)
+    >>> list(results)  # doctest: +NORMALIZE_WHITESPACE
+    ['import final_project', 'read_event_facts', 'add_time_range', 'trim_to_years', 'add_cpi_values', 'get_index',
+     'add_mean_and_quartiles', 'analyze_cpi', 'analyze_index', 'analyze_gdp']
+    """
+    results = {}
+
+    # Importing doesn't depend on the data, but is reported at every scale so it is compared against the baseline too
+    seconds, peak_mb, loaded_matplotlib = measure_import()
+    if loaded_matplotlib:
+        print('Importing final_project imported Matplotlib as well', file=sys.stderr)
+    results['import final_project'] = {'seconds': seconds, 'peak_mb': peak_mb}
+
+    def stage(name: str, function: Callable, *args, **kwargs):
+        # Every stage starts from an empty window cache, or later stages would be timing lookups of earlier windows
+        fp.window_cache.clear()
+        result, seconds, peak_mb = measure(function, *args, **kwargs)
+        results[name] = {'seconds': seconds, 'peak_mb': peak_mb}
+        return result
+
+    with tempfile.TemporaryDirectory() as folder:
+        files = generate_data(scale, folder)
+        cpi_df = fp.read_us_cpi(files['cpi'])
+        sp_df = fp.read_index_monthly(files['sp500'])
+
+        events_df = stage('read_event_facts', fp.read_event_facts, files['events'])
+        events_df = stage('add_time_range', fp.add_time_range, events_df, 'end_year', 10, add_extra_yr_before=True)
+        stage('trim_to_years', trim_each_event, cpi_df, events_df.head(trim_events))
+        stage('add_cpi_values', fp.add_cpi_values, events_df, cpi_df)
+
+        index_events_df = fp.add_time_range(events_df.copy(), 'year_before_end_year', 10)
+        index_df = stage('get_index', fp.get_index, index_events_df, sp_df, 'real')
+        stage('add_mean_and_quartiles', fp.add_mean_and_quartiles, index_df)
+
+        stage('analyze_cpi', fp.analyze_cpi, files['cpi'], files['events'], 10, 'end_year')
+        stage('analyze_index', fp.analyze_index, files['sp500'], files['dowjones'], files['events'], [])
+        stage('analyze_gdp', fp.analyze_gdp, files['gdp'], files['events'], [])
+
+    return results
+
+
+def compare_to_baseline(results: dict, baseline: dict, threshold: float = REGRESSION_THRESHOLD) -> list:
+    """ Prints a table comparing benchmark results to a baseline, and finds the stages that got slower.  The baseline
+    should come from the same machine, as the seconds are compared directly.
+
+    :param results: Benchmark results by scale (as a string) and then stage
+    :param baseline: Baseline results in the same format
+    :param threshold: How many times slower than the baseline a stage must be to count as a regression
+    :return: A list of (scale, stage) for every regression
+
+    >>> baseline = {'1': {'add_cpi_values': {'seconds': 0.010, 'peak_mb': 1.0}}}
+    >>> results = {'1': {'add_cpi_values': {'seconds': 0.025, 'peak_mb': 1.5}, 'get_index': {'seconds': 1, \
+                                                                                             'peak_mb': 1}}}
+    >>> compare_to_baseline(results, baseline)
+    scale  stage                         seconds  baseline    ratio  peak MB
+    1      add_cpi_values                 0.0250    0.0100    2.50x      1.5  << regression
+    1      get_index                      1.0000         -        -      1.0
+    [('1', 'add_cpi_values')]
+    """
+    regressions = []
+    print('{:<6} {:<28} {:>8} {:>9} {:>8} {:>8}'.format('scale', 'stage', 'seconds', 'baseline', 'ratio', 'peak MB'))
+    for scale, stages in results.items():
+        for name, result in stages.items():
+            base = baseline.get(scale, {}).get(name)
+            line = '{:<6} {:<28} {:>8.4f}'.format(scale, name, result['seconds'])
+            if base:
+                ratio = result['seconds'] / base['seconds'] if base['seconds'] else float('inf')
+                line += ' {:>9.4f} {:>7.2f}x {:>8.1f}'.format(base['seconds'], ratio, result['peak_mb'])
+                if ratio > threshold:
+                    line += '  << regression'
+                    regressions.append((scale, name))
+            else:
+                line += ' {:>9} {:>8} {:>8.1f}'.format('-', '-', result['peak_mb'])
+            print(line)
+
+    return regressions
+
+
+def main(argv: Union[list, None] = None) -> int:
+    """
+    Runs the benchmarks from the command line.
+    :param argv: The command line arguments (defaults to sys.argv)
+    :return: The exit code, which is 1 if --compare found a regression
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the wars/pandemics analysis pipeline.')
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES,
+                        help='multiples of the shipped data size to benchmark (default: %(default)s)')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='baseline file (default: %(default)s)')
+    parser.add_argument('--save-baseline', action='store_true', help='save the results as the new baseline')
+    parser.add_argument('--compare', action='store_true',
+                        help='compare the results against the baseline (which must have been saved on this machine)')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for scale in args.scales:
+        print('Benchmarking at {}x...'.format(scale), file=sys.stderr)
+        results[str(scale)] = run_benchmarks(scale)
+
+    baseline = {}
+    if args.compare and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+    regressions = compare_to_baseline(results, baseline)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'numpy': np.__version__, 'pandas': pd.__version__,
+                       'results': results}, f, indent=2)
+
+    return 1 if args.compare and regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,397 @@
+"""
+IS597 Spring 2021 Final Project
+Group members: Kangyang Wang, Wendy Zhu, and Kay Avila
+
+Loader layer for the csv files under data/.  Each csv file is parsed by Pandas only once: the parsed, typed columns are
+kept in memory for the rest of the run, and are also saved as a binary snapshot (one numpy array per column, in a .npz
+file) in a .cache folder next to the csv file.  Snapshots are keyed by a hash of the csv file's contents and the options
+it was parsed with, and the file's modification time and size are checked on every load, so editing a csv file
+automatically invalidates its cached copies.
+"""
+import os
+import glob
+import json
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+from typing import Union
+from collections import OrderedDict
+
+# Folder name used for the snapshots, created next to each csv file
+CACHE_DIR_NAME = '.cache'
+
+# Memory limit of the window cache, in megabytes, unless set by this environment variable (or --window-cache-mb)
+DEFAULT_WINDOW_CACHE_MB = 64
+WINDOW_CACHE_ENV_VAR = 'FINAL_PROJECT_WINDOW_CACHE_MB'
+
+# Parsed dataframes by (file path, parse options), along with the file's modification time, size and content hash
+memory_cache = {}
+
+
+def options_key(read_csv_kwargs: dict) -> str:
+    """ Creates a short, stable key for the options a csv file is parsed with, so that the same file parsed in two
+    different ways gets two different snapshots.
+
+    :param read_csv_kwargs: The keyword arguments given to pd.read_csv()
+    :return: A hex string identifying the options
+
+    >>> options_key({'header': 0, 'usecols': ['Year', 'Value']}) == options_key({'usecols': ['Year', 'Value'], \
+                                                                                 'header': 0})
+    True
+    >>> options_key({'header': 0}) == options_key({})
+    False
+    """
+    options = json.dumps(read_csv_kwargs, sort_keys=True, default=str)
+    return hashlib.sha1(options.encode('utf-8')).hexdigest()[:12]
+
+
+def file_digest(filename: str) -> str:
+    """ Hashes the contents of a file.
+
+    :param filename: The file to hash
+    :return: The SHA-1 hex digest of the file contents
+    """
+    sha = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def encode_column(series: pd.Series) -> Union[tuple, None]:
+    """ Converts a dataframe column into plain numpy arrays that can be saved without pickling.  Numeric and datetime
+    columns are saved as they are.  Text columns are saved as a unicode array plus a mask of the missing values.
+
+    :param series: The column to convert
+    :return: A tuple of (kind, values, missing mask), or None if the column can't be saved this way
+
+    >>> kind, values, missing = encode_column(pd.Series(['a', None, 'ccc'], dtype='string'))
+    >>> kind, values, missing
+    ('string', array(['a', '', 'ccc'], dtype='<U3'), array([False,  True, False]))
+    >>> encode_column(pd.Series([1.5, 2.5], dtype='float32'))[0]
+    'float32'
+    >>> encode_column(pd.Series([{'a': 1}])) is None
+    True
+    """
+    if isinstance(series.dtype, pd.StringDtype) or series.dtype == object:
+        missing = series.isna().to_numpy(dtype=bool)
+        values = series.to_numpy(dtype=object, na_value='')
+        if not all(isinstance(v, str) for v in values):
+            return None
+        kind = 'string' if isinstance(series.dtype, pd.StringDtype) else 'object'
+        return kind, values.astype('U'), missing
+
+    if isinstance(series.dtype, np.dtype) and series.dtype.kind in 'biufM':
+        return str(series.dtype), series.to_numpy(), np.zeros(0, dtype=bool)
+
+    return None
+
+
+def decode_column(kind: str, values: np.ndarray, missing: np.ndarray) -> Union[np.ndarray, pd.arrays.StringArray]:
+    """ Reverses encode_column(), returning the values for a dataframe column.
+
+    :param kind: The kind of column from encode_column()
+    :param values: The values saved for the column
+    :param missing: The mask of missing values for text columns
+    :return: The values, ready to be put into a dataframe
+
+    >>> decode_column('string', np.array(['a', '', 'ccc']), np.array([False, True, False]))
+    <StringArray>
+    ['a', <NA>, 'ccc']
+    Length: 3, dtype: string
+    >>> decode_column('object', np.array(['a', '']), np.array([False, True]))
+    array(['a', nan], dtype=object)
+    """
+    if kind in ('string', 'object'):
+        values = values.astype(object)
+        if kind == 'string':
+            values[missing] = None
+            return pd.array(values, dtype='string')
+        values[missing] = np.nan
+        return values
+
+    return values.astype(kind, copy=False)
+
+
+def save_snapshot(df: pd.DataFrame, snapshot_file: str) -> bool:
+    """ Saves a dataframe as a columnar .npz snapshot.  The file is written under a temporary name first, so a reader
+    never sees a partly written snapshot.
+
+    :param df: The dataframe to save - it must have a default range index
+    :param snapshot_file: Where to save the snapshot
+    :return: Whether the snapshot could be saved
+    """
+    arrays = {}
+    columns = []
+    for i, name in enumerate(df.columns):
+        encoded = encode_column(df[name])
+        if encoded is None:
+            return False
+        kind, values, missing = encoded
+        arrays['values_{}'.format(i)] = values
+        arrays['missing_{}'.format(i)] = missing
+        columns.append({'name': name, 'kind': kind})
+
+    arrays['meta'] = np.array(json.dumps({'columns': columns, 'rows': len(df)}))
+
+    temp_file = '{}.{}.tmp'.format(snapshot_file, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(snapshot_file), exist_ok=True)
+        with open(temp_file, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(temp_file, snapshot_file)
+    except OSError:
+        # Caching is only an optimization, so a read-only data folder just means no snapshot
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        return False
+
+    return True
+
+
+def load_snapshot(snapshot_file: str) -> pd.DataFrame:
+    """ Loads a dataframe saved by save_snapshot().
+
+    :param snapshot_file: The snapshot to load
+    :return: The dataframe that was saved
+    """
+    with np.load(snapshot_file, allow_pickle=False) as arrays:
+        meta = json.loads(str(arrays['meta']))
+        data = {}
+        for i, column in enumerate(meta['columns']):
+            data[column['name']] = decode_column(column['kind'], arrays['values_{}'.format(i)],
+                                                 arrays['missing_{}'.format(i)])
+
+    return pd.DataFrame(data, index=pd.RangeIndex(meta['rows']), columns=[c['name'] for c in meta['columns']])
+
+
+def read_csv_cached(filename: str, **read_csv_kwargs) -> pd.DataFrame:
+    """ Drop-in replacement for pd.read_csv() for the files under data/.  The file is only parsed the first time it is
+    read with a given set of options; after that it is served from memory, or from a snapshot on disk if this is a new
+    run.  A change to the file's modification time or size causes its contents to be hashed again, and a changed hash
+    causes it to be parsed again.  A copy is always returned, so callers are free to modify it.
+
+    :param filename: The csv file to read
+    :param read_csv_kwargs: Any keyword arguments for pd.read_csv()
+    :return: A pandas dataframe of the csv file
+
+    >>> read_csv_cached('test.txt')  # doctest: +ELLIPSIS
+    Traceback (most recent call last):
+    ...
+    FileNotFoundError: [Errno 2] No such file or directory: 'test.txt'
+    >>> df = read_csv_cached('data/bls_us_cpi.csv', usecols=['Year', 'Value'], dtype={'Year': 'int16', \
+                                                                                      'Value': 'float32'})
+    >>> df.dtypes.tolist()
+    [dtype('int16'), dtype('float32')]
+    >>> df.equals(pd.read_csv('data/bls_us_cpi.csv', usecols=['Year', 'Value'], dtype={'Year': 'int16', \
+                                                                                       'Value': 'float32'}))
+    True
+    >>> clear_memory_cache()
+    >>> df = read_csv_cached('data/event_facts.csv', dtype={'Event_Name': 'string'})
+    >>> df.equals(pd.read_csv('data/event_facts.csv', dtype={'Event_Name': 'string'}))
+    True
+    """
+    stat = os.stat(filename)  # Raises the same FileNotFoundError as pd.read_csv()
+    options = options_key(read_csv_kwargs)
+    memory_key = (os.path.abspath(filename), options)
+
+    cached = memory_cache.get(memory_key)
+    if cached and cached['mtime'] == stat.st_mtime_ns and cached['size'] == stat.st_size:
+        return cached['df'].copy()
+
+    # The file is new to this run, or has been touched - see whether its contents actually changed
+    digest = file_digest(filename)
+    if cached and cached['digest'] == digest:
+        cached.update(mtime=stat.st_mtime_ns, size=stat.st_size)
+        return cached['df'].copy()
+
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(filename)), CACHE_DIR_NAME)
+    snapshot_prefix = os.path.join(cache_dir, '{}.{}.'.format(os.path.basename(filename), options))
+    snapshot_file = snapshot_prefix + digest[:16] + '.npz'
+
+    df = None
+    if os.path.exists(snapshot_file):
+        try:
+            df = load_snapshot(snapshot_file)
+        except (OSError, ValueError, KeyError):
+            df = None  # A damaged snapshot is simply replaced below
+    if df is None:
+        df = pd.read_csv(filename, **read_csv_kwargs)
+        if isinstance(df.index, pd.RangeIndex) and save_snapshot(df, snapshot_file):
+            # Remove snapshots of older versions of the file
+            for old_snapshot in glob.glob(glob.escape(snapshot_prefix) + '*.npz'):
+                if old_snapshot != snapshot_file:
+                    os.remove(old_snapshot)
+
+    memory_cache[memory_key] = {'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'digest': digest, 'df': df}
+    return df.copy()
+
+
+def clear_memory_cache() -> None:
+    """ Forgets all the dataframes held in memory, so that the next reads come from the snapshots on disk.
+
+    :return: None
+    """
+    memory_cache.clear()
+
+
+class WindowCache:
+    """ A bounded, least recently used memo of event windows: the changes in a data series over one window of years or
+    months.  Each window is kept on its own, keyed by the series (a hash of its values), the data type, the window's
+    first period and its length, so an event that turns up in several selections (e.g. the Korean War in "all wars"
+    and in "wars over 1m fatalities"), or in a sweep that comes back to the same zero point and length, is only
+    computed once.  When the windows held go over max_bytes, the ones used longest ago are dropped.
+
+    >>> cache = WindowCache(max_bytes=32)
+    >>> compute = lambda starts: np.stack([np.arange(start, start + 2, dtype='float64') for start in starts])
+    >>> cache.windows(('example',), np.array([1, 5]), compute)
+    array([[1., 2.],
+           [5., 6.]])
+    >>> cache.windows(('example',), np.array([5, 9]), compute)
+    array([[ 5.,  6.],
+           [ 9., 10.]])
+    >>> cache.stats()
+    {'hits': 1, 'misses': 3, 'evictions': 1, 'entries': 2, 'bytes': 32, 'max_bytes': 32}
+    >>> cache.windows(('example',), np.array([1]), compute).tolist(), cache.stats()['evictions']
+    ([[1.0, 2.0]], 2)
+    """
+    def __init__(self, max_bytes: int = 64 * 2 ** 20):
+        """ Starts an empty cache.
+
+        :param max_bytes: The most memory the windows may take, in bytes (0 turns the cache off)
+        """
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.n_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def windows(self, key: tuple, starts: np.ndarray, compute) -> np.ndarray:
+        """ Looks up the windows starting at each of the periods given, and computes the missing ones in one call.
+
+        :param key: Identifies everything about the windows other than where they start: the series, data type, length
+        :param starts: The first period of each window
+        :param compute: A function taking an array of starts, and returning their windows as a (window x period) array
+        :return: The (window x period) array of the windows, in the order of starts
+        """
+        starts = np.asarray(starts).tolist()
+        with self.lock:
+            found = [self.entries.get(key + (start,)) for start in starts]
+            for start, row in zip(starts, found):
+                if row is not None:
+                    self.entries.move_to_end(key + (start,))
+            missing = [position for position, row in enumerate(found) if row is None]
+            self.hits += len(starts) - len(missing)
+            self.misses += len(missing)
+
+        if missing or not starts:
+            computed = np.asarray(compute(np.array([starts[position] for position in missing], dtype='int64')))
+            with self.lock:
+                for position, row in zip(missing, computed):
+                    found[position] = np.array(row)  # A copy, so the rest of the computed array isn't kept alive
+                    self.store(key + (starts[position],), found[position])
+            if len(missing) == len(starts):
+                return computed
+        return np.stack(found)
+
+    def store(self, full_key: tuple, row: np.ndarray) -> None:
+        """ Adds a window, dropping the least recently used ones while the cache is over its limit.
+
+        :param full_key: The key of the window, including its first period
+        :param row: The window
+        :return: None
+        """
+        if row.nbytes > self.max_bytes:
+            return
+        if full_key in self.entries:
+            self.n_bytes -= self.entries.pop(full_key).nbytes
+        self.entries[full_key] = row
+        self.n_bytes += row.nbytes
+        while self.n_bytes > self.max_bytes:
+            _, dropped = self.entries.popitem(last=False)
+            self.n_bytes -= dropped.nbytes
+            self.evictions += 1
+
+    def resize(self, max_bytes: int) -> None:
+        """ Changes the memory limit, dropping windows if the cache is now over it.
+
+        :param max_bytes: The most memory the windows may take, in bytes
+        :return: None
+        """
+        with self.lock:
+            self.max_bytes = max_bytes
+            while self.entries and self.n_bytes > self.max_bytes:
+                _, dropped = self.entries.popitem(last=False)
+                self.n_bytes -= dropped.nbytes
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """ Drops every window and resets the counters.
+
+        :return: None
+        """
+        with self.lock:
+            self.entries.clear()
+            self.n_bytes = self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        """ Reports how well the cache is doing.
+
+        :return: The number of hits, misses and evictions, the windows held and their size in bytes, and the limit
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'entries': len(self.entries),
+                'bytes': self.n_bytes, 'max_bytes': self.max_bytes}
+
+
+def series_key(*arrays: np.ndarray) -> str:
+    """ Identifies a data series by its contents, for use in a WindowCache key.  Data series are small (at most a few
+    thousand rows), so hashing them takes microseconds.
+
+    :param arrays: The arrays making up the series, e.g. its years and values
+    :return: A hex string identifying the series
+
+    >>> series_key(np.arange(3), np.ones(3)) == series_key(np.arange(3), np.ones(3))
+    True
+    >>> series_key(np.arange(3), np.ones(3)) == series_key(np.arange(3), np.zeros(3))
+    False
+    """
+    sha = hashlib.sha1()
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        sha.update(str((array.dtype.str, array.shape)).encode('utf-8'))
+        sha.update(array.tobytes())
+    return sha.hexdigest()
+
+
+def window_cache_bytes(megabytes: Union[str, float, None]) -> int:
+    """ Reads the memory limit of the window cache, as given on the command line or in WINDOW_CACHE_ENV_VAR.
+
+    :param megabytes: The limit in megabytes (0 turns the cache off), or None for the default
+    :return: The limit in bytes
+
+    >>> window_cache_bytes('0.5'), window_cache_bytes(None) == DEFAULT_WINDOW_CACHE_MB * 2 ** 20
+    (524288, True)
+    >>> window_cache_bytes('lots')
+    Traceback (most recent call last):
+    ...
+    ValueError: The window cache size must be a number of megabytes (0 or more), not 'lots'
+    """
+    if megabytes is None or megabytes == '':
+        megabytes = DEFAULT_WINDOW_CACHE_MB
+    try:
+        n_bytes = int(float(megabytes) * 2 ** 20)
+    except ValueError:
+        n_bytes = -1
+    if n_bytes < 0:
+        raise ValueError('The window cache size must be a number of megabytes (0 or more), not {!r}'.format(megabytes))
+    return n_bytes
+
+
+# Windows of the data series for the whole run, shared by add_cpi_values(), get_index() and get_index_windows()
+window_cache = WindowCache(window_cache_bytes(os.environ.get(WINDOW_CACHE_ENV_VAR)))
@@ -6,32 +6,14 @@ Reads in event data about pandemics and wars, as well as data from the United St
 Gross Domestic Product (GPD), and stock market S&P500 and Dow Jones.  Then creates a series of plots combining
 these data sets.
 
-This version uses compiled cython functions when "from final_project_cython import *" is enabled.  Travis CI
-does not like this, so a pure python version is saved in Git.
+This version requires the compiled kernels in final_project_cython, which can be built with
+"python setup.py build_ext --inplace".  final_project.py uses them automatically when they have been built, and falls
+back to pure python otherwise.  It takes the same command line options as final_project.py.
 """
-
-# Enable this to use cython:
-#from final_project_cython.final_project_cython import *
-# Disable this to use cython:
 from final_project import *
 
 
-def main():
-    """
-    Main function for starting all data processing and plotting
-    :return: None
-    """
-    us_cpi_data = 'data/bls_us_cpi.csv'
-    events_data = 'data/event_facts.csv'
-    sp500_data = 'data/sp500_monthly.csv'
-    dowjones_data = 'data/dow_jone_monthly.csv'
-    us_gdp_data = 'data/gdp_usafacts.csv'
-
-    analyze_index(sp500_data, dowjones_data, events_data)
-    analyze_gdp(us_gdp_data, events_data)
-    pandemics_cpi_df, wars_cpi_df = analyze_cpi(us_cpi_data, events_data, 10, 'end_year')
-    plot_all_cpi_graphs(pandemics_cpi_df, wars_cpi_df)
-
-
 if __name__ == '__main__':
-    main()
+    # Fail right away if the compiled kernels haven't been built, rather than quietly running without them
+    set_kernels('cython')
+    cli()
@@ -0,0 +1,192 @@
+"""
+IS597 Spring 2021 Final Project
+Group members: Kangyang Wang, Wendy Zhu, and Kay Avila
+
+Converts nominal series into real ones with the monthly CPI from the US Bureau of Labor Statistics.  The monthly S&P
+500 and Dow Jones files come with a "real" column already, but only in dollars of their last month, and the daily
+indexes and GDP have no real values at all.  A CPIDeflator lines the monthly CPI up with any series (monthly, daily or
+yearly) by array position, so a whole series is deflated in one step, to any base period: a month, a year's average,
+or the latest month.  Deflated series are kept in the shared window cache (see final_project_cache.WindowCache), so
+they are bounded by the same memory limit as the event windows, and the CPI file is reloaded if it changes.
+
+    deflator = CPIDeflator.load()
+    sp500_daily = add_real_column(fp.read_index_daily(fp.DAILY_INDEX_INPUTS['sp500']), base=2000)
+"""
+import os
+import re
+import numpy as np
+import pandas as pd
+from typing import Union, Literal
+
+import final_project as fp
+from final_project_cache import series_key, window_cache
+
+# CPIDeflator by CPI file, along with the file's modification time and size when it was loaded
+deflators = {}
+
+
+class CPIDeflator:
+    """ The monthly CPI levels as a dense array by month, for deflating nominal series.  Months after the last CPI
+    value use the last value (as the real columns shipped in sp500_monthly.csv and dow_jone_monthly.csv do), and months
+    before the first are missing.
+
+    >>> deflator = CPIDeflator.load()
+    >>> deflator.base_level('latest'), deflator.base_level('1990-01'), round(deflator.base_level(1990), 4)
+    (276.589, 127.4, 130.6583)
+    >>> deflator.deflate([24261, 23880, 22900], [100., 100., 100.], 'monthly', base='1990-01').round(3)
+    array([ 46.061, 100.   ,     nan])
+    >>> sp500 = fp.read_index_monthly('data/sp500_monthly.csv')
+    >>> real = deflator.deflate(sp500['month_ordinal'], sp500['nominal'], 'monthly')
+    >>> float(np.max(np.abs(real / sp500['real'] - 1))) < 0.001
+    True
+    """
+    def __init__(self, cpi_df: pd.DataFrame):
+        """ Lays out the CPI levels by month.
+
+        :param cpi_df: The monthly CPI, from final_project.read_us_cpi_monthly()
+        """
+        months = cpi_df['month_ordinal'].to_numpy(dtype='int64')
+        if not len(months):
+            raise ValueError('There must be at least one month of CPI data')
+        self.first_month = int(months[0])
+        self.last_month = int(months[-1])
+        self.levels = fp.extract_windows(months, cpi_df['Value'].to_numpy(dtype='float64'),
+                                         np.array([self.first_month]), self.last_month - self.first_month + 1)[0]
+        self.key = series_key(months, self.levels)
+
+    @classmethod
+    def load(cls, filename: str = fp.DEFAULT_INPUTS['cpi']) -> 'CPIDeflator':
+        """ Gets the deflator for a CPI file, reading the file only the first time or if it has changed.
+
+        :param filename: The csv file with the monthly CPI data
+        :return: The deflator
+        """
+        stat = os.stat(filename)
+        key = os.path.abspath(filename)
+        cached = deflators.get(key)
+        if cached is None or cached['mtime'] != stat.st_mtime_ns or cached['size'] != stat.st_size:
+            cached = {'mtime': stat.st_mtime_ns, 'size': stat.st_size,
+                      'deflator': cls(fp.read_us_cpi_monthly(filename))}
+            deflators[key] = cached
+        return cached['deflator']
+
+    def month_levels(self, months: Union[np.ndarray, pd.Series, list]) -> np.ndarray:
+        """ Looks up the CPI for each of many months at once.
+
+        :param months: Month ordinals (year * 12 + month - 1)
+        :return: The CPI of each month
+        """
+        positions = np.minimum(np.asarray(months, dtype='int64'), self.last_month) - self.first_month
+        levels = self.levels[np.clip(positions, 0, len(self.levels) - 1)]
+        return np.where(positions >= 0, levels, np.nan)
+
+    def year_levels(self, years: Union[np.ndarray, pd.Series, list]) -> np.ndarray:
+        """ Looks up the average CPI of each of many years at once, over the months there is data for (as
+        final_project.read_us_cpi() does).
+
+        :param years: The years
+        :return: The average CPI of each year
+        """
+        first_year, last_year = self.first_month // 12, self.last_month // 12
+        months = fp.extract_windows(np.arange(self.first_month, self.last_month + 1), self.levels,
+                                    np.arange(first_year, last_year + 1) * 12, 12)
+        counts = np.sum(~np.isnan(months), axis=1)
+        with np.errstate(invalid='ignore'):
+            averages = np.nansum(months, axis=1) / np.where(counts > 0, counts, np.nan)
+
+        positions = np.asarray(years, dtype='int64') - first_year
+        valid = (positions >= 0) & (positions < len(averages))
+        return np.where(valid, averages[np.clip(positions, 0, len(averages) - 1)], np.nan)
+
+    def base_level(self, base: Union[str, int] = 'latest') -> float:
+        """ Finds the CPI of a base period.
+
+        :param base: "latest" for the last month with CPI data, a year (e.g. 2000) for its average, or a month as
+                     "YYYY-MM" (e.g. "2000-01")
+        :return: The CPI of the base period
+        """
+        level = np.nan
+        if base == 'latest':
+            level = self.levels[-1]
+        elif isinstance(base, (int, np.integer)) or (isinstance(base, str) and re.fullmatch(r'\d{4}', base)):
+            level = self.year_levels([int(base)])[0]
+        elif isinstance(base, str) and re.fullmatch(r'\d{4}-(0[1-9]|1[0-2])', base):
+            month = int(base[:4]) * 12 + int(base[5:]) - 1
+            if month <= self.last_month:
+                level = self.month_levels([month])[0]
+
+        if np.isnan(level):
+            raise ValueError("Invalid base period given: {}. Valid base periods: 'latest', or a year (e.g. 2000) or "
+                             "month (e.g. '2000-01') with CPI data".format(base))
+        return float(level)
+
+    def deflate(self, periods: Union[np.ndarray, pd.Series, list], values: Union[np.ndarray, pd.Series, list],
+                resolution: Literal['monthly', 'daily', 'yearly'], base: Union[str, int] = 'latest') -> np.ndarray:
+        """ Converts a nominal series into a real one in dollars of the base period.  Results are kept in the window
+        cache, so deflating the same series to the same base again is usually a lookup.
+
+        :param periods: The period of each value: month ordinals for monthly data, dates for daily data (as
+                        datetime64 values), or years for yearly data
+        :param values: The nominal values
+        :param resolution: "monthly", "daily" or "yearly"
+        :param base: The base period (see base_level())
+        :return: The real values (NaN where there is no CPI data)
+        """
+        periods, values = np.asarray(periods), np.asarray(values, dtype='float64')
+        if resolution == 'daily':
+            periods = periods.astype('datetime64[M]').astype('int64') + 1970 * 12
+        elif resolution not in ['monthly', 'yearly']:
+            raise ValueError('The resolution must be monthly, daily or yearly')
+        periods = periods.astype('int64')
+
+        def compute(_):
+            levels = self.year_levels(periods) if resolution == 'yearly' else self.month_levels(periods)
+            return (values * self.base_level(base) / levels)[np.newaxis]
+
+        key = ('deflated', self.key, series_key(periods, values), resolution == 'yearly', str(base))
+        return window_cache.windows(key, np.array([0]), compute)[0].copy()
+
+
+def add_real_column(df_index: pd.DataFrame, base: Union[str, int] = 'latest',
+                    cpi_file: str = fp.DEFAULT_INPUTS['cpi']) -> pd.DataFrame:
+    """ Adds (or replaces) the "real" column of market index data, from its "nominal" column.
+
+    :param df_index: Monthly data from final_project.read_index_monthly(), or daily data from
+                     final_project.read_index_daily()
+    :param base: The base period (see CPIDeflator.base_level())
+    :param cpi_file: The csv file with the monthly CPI data
+    :return: A copy of the data with the "real" column
+
+    >>> daily = add_real_column(fp.read_index_daily('data/sp_500_index_daily.csv'), base=2000)
+    >>> daily.tail(2).round(2)
+                date  nominal  year     real
+    24675 2021-11-18  4704.54  2021  2928.97
+    24676 2021-11-19  4697.96  2021  2924.88
+    """
+    deflator = CPIDeflator.load(cpi_file)
+    if 'month_ordinal' in df_index.columns:
+        real = deflator.deflate(df_index['month_ordinal'], df_index['nominal'], 'monthly', base)
+    else:
+        real = deflator.deflate(df_index['date'].to_numpy(), df_index['nominal'], 'daily', base)
+    return df_index.assign(real=real)
+
+
+def real_gdp(gdp: pd.Series, base: Union[str, int] = 'latest', cpi_file: str = fp.DEFAULT_INPUTS['cpi']) \
+        -> pd.Series:
+    """ Deflates a yearly GDP series (or any of its components) by the average CPI of each year.
+
+    :param gdp: Nominal values indexed by year, e.g. a row of final_project.read_gdp_line_items()
+    :param base: The base period (see CPIDeflator.base_level())
+    :param cpi_file: The csv file with the monthly CPI data
+    :return: The real values, indexed by year
+
+    >>> gdp = fp.read_gdp_line_items('data/gdp_usafacts.csv').loc[fp.GDP_COMPONENTS['GDP']]
+    >>> (real_gdp(gdp, base=2012).loc[[1929, 2012]] / 1e9).round(1)
+    Year
+    1929     1399.6
+    2012    16197.0
+    Name: Gross domestic product ($), dtype: float64
+    """
+    deflator = CPIDeflator.load(cpi_file)
+    return pd.Series(deflator.deflate(gdp.index.to_numpy(dtype='int64'), gdp.to_numpy(dtype='float64'), 'yearly', base),
+                     index=gdp.index, name=gdp.name)
@@ -0,0 +1,211 @@
+"""
+IS597 Spring 2021 Final Project
+Group members: Kangyang Wang, Wendy Zhu, and Kay Avila
+
+Finds events that overlap in time.  Some of the events overlap each other (the Diphtheria epidemic, the Spanish Flu
+and World War I all fall in the same few years), so their windows show the same CPI changes, and the effect of one
+can't be told apart from the others.  EventIntervalTree answers "which events overlap these years" for a catalog of
+any size, and resolve_overlaps() drops or merges overlapping events before their windows are extracted.
+
+Years are inclusive, so an event ending in 1918 overlaps one starting in 1918.
+"""
+import numpy as np
+import pandas as pd
+from typing import Union, Literal
+
+
+class EventIntervalTree:
+    """ A static interval tree over the years of a set of events.  The events are sorted by start year, and a tree
+    holds the latest end year under each node, so a query only visits the branches that have an overlapping event:
+    O(log n + k) nodes for k matches, rather than comparing against every event.
+
+    >>> events = pd.DataFrame({'Start_Year': [1921, 1916, 1918, 1957, 1914], \
+                               'End_Year': [1925, 1955, 1920, 1958, 1918]}, index=[0, 1, 2, 3, 11])
+    >>> tree = EventIntervalTree.from_events(events)
+    >>> tree.overlapping(1919, 1922)
+    array([0, 1, 2])
+    >>> tree.overlapping(1956, 1956)
+    array([], dtype=int64)
+    >>> tree.count_overlapping([1918, 1950], [1918, 1960])
+    array([3, 2])
+    """
+    def __init__(self, starts: np.ndarray, ends: np.ndarray, labels: Union[np.ndarray, None] = None):
+        """ Builds the tree.
+
+        :param starts: The first year of each event
+        :param ends: The last year of each event
+        :param labels: What to return for each event (defaults to its position)
+        """
+        starts = np.asarray(starts, dtype='int64')
+        ends = np.asarray(ends, dtype='int64')
+        if starts.shape != ends.shape:
+            raise ValueError('There must be an end year for every start year')
+        if np.any(ends < starts):
+            raise ValueError('Events cannot end before they start')
+
+        self.order = np.argsort(starts, kind='stable')
+        self.starts = starts[self.order]
+        self.ends = ends[self.order]
+        self.labels = np.arange(len(starts)) if labels is None else np.asarray(labels)
+
+        # A complete binary tree over the events sorted by start year, with each node holding the latest end year
+        # under it.  Built a level at a time from the leaves up.
+        self.size = 1
+        while self.size < max(len(starts), 1):
+            self.size *= 2
+        max_end = np.full(2 * self.size, np.iinfo('int64').min)
+        max_end[self.size:self.size + len(starts)] = self.ends
+        level = self.size
+        while level > 1:
+            max_end[level // 2:level] = np.maximum(max_end[level:2 * level:2], max_end[level + 1:2 * level:2])
+            level //= 2
+        self.max_end = max_end.tolist()  # Python ints are faster to walk than numpy scalars
+
+    @classmethod
+    def from_events(cls, e_df: pd.DataFrame, start_col: str = 'Start_Year', end_col: str = 'End_Year') \
+            -> 'EventIntervalTree':
+        """ Builds the tree over the events in a dataframe, such as one from read_event_facts().  Use
+        start_col='y_start' and end_col='y_end' for the windows from add_time_range().
+
+        :param e_df: The events
+        :param start_col: The column with the first year of each event
+        :param end_col: The column with the last year of each event
+        :return: The tree, which returns the events' index labels
+        """
+        return cls(e_df[start_col].to_numpy(), e_df[end_col].to_numpy(), e_df.index.to_numpy())
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def overlapping_positions(self, start: int, end: int) -> np.ndarray:
+        """ Finds the events that overlap some years.
+
+        :param start: The first year
+        :param end: The last year
+        :return: The positions of the events, in the order they were given to the tree
+        """
+        # Only events starting by the end year can overlap, and they're the first ones in start year order
+        n_candidates = int(np.searchsorted(self.starts, end, side='right'))
+        found = []
+        stack = [(1, 0, self.size)]
+        while stack:
+            node, first, last = stack.pop()
+            if first >= n_candidates or self.max_end[node] < start:
+                continue
+            if node >= self.size:
+                found.append(node - self.size)
+            else:
+                middle = (first + last) // 2
+                stack.append((2 * node + 1, middle, last))
+                stack.append((2 * node, first, middle))
+
+        return np.sort(self.order[np.array(found, dtype='int64')])
+
+    def overlapping(self, start: int, end: int) -> np.ndarray:
+        """ Finds the events that overlap some years.
+
+        :param start: The first year
+        :param end: The last year
+        :return: The labels of the events, in the order they were given to the tree
+        """
+        return self.labels[self.overlapping_positions(start, end)]
+
+    def count_overlapping(self, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """ Counts the events overlapping each of many year ranges at once.  An event overlaps unless it starts after
+        the range ends or ends before the range starts, so the count is two binary searches per range.
+
+        :param starts: The first year of each range
+        :param ends: The last year of each range
+        :return: The number of events overlapping each range
+        """
+        sorted_ends = np.sort(self.ends)
+        started = np.searchsorted(self.starts, np.asarray(ends), side='right')
+        ended = np.searchsorted(sorted_ends, np.asarray(starts), side='left')
+        return started - ended
+
+
+def overlap_groups(e_df: pd.DataFrame, start_col: str = 'Start_Year', end_col: str = 'End_Year') -> np.ndarray:
+    """ Groups events that overlap, directly or through other events (if A overlaps B and B overlaps C, they're all
+    one group).  This is a single sweep through the events in start year order.
+
+    :param e_df: The events
+    :param start_col: The column with the first year of each event
+    :param end_col: The column with the last year of each event
+    :return: A group number for each event, in the order of the dataframe, numbered in order of the groups' start years
+
+    >>> events = pd.DataFrame({'Start_Year': [1921, 1957, 1918, 1914, 1968], 'End_Year': [1925, 1958, 1920, 1918, 1970]})
+    >>> overlap_groups(events)
+    array([1, 2, 0, 0, 3])
+    """
+    starts = e_df[start_col].to_numpy(dtype='int64')
+    ends = e_df[end_col].to_numpy(dtype='int64')
+    order = np.argsort(starts, kind='stable')
+
+    # A new group starts whenever an event starts after every earlier event has ended
+    latest_end = np.maximum.accumulate(ends[order])
+    new_group = np.ones(len(order), dtype=bool)
+    new_group[1:] = starts[order][1:] > latest_end[:-1]
+
+    groups = np.empty(len(order), dtype='int64')
+    groups[order] = np.cumsum(new_group) - 1
+    return groups
+
+
+def resolve_overlaps(e_df: pd.DataFrame, how: Literal['exclude', 'merge'], start_col: str = 'Start_Year',
+                     end_col: str = 'End_Year') -> pd.DataFrame:
+    """ Deals with events that overlap each other, before their windows are extracted.
+
+    :param e_df: The events, e.g. from read_event_facts()
+    :param how: "exclude" to drop every event that overlaps another, or "merge" to combine each group of overlapping
+                events into one event covering all of their years
+    :param start_col: The column with the first year of each event
+    :param end_col: The column with the last year of each event
+    :return: The events left, in their original order.  Merged events keep the index of their first event, have their
+             names (and any other text) joined with " / ", the highest of any ordered categories (such as Fatalities),
+             and the start and end years of the whole group.
+
+    >>> events = pd.DataFrame({'Event_Name': ['Diphtheria', 'Asian Flu', 'Spanish Flu', 'Hong Kong Flu'], \
+                               'Start_Year': [1921, 1957, 1918, 1968], 'End_Year': [1925, 1958, 1921, 1970]})
+    >>> resolve_overlaps(events, 'exclude')
+          Event_Name  Start_Year  End_Year
+    1      Asian Flu        1957      1958
+    3  Hong Kong Flu        1968      1970
+    >>> resolve_overlaps(events, 'merge')
+                     Event_Name  Start_Year  End_Year
+    0  Diphtheria / Spanish Flu        1918      1925
+    1                 Asian Flu        1957      1958
+    3             Hong Kong Flu        1968      1970
+    """
+    if how not in ['exclude', 'merge']:
+        raise ValueError('Overlapping events can only be excluded or merged')
+
+    groups = overlap_groups(e_df, start_col, end_col)
+    group_sizes = np.bincount(groups, minlength=1)
+    if how == 'exclude':
+        return e_df[group_sizes[groups] == 1]
+
+    # Merge: single events are kept as they are, and each larger group is collapsed into its first event
+    first_in_group = ~pd.Series(groups).duplicated().to_numpy()
+    merged = e_df[first_in_group].copy()
+    in_merged_group = group_sizes[groups] > 1
+    if not in_merged_group.any():
+        return merged
+
+    members = e_df[in_merged_group].groupby(groups[in_merged_group], sort=False)
+    firsts = members.head(1).index
+    for column in e_df.columns:
+        if column == start_col:
+            values = members[column].min()
+        elif column == end_col:
+            values = members[column].max()
+        elif column == 'Duration':
+            values = members[end_col].max() - members[start_col].min()
+        elif isinstance(e_df[column].dtype, pd.CategoricalDtype) and e_df[column].cat.ordered:
+            values = members[column].max()  # e.g. the worst of the fatality buckets
+        elif not pd.api.types.is_numeric_dtype(e_df[column]):
+            values = members[column].agg(lambda names: ' / '.join(pd.unique(names.astype(str))))
+        else:
+            continue
+        merged.loc[firsts, column] = values.to_numpy()
+
+    return merged
@@ -0,0 +1,258 @@
+"""
+IS597 Spring 2021 Final Project
+Group members: Kangyang Wang, Wendy Zhu, and Kay Avila
+
+A lazy version of the analysis steps in final_project.py.  Each step there returns a new dataframe: the events are
+read and filtered into one, add_time_range() adds columns to a copy, the windows become a dataframe with a column per
+event, and add_mean_and_quartiles() adds more columns to that.  An EventPipeline only records the steps, and when it
+is executed runs them together on arrays: the filters are a selection of row positions from the event catalog, the
+zero points and windows are computed from the years of just those rows, every window is gathered at once, and only
+the columns asked for (or needed by the plots) are built, e.g. only the quartiles for a quartile plot.
+
+    pipeline = (EventPipeline().filter(types='War', min_start_year=1913, min_end_year=1913)
+                .time_range('end_year', 10, add_extra_yr_before=True).windows('cpi').stats())
+    wars_quartiles = pipeline.execute(columns=['25pct', 'median', '75pct'])
+"""
+import numpy as np
+import pandas as pd
+from typing import Union, Literal
+
+import final_project as fp
+
+# The data series windows can be taken from, and whether they are yearly or monthly
+SERIES_RESOLUTION = {'cpi': 'yearly', 'sp500': 'monthly', 'dowjones': 'monthly'}
+
+# The statistics stats() can add, and the percentile each one needs (if any)
+STAT_PERCENTILES = {'mean': None, 'std': None, 'count': None, 'median': 50, '25pct': 25, '75pct': 75}
+
+# What each kind of plot needs from the data
+QUARTILE_COLUMNS = ['25pct', 'median', '75pct']
+
+
+class EventPipeline:
+    """ A chain of analysis steps that is only run by execute().  Each method returns a new pipeline with the step
+    added, so a pipeline can be shared and extended.
+
+    >>> wars = EventPipeline().filter(types='War').filter(min_start_year=1913, min_end_year=1913)
+    >>> cpi = wars.time_range('end_year', 10, add_extra_yr_before=True).windows('cpi').stats()
+    >>> cpi
+    EventPipeline('data/event_facts.csv', filter(types='War'), filter(min_start_year=1913, min_end_year=1913), \
+time_range('end_year', 10, add_extra_yr_before=True), windows('cpi'), stats())
+    >>> cpi.execute(columns=['mean', 'median']).loc[-2:2]
+            mean    median
+    -2  4.008126  4.292762
+    -1  4.212369  2.279294
+    0   5.002308  4.125607
+    1   5.965991  3.028822
+    2   6.509256  2.951658
+    """
+    def __init__(self, events_file: str = fp.DEFAULT_INPUTS['events'], steps: tuple = ()):
+        """ Starts a pipeline.
+
+        :param events_file: The csv file of events
+        :param steps: The steps recorded so far, as (name, args, kwargs) tuples
+        """
+        self.events_file = events_file
+        self.steps = tuple(steps)
+
+    def __repr__(self) -> str:
+        steps = []
+        for name, args, kwargs in self.steps:
+            arguments = [repr(arg) for arg in args] + ['{}={!r}'.format(key, value) for key, value in kwargs.items()]
+            steps.append('{}({})'.format(name, ', '.join(arguments)))
+        return 'EventPipeline({})'.format(', '.join([repr(self.events_file)] + steps))
+
+    def add_step(self, name: str, *args, **kwargs) -> 'EventPipeline':
+        """ Returns a copy of the pipeline with another step added.
+
+        :param name: The step
+        :param args: Its arguments
+        :param kwargs: Its keyword arguments
+        :return: The new pipeline
+        """
+        return EventPipeline(self.events_file, self.steps + ((name, args, kwargs),))
+
+    def step(self, name: str) -> Union[tuple, None]:
+        """ Finds a step that can only be given once.
+
+        :param name: The step
+        :return: The step's (name, args, kwargs), or None if it hasn't been added
+        """
+        found = [step for step in self.steps if step[0] == name]
+        if len(found) > 1:
+            raise ValueError('A pipeline can only have one {} step'.format(name))
+        return found[0] if found else None
+
+    def filter(self, **filters) -> 'EventPipeline':
+        """ Selects events, with the same filters as read_event_facts().  Several filters select the events matching
+        all of them.
+
+        :param filters: The keyword arguments of read_event_facts(), e.g. types='War'
+        :return: The new pipeline
+        """
+        return self.add_step('filter', **filters)
+
+    def time_range(self, t0: Literal['start_year', 'end_year', 'year_before_end_year', 'year_after_start_year'],
+                   length: int, add_extra_yr_before: bool = False) -> 'EventPipeline':
+        """ Sets the window of years around each event, as add_time_range() does.
+
+        :param t0: The zero point of each event
+        :param length: The number of years before and after the zero point
+        :param add_extra_yr_before: Whether to add a year before the window, so the first year has a change
+        :return: The new pipeline
+        """
+        kwargs = {'add_extra_yr_before': True} if add_extra_yr_before else {}
+        return self.add_step('time_range', t0, length, **kwargs)
+
+    def windows(self, series: Literal['cpi', 'sp500', 'dowjones'], filename: Union[str, None] = None,
+                data_type: Literal['real', 'nominal'] = 'real') -> 'EventPipeline':
+        """ Takes the changes in a data series over each event's window: the yearly % change in CPI, as add_cpi_values()
+        does, or the monthly change in a stock market index, as get_index_windows() does (dropping the events without
+        monthly index data).
+
+        :param series: "cpi", "sp500" or "dowjones"
+        :param filename: The data file (defaults to the one in final_project.DEFAULT_INPUTS)
+        :param data_type: "real" or "nominal", for the stock market indexes
+        :return: The new pipeline
+        """
+        if series not in SERIES_RESOLUTION:
+            raise ValueError('The series must be one of ' + ', '.join(SERIES_RESOLUTION))
+        kwargs = {}
+        if filename:
+            kwargs['filename'] = filename
+        if data_type != 'real':
+            kwargs['data_type'] = data_type
+        return self.add_step('windows', series, **kwargs)
+
+    def stats(self, extra_percentiles: Union[list, None] = None) -> 'EventPipeline':
+        """ Adds statistics across the events, as add_mean_and_quartiles() does (and "std" and "count").
+
+        :param extra_percentiles: Any other percentiles to make available, as columns named like "5pct"
+        :return: The new pipeline
+        """
+        return self.add_step('stats', **({'extra_percentiles': list(extra_percentiles)} if extra_percentiles else {}))
+
+    def render(self, plot_name: str, title: str, x_label: str, y_label: str, plot_quartiles: bool = False,
+               plot_mean: bool = False) -> 'EventPipeline':
+        """ Plots the result with plot_cpi() when the pipeline is executed.  A pipeline can have several of these.
+
+        :param plot_name: The file name to be used for the plot
+        :param title: The title to be used for the plot
+        :param x_label: The x label to be used for the plot
+        :param y_label: The y label to be used for the plot
+        :param plot_quartiles: Whether to plot the quartiles instead of the events
+        :param plot_mean: Whether to plot the mean instead of the events
+        :return: The new pipeline
+        """
+        kwargs = {}
+        if plot_quartiles:
+            kwargs['plot_quartiles'] = True
+        if plot_mean:
+            kwargs['plot_mean'] = True
+        return self.add_step('render', plot_name, title, x_label, y_label, **kwargs)
+
+    def needed_columns(self) -> list:
+        """ Works out the columns the plots need, in the order they are built.
+
+        :return: A list of columns, where "events" stands for the column of every event
+        """
+        needed = []
+        for name, _, kwargs in self.steps:
+            if name != 'render':
+                continue
+            if kwargs.get('plot_quartiles'):
+                needed += QUARTILE_COLUMNS
+            if kwargs.get('plot_mean'):
+                needed.append('mean')
+            if not (kwargs.get('plot_quartiles') or kwargs.get('plot_mean')):
+                needed.append('events')
+        return list(dict.fromkeys(needed))
+
+    def select_events(self) -> tuple:
+        """ Runs the filter steps.
+
+        :return: The catalog of events, and the positions of the selected ones
+        """
+        catalog = fp.EventCatalog.load(self.events_file)
+        positions = np.arange(len(catalog))
+        for name, _, filters in self.steps:
+            if name == 'filter':
+                fp.check_event_year_filters(*[filters.get(key) for key in ['min_start_year', 'max_start_year',
+                                                                             'min_end_year', 'max_end_year']])
+                positions = np.intersect1d(positions, catalog.select(**filters), assume_unique=True)
+        return catalog, positions
+
+    def execute(self, columns: Union[list, None] = None, plots: Union[list, None] = None) -> pd.DataFrame:
+        """ Runs the pipeline.
+
+        :param columns: The columns wanted: event columns by name, "events" for all of them, and statistics from
+                        stats().  Defaults to the columns needed by the render steps, or all of them if there are none.
+        :param plots: If a list is given, the plots of the render steps are added to it to be drawn later by
+                      render_plots(), otherwise they are drawn right away
+        :return: A dataframe of the columns, indexed by year relative to the zero point for yearly series, and by the
+                 month of the window (from 1) for monthly ones
+        """
+        time_range, windows, stats = self.step('time_range'), self.step('windows'), self.step('stats')
+        if time_range is None or windows is None:
+            raise ValueError('A pipeline needs a time_range and a windows step to be executed')
+
+        extra_percentiles = stats[2].get('extra_percentiles', []) if stats else []
+        percentile_of = dict(STAT_PERCENTILES, **{'{:g}pct'.format(pct): pct for pct in extra_percentiles})
+        renders = [step for step in self.steps if step[0] == 'render']
+        if columns is None:
+            columns = self.needed_columns() if renders else ['events'] + (list(percentile_of) if stats else [])
+        wanted_stats = [column for column in columns if column in percentile_of]
+        if wanted_stats and not stats:
+            raise ValueError('Statistics need a stats step: ' + ', '.join(wanted_stats))
+
+        # Filters: row positions only, nothing is copied out of the catalog yet
+        catalog, positions = self.select_events()
+        events = {name: catalog.df[name].to_numpy()[positions] for name in ['Event_Name', 'Start_Year', 'End_Year']}
+
+        # Time range: the zero point and first year of every event's window
+        t0, length = time_range[1]
+        n_years = 2 * length + 1 + (1 if time_range[2].get('add_extra_yr_before') else 0)
+        last_years = np.asarray(fp.zero_point_years(events, t0), dtype='int64') + length
+        first_years = last_years - n_years + 1
+
+        # Windows: one gather and one percentage change for all the events
+        series = windows[1][0]
+        filename = windows[2].get('filename') or fp.DEFAULT_INPUTS[series]
+        if SERIES_RESOLUTION[series] == 'yearly':
+            cpi_df = fp.read_us_cpi(filename)
+            values = fp.extract_windows(cpi_df['Year'].to_numpy(), cpi_df['Value'].to_numpy(), first_years, n_years)
+            changes = (fp.pct_change_windows(values) * 100).astype('float64')
+            index = pd.RangeIndex(length - n_years + 2, length + 1)
+            names = ['{} (ended {})'.format(event, end_year)
+                     for event, end_year in zip(events['Event_Name'], events['End_Year'])]
+        else:
+            available = fp.monthly_index_available(first_years, last_years)
+            df_index = fp.read_index_monthly(filename)
+            values = fp.extract_windows(df_index['month_ordinal'].to_numpy(),
+                                        df_index[windows[2].get('data_type', 'real')].to_numpy(),
+                                        first_years[available] * 12, n_years * 12)
+            changes = fp.pct_change_windows(values.astype('float64'))
+            index = pd.RangeIndex(1, changes.shape[1] + 1)
+            names = events['Event_Name'][available].tolist()
+
+        # Only the columns wanted are built, and only the percentiles wanted are calculated
+        result = {}
+        if 'events' in columns or any(column in names for column in columns):
+            wanted = names if 'events' in columns else [column for column in columns if column in names]
+            for column, name in enumerate(names):
+                if name in wanted:
+                    result[name] = changes[column]
+        if wanted_stats:
+            percentiles = [percentile_of[column] for column in wanted_stats if percentile_of[column] is not None]
+            by_relative_year = fp.row_statistics(changes.T, percentiles=percentiles)
+            for column in wanted_stats:
+                result[column] = by_relative_year[column if percentile_of[column] is None else percentile_of[column]]
+
+        df = pd.DataFrame(result, index=index)
+        for _, args, kwargs in renders:
+            needed = EventPipeline(self.events_file, (('render', args, kwargs),)).needed_columns()
+            plot_columns = [column for column in df.columns if column in needed or
+                            ('events' in needed and column in names)]
+            fp.queue_plot(plots, fp.plot_cpi, df[plot_columns], *args, **kwargs)
+
+        return df
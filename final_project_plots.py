@@ -0,0 +1,127 @@
+"""
+IS597 Spring 2021 Final Project
+Group members: Kangyang Wang, Wendy Zhu, and Kay Avila
+
+The drawing code for the plots in final_project.py.  Importing Matplotlib takes longer than importing everything else
+the analyses use put together, so it lives here, and the plot_* functions in final_project.py only import this module
+the first time they draw a plot.  Code that only wants the numbers (batch jobs, the doctests, the significance tests)
+never pays for it.
+"""
+import pandas as pd
+import matplotlib.pyplot as plt
+
+
+def plot_gdp(gdp_df: pd.DataFrame, event_name: str, end_interval: int, start_interval: int) -> None:
+    """
+    Draws the GDP of an event and saves it under Plots/GDP (see final_project.plot_gdp()).
+    :param gdp_df: the gdp dataframe for selected events
+    :param event_name: event name for plotting
+    :param end_interval: end year of an event
+    :param start_interval: start year of an event
+    :return: None
+    """
+
+    fig, ax = plt.subplots(figsize=(15, 10))
+    ax.plot(gdp_df)
+
+    ax.set_xlabel("Year")
+    ax.set_ylabel("Gross domestic product ($)")
+    ax.ticklabel_format(style='plain', axis='y')
+
+    x_bounds = ax.get_xlim()
+    y_bounds = ax.get_ylim()
+    ax.vlines(end_interval, y_bounds[0], y_bounds[1], colors='red', linestyles='dashed')
+    ax.annotate(text='End Year', xy=(end_interval + 0.5, (y_bounds[0] + y_bounds[1]) * 2 / 3))
+    ax.vlines(start_interval, y_bounds[0], y_bounds[1], colors='green', linestyles='solid')
+    ax.annotate(text='Start Year', xy=(start_interval - 2, (y_bounds[0] + y_bounds[1]) * 2 / 3))
+
+    plt.title("GDP fluctuations for " + event_name)
+    plt.xticks(rotation=45)  # Rotates X-Axis Ticks by 45-degrees
+    plt.legend(['GDP', 'Personal consumption expenditures', 'Gross private domestic investment',
+                'Government consumption expenditures and gross investment'], loc='upper left')
+    plt.savefig('Plots/GDP/' + event_name + '.png')
+    plt.close(fig)
+
+
+def plot_sp_dj(df1: pd.DataFrame, df2: pd.DataFrame, year_num: int, plot_name: str, periods: int,
+               periods_per_year: int, period_name: str) -> None:
+    """
+    Draws the quartiles of the SP500 and Dow Jones changes and saves them under Plots/StockIndex (see
+    final_project.plot_sp_dj(), which prepares the data).
+    :param df1: the sp500 changes with quartiles, indexed by period relative to the zero point
+    :param df2: the dow jones changes with quartiles, indexed by period relative to the zero point
+    :param year_num: the years before and after the selected zero point
+    :param plot_name: the string name of the plot
+    :param periods: the number of periods before the zero point
+    :param periods_per_year: the number of rows per year
+    :param period_name: "month" or "trading day"
+    :return: None
+    """
+    fig, (ax3, ax4) = plt.subplots(2, sharex=True, figsize=(10, 5))
+    fig.suptitle('Change of Stock Market Indexes')
+    # ax1.plot(df1, linewidth=0.5)
+    # ax1.set_ylabel("Change of SP500", fontsize = 'x-small')
+    # ax2.plot(df2, linewidth=0.5)
+    # ax2.set_ylabel("Change of Dow Jones", fontsize = 'x-small')
+    ax3.plot(df1.index, df1["75pct"], color='black', label='75% percentile', linewidth=0.5)
+    ax3.plot(df1.index, df1["25pct"], color='black', label='25% percentile', linewidth=0.5)
+    ax3.plot(df1.index, df1["median"], '--', color='orange', label='median', linewidth=0.5)
+    ax3.hlines(y=0, xmin=-periods, xmax=periods + periods_per_year, linewidth=2, color='r')
+    ax3.vlines(x=0, ymin=-0.1, ymax=0.1, linestyles='dashed', linewidth=2, color='r')
+    ax3.vlines(x=periods_per_year - 1, ymin=-0.1, ymax=0.1, linestyles='dashed', linewidth=2, color='r')
+    ax3.fill_between(df1.index, df1["75pct"], df1["25pct"], facecolor='lightgreen')
+    ax3.set_ylabel("Range of SP500", fontsize='x-small')
+
+    ax4.plot(df2.index, df2["75pct"], color='black', label='75% percentile', linewidth=0.5)
+    ax4.plot(df2.index, df2["25pct"], color='black', label='25% percentile', linewidth=0.5)
+    ax4.plot(df2.index, df2["median"], '--', color='orange', label='median', linewidth=0.5)
+    ax4.hlines(y=0, xmin=-periods, xmax=periods + periods_per_year, linewidth=2, color='r')
+    ax4.vlines(x=0, ymin=-0.1, ymax=0.1, linestyles='dashed', linewidth=2, color='r')
+    ax4.vlines(x=periods_per_year - 1, ymin=-0.1, ymax=0.1, linestyles='dashed', linewidth=2, color='r')
+    ax4.fill_between(df2.index, df2["75pct"], df2["25pct"], facecolor='lightblue')
+    ax4.set_xlim(-periods + 1, periods + periods_per_year)
+    ax4.set_xlabel(str(year_num) + " Year Before and After Events (" + period_name + ")")
+    ax4.set_ylabel("Range of Dow Jones", fontsize='x-small')
+
+    plt.savefig('Plots/StockIndex/' + plot_name + '.png', dpi=200)
+    plt.close(fig)
+
+
+def plot_cpi(df: pd.DataFrame, plot_name: str, title: str, x_label: str, y_label: str, plot_quartiles: bool = False,
+             plot_mean: bool = False) -> None:
+    """
+    Draws CPI changes around events and saves the plot (see final_project.plot_cpi()).
+    :param df: A dataframe with CPI values for various events as the column titles and their values by relative year
+    :param plot_name: The file name to be used for the plot
+    :param title: The title to be used for the plot
+    :param x_label: The x label to be used for the plot
+    :param y_label: The y label to be used for the plot
+    :param plot_quartiles: Whether the 25pct, median and 75pct columns should be plotted instead of the events
+    :param plot_mean: Whether the mean column should be plotted instead of the events
+    :return: None
+    """
+
+    # Create an empty graph and axes
+    figure, axes = plt.subplots(figsize=(15, 10))
+
+    # Either regular values can be plotted, or the quartiles and/or mean
+    if plot_quartiles or plot_mean:
+        if plot_quartiles:
+            axes.plot(df.index, df['75pct'], color='black', label='75% percentile', linewidth=1)
+            axes.plot(df.index, df['25pct'], color='black', label='25% percentile', linewidth=1)
+            axes.plot(df.index, df['median'],  color='darkgreen', label='median', linewidth=1)
+            axes.fill_between(df.index, df['75pct'], df['25pct'], facecolor='lightgreen')
+        if plot_mean:
+            axes.plot(df.index, df['mean'], '-.', color='purple', label='mean', linewidth=1)
+        axes.set_xlabel(x_label)
+        axes.set_ylabel(y_label)
+        axes.set_title(title)
+        axes.set_xticks(df.index.to_list())
+        axes.legend()
+    else:
+        # Plotting normal values
+        df.plot(ax=axes, xlabel=x_label, ylabel=y_label, title=title, xticks=df.index.to_list())
+
+    # Save to disk
+    figure.savefig(plot_name, dpi=200)
+    plt.close(figure)
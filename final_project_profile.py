@@ -0,0 +1,233 @@
+"""
+IS597 Spring 2021 Final Project
+Group members: Kangyang Wang, Wendy Zhu, and Kay Avila
+
+Opt-in instrumentation for the analysis pipeline.  The stages of the analyses are wrapped in profile_stage() blocks,
+which do nothing unless profiling has been started, either by setting the FINAL_PROJECT_PROFILE environment variable
+to the name of a trace file, or with the --profile option (main(profile_file=...)).  Each stage then records its
+wall-clock time, CPU time, the number of memory blocks it allocated, its peak traced memory, and the peak resident
+memory of the process.  At the end of the run the records are saved as a json trace, and a summary table is printed.
+
+    FINAL_PROJECT_PROFILE=profile.json python final_project.py
+    python final_project.py --profile profile.json
+"""
+import os
+import sys
+import json
+import time
+import tracemalloc
+from typing import Union
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+PROFILE_ENV_VAR = 'FINAL_PROJECT_PROFILE'
+
+# The records of the finished stages, or None when profiling is off
+trace_records = None
+
+# The stages currently running, innermost last
+open_stages = []
+
+# When profiling was started, so that stages can record when they started relative to it
+profile_start = 0.0
+
+
+def profiling_enabled() -> bool:
+    """ Whether profiling has been started.
+
+    :return: True if stages are being recorded
+    """
+    return trace_records is not None
+
+
+def start_profiling() -> None:
+    """ Starts recording stages, and starts tracing memory allocations (which slows the run down somewhat).
+
+    :return: None
+    """
+    global trace_records, profile_start
+    trace_records = []
+    open_stages.clear()
+    profile_start = time.perf_counter()
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def stop_profiling() -> list:
+    """ Stops recording stages.
+
+    :return: The records of all the stages recorded since start_profiling()
+    """
+    global trace_records
+    records, trace_records = trace_records or [], None
+    open_stages.clear()
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+    return records
+
+
+def peak_rss_mb() -> Union[float, None]:
+    """ Finds the largest resident memory the process has used so far.
+
+    :return: The peak resident set size in megabytes, or None where it can't be measured
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def update_traced_peaks() -> None:
+    """ Folds the traced memory peak since the last reset into every open stage, and resets it.  This is what lets
+    nested stages each have their own peak when tracemalloc only keeps one.
+
+    :return: None
+    """
+    _, peak = tracemalloc.get_traced_memory()
+    for stage in open_stages:
+        stage['peak'] = max(stage['peak'], peak)
+    if hasattr(tracemalloc, 'reset_peak'):  # Python 3.9+
+        tracemalloc.reset_peak()
+
+
+class profile_stage:
+    """ Context manager recording one stage of the pipeline while profiling is on.  Stages can be nested, and are named
+    after the stages they are nested in, e.g. "analyze_cpi/add_cpi_values".  When profiling is off it does nothing.
+
+    >>> start_profiling()
+    >>> with profile_stage('outer'):
+    ...     with profile_stage('inner'):
+    ...         data = list(range(100000))
+    >>> records = stop_profiling()
+    >>> [record['stage'] for record in records]
+    ['outer/inner', 'outer']
+    >>> records[0]['peak_traced_mb'] > 1, records[1]['peak_traced_mb'] >= records[0]['peak_traced_mb']
+    (True, True)
+    >>> with profile_stage('not recorded'):
+    ...     pass
+    >>> profiling_enabled()
+    False
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.stage = None
+
+    def __enter__(self):
+        if trace_records is None:
+            return self
+
+        update_traced_peaks()
+        current, _ = tracemalloc.get_traced_memory()
+        parent = open_stages[-1]['stage'] + '/' if open_stages else ''
+        self.stage = {'stage': parent + self.name, 'peak': current, 'start_traced': current,
+                      'start_blocks': sys.getallocatedblocks(),
+                      'start_wall': time.perf_counter(), 'start_cpu': time.process_time()}
+        open_stages.append(self.stage)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        stage = self.stage
+        if stage is None or trace_records is None:
+            return False
+
+        wall = time.perf_counter() - stage['start_wall']
+        cpu = time.process_time() - stage['start_cpu']
+        update_traced_peaks()
+        open_stages.remove(stage)
+        self.stage = None
+
+        trace_records.append({'stage': stage['stage'], 'pid': os.getpid(),
+                              'start_s': stage['start_wall'] - profile_start, 'wall_s': wall, 'cpu_s': cpu,
+                              'blocks_allocated': sys.getallocatedblocks() - stage['start_blocks'],
+                              'peak_traced_mb': (stage['peak'] - stage['start_traced']) / 2 ** 20,
+                              'peak_rss_mb': peak_rss_mb(), 'failed': exc_type is not None})
+        return False
+
+
+def add_records(records: list, offset_s: float = 0.0) -> None:
+    """ Adds records made in another process, such as a worker running one of the analyses, under the stage currently
+    running in this one.  Does nothing when profiling is off.
+
+    :param records: The records from stop_profiling() in the other process
+    :param offset_s: When the other process started profiling, in seconds after this one did
+    :return: None
+
+    >>> start_profiling()
+    >>> with profile_stage('workers'):
+    ...     add_records([{'stage': 'analyze_gdp', 'start_s': 0.25}], offset_s=1.0)
+    >>> [(record['stage'], record['start_s']) for record in stop_profiling()][0]
+    ('workers/analyze_gdp', 1.25)
+    """
+    if trace_records is None:
+        return
+
+    parent = open_stages[-1]['stage'] + '/' if open_stages else ''
+    for record in records:
+        trace_records.append(dict(record, stage=parent + record['stage'], start_s=record['start_s'] + offset_s))
+
+
+def profile_clock() -> float:
+    """ The time in seconds since profiling was started, e.g. to give add_records() an offset.
+
+    :return: The time since start_profiling()
+    """
+    return time.perf_counter() - profile_start
+
+
+def summary_table(records: list) -> str:
+    """ Formats stage records as a table, with nested stages indented under their parents.
+
+    :param records: The records from stop_profiling()
+    :return: The table as a string
+
+    >>> print(summary_table([{'stage': 'a/b', 'start_s': 0.5, 'wall_s': 0.5, 'cpu_s': 0.4, 'blocks_allocated': 120, \
+                              'peak_traced_mb': 2.0, 'peak_rss_mb': 80.0, 'failed': False}, \
+                             {'stage': 'a', 'start_s': 0.0, 'wall_s': 1.25, 'cpu_s': 1.0, 'blocks_allocated': -10, \
+                              'peak_traced_mb': 3.5, 'peak_rss_mb': None, 'failed': False}]))
+    stage                                  wall s    cpu s     blocks  peak MB   RSS MB
+    a                                      1.2500   1.0000        -10      3.5        -
+      b                                    0.5000   0.4000        120      2.0     80.0
+    """
+    lines = ['{:<36} {:>8} {:>8} {:>10} {:>8} {:>8}'.format('stage', 'wall s', 'cpu s', 'blocks', 'peak MB',
+                                                           'RSS MB')]
+    # Records are written as stages finish, so sort them by when they started, and keep children under their parents
+    # (stages from worker processes run alongside each other)
+    starts = {}
+    for record in records:
+        starts[record['stage']] = min(record['start_s'], starts.get(record['stage'], record['start_s']))
+
+    def sort_key(record):
+        parts = record['stage'].split('/')
+        return [starts.get('/'.join(parts[:i]), record['start_s']) for i in range(1, len(parts))] + [record['start_s']]
+
+    for record in sorted(records, key=sort_key):
+        depth = record['stage'].count('/')
+        name = '  ' * depth + record['stage'].rsplit('/', 1)[-1] + (' (failed)' if record['failed'] else '')
+        rss = '-' if record['peak_rss_mb'] is None else '{:.1f}'.format(record['peak_rss_mb'])
+        lines.append('{:<36} {:>8.4f} {:>8.4f} {:>10} {:>8.1f} {:>8}'.format(
+            name, record['wall_s'], record['cpu_s'], record['blocks_allocated'], record['peak_traced_mb'], rss))
+
+    return '\n'.join(lines)
+
+
+def write_trace(records: list, trace_file: str) -> None:
+    """ Saves stage records as a json trace.
+
+    :param records: The records from stop_profiling()
+    :param trace_file: The file to save them to
+    :return: None
+    """
+    with open(trace_file, 'w') as f:
+        json.dump({'pid': os.getpid(), 'python': sys.version.split()[0], 'stages': records}, f, indent=2)
+
+
+def profile_file_from_environment() -> Union[str, None]:
+    """ Reads the trace file name from the FINAL_PROJECT_PROFILE environment variable.
+
+    :return: The trace file name, or None if profiling wasn't asked for
+    """
+    return os.environ.get(PROFILE_ENV_VAR) or None
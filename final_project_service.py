@@ -0,0 +1,364 @@
+"""
+IS597 Spring 2021 Final Project
+Group members: Kangyang Wang, Wendy Zhu, and Kay Avila
+
+A long-running local service that keeps the data sets in memory and answers window queries over HTTP, so notebooks and
+other tools don't pay for reading the csv files and setting up the data on every call.  It only listens on localhost.
+Each data file is checked before answering a query, and reloaded if it has changed on disk.
+
+    python final_project_service.py --port 8597
+    curl 'http://127.0.0.1:8597/windows?series=cpi&types=War&t0=end_year&length=10'
+    curl 'http://127.0.0.1:8597/windows?series=sp500&data_type=nominal&format=npz' > windows.npz
+
+/windows takes the filters of read_event_facts() (types and ranges as comma separated lists), the zero point (t0) and
+the number of years before and after it (length), the series ("cpi", "gdp", "sp500" or "dowjones"), and data_type
+("real" or "nominal") for the stock market indexes (the CPI is an "index" of prices, and the GDP is "nominal").  It
+answers with the statistics across the events for every period of the window (stats, by default mean, median, 25pct and
+75pct), and with each event's window too if windows=1.  The answer is JSON (with null for missing values), or with
+format=npz, a numpy .npz file of the same arrays.  /health lists the files loaded and when they were last read.  Bad
+queries are answered with 400 and a JSON "error", and anything else that goes wrong with 500.
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import numpy as np
+from typing import Union
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import final_project as fp
+
+DEFAULT_PORT = 8597
+
+# The statistics that can be asked for, and the percentile each one is (if any)
+STATISTICS = {'mean': None, 'std': None, 'count': None, 'median': 50, '25pct': 25, '75pct': 75}
+DEFAULT_STATISTICS = ['mean', 'median', '25pct', '75pct']
+
+# The read_event_facts() filters that can be given, and how to read them from a query string
+EVENT_FILTERS = {'types': 'list', 'ranges': 'list', 'min_start_year': 'int', 'max_start_year': 'int',
+                 'min_end_year': 'int', 'max_end_year': 'int', 'min_fatalities': 'int', 'max_fatalities': 'int'}
+
+
+class Datasets:
+    """ The data series, held in memory as arrays laid out for extract_windows(), and reloaded when their files change.
+    The events are kept by final_project.EventCatalog, which reloads itself the same way.
+
+    >>> data = Datasets()
+    >>> sorted(data.series)
+    ['cpi', 'dowjones', 'gdp', 'sp500']
+    >>> data.series['cpi']['resolution'], data.series['sp500']['resolution']
+    ('yearly', 'monthly')
+    >>> data.refresh()
+    []
+    """
+    def __init__(self, inputs: Union[dict, None] = None):
+        """ Loads every data set.
+
+        :param inputs: Data files to use instead of the ones in final_project.DEFAULT_INPUTS, by the same keys
+        """
+        self.inputs = dict(fp.DEFAULT_INPUTS, **(inputs or {}))
+        self.series = {}
+        self.file_stats = {}
+        self.lock = threading.Lock()
+        for name in ['cpi', 'gdp', 'sp500', 'dowjones']:
+            self.load(name)
+        fp.EventCatalog.load(self.inputs['events'])
+
+    def load(self, name: str) -> None:
+        """ Reads one data file and keeps its periods and values.
+
+        :param name: The series, "cpi", "gdp", "sp500" or "dowjones"
+        :return: None
+        """
+        filename = self.inputs[name]
+        stat = os.stat(filename)
+        if name == 'cpi':
+            cpi_df = fp.read_us_cpi(filename)
+            loaded = {'resolution': 'yearly', 'periods': cpi_df['Year'].to_numpy(dtype='int64'),
+                      'values': {'index': cpi_df['Value'].to_numpy()}}
+        elif name == 'gdp':
+            gdp = fp.read_gdp_line_items(filename).loc[fp.GDP_COMPONENTS['GDP']].dropna()
+            loaded = {'resolution': 'yearly', 'periods': gdp.index.to_numpy(dtype='int64'),
+                      'values': {'nominal': gdp.to_numpy(dtype='float64')}}
+        else:
+            index_df = fp.read_index_monthly(filename)
+            loaded = {'resolution': 'monthly', 'periods': index_df['month_ordinal'].to_numpy(dtype='int64'),
+                      'values': {data_type: index_df[data_type].to_numpy(dtype='float64')
+                                 for data_type in ['real', 'nominal']}}
+
+        self.series[name] = loaded
+        self.file_stats[name] = {'file': filename, 'mtime': stat.st_mtime_ns, 'size': stat.st_size,
+                                 'loaded_at': time.time()}
+
+    def refresh(self) -> list:
+        """ Reloads any data file that has changed since it was loaded.
+
+        :return: The series that were reloaded
+        """
+        reloaded = []
+        with self.lock:
+            for name, loaded in list(self.file_stats.items()):
+                stat = os.stat(loaded['file'])
+                if stat.st_mtime_ns != loaded['mtime'] or stat.st_size != loaded['size']:
+                    self.load(name)
+                    reloaded.append(name)
+        return reloaded
+
+
+def query_values(query: dict, name: str, kind: str = 'str', default=None):
+    """ Reads one parameter from a parsed query string.
+
+    :param query: The query, from parse_qs() (values are lists) or a plain dict
+    :param name: The parameter
+    :param kind: "str", "int" or "list" (comma separated, or the parameter given more than once)
+    :param default: The value if the parameter isn't given
+    :return: The value
+
+    >>> query_values({'types': ['War,Pandemics']}, 'types', 'list'), query_values({'length': '5'}, 'length', 'int')
+    (['War', 'Pandemics'], 5)
+    >>> query_values({'length': 'ten'}, 'length', 'int')
+    Traceback (most recent call last):
+    ...
+    ValueError: length must be a whole number
+    """
+    if name not in query:
+        return default
+    values = query[name] if isinstance(query[name], list) else [query[name]]
+    if kind == 'list':
+        return [item for value in values for item in str(value).split(',') if item]
+    if kind == 'int':
+        try:
+            return int(values[-1])
+        except ValueError:
+            raise ValueError('{} must be a whole number'.format(name))
+    return values[-1]
+
+
+class QueryService:
+    """ Answers window queries from the data sets in memory.
+
+    >>> service = QueryService()
+    >>> answer = service.windows({'series': 'cpi', 'types': 'War', 'length': '2', 'windows': '1'})
+    >>> answer['periods'], answer['events'][:2]
+    ([-2, -1, 0, 1, 2], ['World War I', 'Korean War'])
+    >>> [round(value, 3) for value in answer['stats']['median']]
+    [4.293, 2.279, 4.126, 3.029, 2.952]
+    >>> answer['data_type']
+    'index'
+    >>> service.windows({'series': 'bonds'})
+    Traceback (most recent call last):
+    ...
+    ValueError: The series must be one of cpi, gdp, sp500, dowjones
+    >>> service.windows({'series': 'cpi', 'length': '-3'})
+    Traceback (most recent call last):
+    ...
+    ValueError: length must be 0 or more years, not -3
+    """
+    def __init__(self, inputs: Union[dict, None] = None):
+        """ Loads the data sets.
+
+        :param inputs: Data files to use instead of the ones in final_project.DEFAULT_INPUTS, by the same keys
+        """
+        self.data = Datasets(inputs)
+
+    def windows(self, query: dict) -> dict:
+        """ Takes the changes in a series over the window of every event selected, and the statistics across them.
+
+        :param query: The query parameters (see the module docstring)
+        :return: A dict of "series", "data_type", "events", "periods" (relative to the zero point: years for yearly
+                 series, months for monthly ones), "stats" by name, and "windows" (event x period) if asked for
+        """
+        self.data.refresh()
+
+        series = query_values(query, 'series', default='cpi')
+        if series not in self.data.series:
+            raise ValueError('The series must be one of ' + ', '.join(self.data.series))
+        loaded = self.data.series[series]
+        data_type = query_values(query, 'data_type', default=next(iter(loaded['values'])))  # "real" for the indexes
+        if data_type not in loaded['values']:
+            raise ValueError('Only {} data is available for {}'.format(', '.join(loaded['values']), series))
+        t0 = query_values(query, 't0', default='end_year')
+        length = query_values(query, 'length', 'int', default=10)
+        if length < 0:
+            raise ValueError('length must be 0 or more years, not {}'.format(length))
+        statistics = query_values(query, 'stats', 'list', default=DEFAULT_STATISTICS)
+        unknown = [name for name in statistics if name not in STATISTICS]
+        if unknown:
+            raise ValueError('Unknown statistic(s): {}. Valid statistics: {}'.format(', '.join(unknown),
+                                                                                   ', '.join(STATISTICS)))
+
+        # Select the events, with the same checks as read_event_facts()
+        filters = {name: query_values(query, name, kind) for name, kind in EVENT_FILTERS.items()}
+        fp.check_event_year_filters(filters['min_start_year'], filters['max_start_year'], filters['min_end_year'],
+                                    filters['max_end_year'])
+        catalog = fp.EventCatalog.load(self.data.inputs['events'])
+        positions = catalog.select(**filters)
+        events = {name: catalog.df[name].to_numpy()[positions] for name in ['Event_Name', 'Start_Year', 'End_Year']}
+        zero_years = np.asarray(fp.zero_point_years(events, t0), dtype='int64')
+
+        # The window runs from a year before the first year (so the first year has a change) to the last year, by year
+        # or by month.  Monthly windows keep to the years the stock market data covers, as get_index_windows() does.
+        names = events['Event_Name']
+        if loaded['resolution'] == 'yearly':
+            starts, n_periods, scale = zero_years - length - 1, 2 * length + 2, 100
+            periods = list(range(-length, length + 1))
+        else:
+            available = fp.monthly_index_available(zero_years - length, zero_years + length)
+            zero_years, names = zero_years[available], names[available]
+            starts, n_periods, scale = (zero_years - length) * 12 - 1, (2 * length + 1) * 12 + 1, 1
+            periods = list(range(-length * 12, (length + 1) * 12))
+
+        values = fp.extract_windows(loaded['periods'], loaded['values'][data_type], starts, n_periods)
+        changes = fp.pct_change_windows(values.astype('float64')) * scale
+
+        percentiles = [STATISTICS[name] for name in statistics if STATISTICS[name] is not None]
+        by_period = fp.row_statistics(changes.T, percentiles=percentiles)
+        stats = {name: by_period[name if STATISTICS[name] is None else STATISTICS[name]] for name in statistics}
+
+        answer = {'series': series, 'data_type': data_type, 'events': [str(name) for name in names],
+                  'periods': periods, 'stats': stats}
+        if query_values(query, 'windows', default='0') in ['1', 'true', 'yes']:
+            answer['windows'] = changes
+        return answer
+
+
+def to_json(answer: dict) -> bytes:
+    """ Encodes an answer as JSON, with null for missing values.
+
+    :param answer: The answer from QueryService.windows()
+    :return: The JSON text, encoded as UTF-8
+
+    >>> to_json({'stats': {'mean': np.array([1.5, np.nan])}, 'windows': np.array([[1, 2]])})
+    b'{"stats": {"mean": [1.5, null]}, "windows": [[1, 2]]}'
+    """
+    def convert(value):
+        if isinstance(value, dict):
+            return {key: convert(item) for key, item in value.items()}
+        if isinstance(value, np.ndarray):
+            return [convert(item) for item in value] if value.ndim > 1 else \
+                [None if isinstance(item, float) and np.isnan(item) else item for item in value.tolist()]
+        return value
+
+    return json.dumps(convert(answer)).encode('utf-8')
+
+
+def to_npz(answer: dict) -> bytes:
+    """ Encodes an answer as a numpy .npz file: the statistics as "stats_<name>" arrays, and the rest as arrays of
+    their own names.
+
+    :param answer: The answer from QueryService.windows()
+    :return: The contents of the .npz file
+
+    >>> arrays = np.load(io.BytesIO(to_npz({'events': ['A'], 'stats': {'mean': np.array([1.5])}})))
+    >>> sorted(arrays.files), arrays['stats_mean']
+    (['events', 'stats_mean'], array([1.5]))
+    """
+    arrays = {}
+    for key, value in answer.items():
+        if key == 'stats':
+            arrays.update({'stats_' + name: np.asarray(stat) for name, stat in value.items()})
+        else:
+            arrays[key] = np.asarray(value)
+
+    output = io.BytesIO()
+    np.savez(output, **arrays)
+    return output.getvalue()
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """ Handles the HTTP requests of a service started by make_server(). """
+    service = None
+
+    def send_answer(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        try:
+            if url.path == '/health':
+                self.service.data.refresh()
+                self.send_answer(200, to_json({'status': 'ok', 'files': self.service.data.file_stats}),
+                                 'application/json')
+            elif url.path == '/windows':
+                answer = self.service.windows(query)
+                if query_values(query, 'format', default='json') == 'npz':
+                    self.send_answer(200, to_npz(answer), 'application/octet-stream')
+                else:
+                    self.send_answer(200, to_json(answer), 'application/json')
+            else:
+                self.send_answer(404, to_json({'error': 'Unknown path: ' + url.path}), 'application/json')
+        except (ValueError, KeyError) as e:
+            self.send_answer(400, to_json({'error': str(e).strip('"\'')}), 'application/json')
+        except Exception as e:
+            # Answer anyway, rather than dropping the connection with nothing sent
+            self.send_answer(500, to_json({'error': '{}: {}'.format(type(e).__name__, e)}), 'application/json')
+
+    def log_message(self, format: str, *args) -> None:
+        pass  # Answering in milliseconds is the point, so don't print a line for every request
+
+
+def make_server(port: int = DEFAULT_PORT, inputs: Union[dict, None] = None) -> ThreadingHTTPServer:
+    """ Loads the data and creates the HTTP server on localhost, ready for serve_forever().
+
+    :param port: The port to listen on (0 picks a free one)
+    :param inputs: Data files to use instead of the ones in final_project.DEFAULT_INPUTS, by the same keys
+    :return: The server
+
+    >>> import urllib.request
+    >>> server = make_server(port=0)
+    >>> thread = threading.Thread(target=server.serve_forever, daemon=True)
+    >>> thread.start()
+    >>> url = 'http://127.0.0.1:{}/windows?series=sp500&types=War&length=1&stats=median'.format(server.server_port)
+    >>> answer = json.load(urllib.request.urlopen(url))
+    >>> len(answer['events']), len(answer['periods']), len(answer['stats']['median'])
+    (6, 36, 36)
+    >>> def fetch(path):
+    ...     try:
+    ...         return json.load(urllib.request.urlopen('http://127.0.0.1:{}{}'.format(server.server_port, path)))
+    ...     except urllib.error.HTTPError as e:
+    ...         return e.code, json.load(e)
+    >>> fetch('/windows?length=-3')
+    (400, {'error': 'length must be 0 or more years, not -3'})
+    >>> server.RequestHandlerClass.service.windows = lambda query: 1 / 0
+    >>> fetch('/windows')
+    (500, {'error': 'ZeroDivisionError: division by zero'})
+    >>> server.shutdown()
+    >>> server.server_close()
+    """
+    handler = type('BoundQueryHandler', (QueryHandler,), {'service': QueryService(inputs)})
+    return ThreadingHTTPServer(('127.0.0.1', port), handler)
+
+
+def main(argv: Union[list, None] = None) -> None:
+    """
+    Starts the service from the command line, and runs it until interrupted.
+    :param argv: The command line arguments (defaults to sys.argv)
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description='Serve event window queries from data held in memory.')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='port on localhost (default: %(default)s)')
+    for name in fp.DEFAULT_INPUTS:
+        parser.add_argument('--' + name, default=fp.DEFAULT_INPUTS[name], help=name + ' file (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    server = make_server(args.port, {name: getattr(args, name) for name in fp.DEFAULT_INPUTS})
+    print('Serving on http://127.0.0.1:{}'.format(server.server_port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,269 @@
+"""
+IS597 Spring 2021 Final Project
+Group members: Kangyang Wang, Wendy Zhu, and Kay Avila
+
+Placebo tests of the event window analyses in final_project.py.  The plots compare how CPI, GDP and the stock market
+indexes moved around wars and pandemics, but not whether those movements are any different from what would be seen
+around randomly chosen years.  For each series and type of event, this draws a large number of sets of placebo zero
+points (as many as there are real events, uniformly from the years where a whole window fits in the data), calculates
+the same statistic across events for every relative year, and compares the real events against that distribution.
+
+The draws are gathered and reduced in batches with numpy, and the batches can be spread over a process pool.  Each
+batch has its own random seed derived from the main one, so results only depend on the seed and not on the number of
+processes.
+
+    python final_project_significance.py --resamples 1000000 --workers 4
+"""
+import os
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+from typing import Union, Literal
+from concurrent.futures import ProcessPoolExecutor
+
+import final_project as fp
+
+# Number of placebo draws gathered together - bounds the memory used to about batch x events x window x 8 bytes
+BATCH_SIZE = 20000
+
+
+def annual_changes(years: np.ndarray, values: np.ndarray) -> tuple:
+    """ Lays out a yearly series by year (with NaN for missing years) and calculates the percentage change into each
+    year from the one before.
+
+    :param years: The year of each value
+    :param values: The values
+    :return: The first year that has a change, and an array of the percentage change into each year from then on
+
+    >>> annual_changes(np.array([2000, 2001, 2003]), np.array([100., 110., 121.]))
+    (2001, array([10., nan, nan]))
+    """
+    first_year = int(np.min(years))
+    by_year = fp.extract_windows(years, values, np.array([first_year]), int(np.max(years)) - first_year + 1)[0]
+    return first_year + 1, fp.pct_change_windows(by_year.astype('float64')) * 100
+
+
+def window_statistic(windows: np.ndarray, statistic: Literal['mean', 'median']) -> np.ndarray:
+    """ Reduces windows across events (the second to last axis), ignoring NaNs.
+
+    :param windows: An array of (... x event x relative year) windows
+    :param statistic: "mean" or "median"
+    :return: The statistic for every relative year
+
+    >>> window_statistic(np.array([[1., 2.], [3., np.nan], [5., 6.]]), 'median')
+    array([3., 4.])
+    """
+    # Placebo windows never have NaNs, and the plain functions are much faster than the NaN-aware ones
+    has_nan = np.isnan(windows).any()
+    if statistic == 'mean':
+        return np.nanmean(windows, axis=-2) if has_nan else windows.mean(axis=-2)
+    if statistic == 'median':
+        return np.nanmedian(windows, axis=-2) if has_nan else np.median(windows, axis=-2)
+    raise ValueError('The statistic must be "mean" or "median"')
+
+
+def placebo_batch(changes: np.ndarray, valid_zeros: np.ndarray, offsets: np.ndarray, n_events: int, n_draws: int,
+                  seed: np.random.SeedSequence, statistic: Literal['mean', 'median'] = 'mean') -> np.ndarray:
+    """ Draws one batch of placebo event sets and calculates their statistics.  Every window of every draw is gathered
+    with a single index into the series.
+
+    :param changes: The series of changes, from annual_changes()
+    :param valid_zeros: The positions in the series that placebo zero points are drawn from
+    :param offsets: The positions of the relative years, relative to the zero point
+    :param n_events: The number of events in each draw
+    :param n_draws: The number of draws
+    :param seed: The seed for this batch
+    :param statistic: "mean" or "median" across the events of each draw
+    :return: A (draw x relative year) array of the statistic, as float32 to save memory
+
+    >>> changes = np.arange(10.)
+    >>> batch = placebo_batch(changes, np.arange(1, 9), np.array([-1, 0, 1]), 3, 4, np.random.SeedSequence(0))
+    >>> batch.shape, bool(np.allclose(batch[:, 1] - batch[:, 0], 1))
+    ((4, 3), True)
+    """
+    rng = np.random.default_rng(seed)
+    zeros = valid_zeros[rng.integers(0, len(valid_zeros), size=(n_draws, n_events))]
+    windows = changes[zeros[:, :, np.newaxis] + offsets]
+    return window_statistic(windows, statistic).astype('float32')
+
+
+def placebo_test(years: np.ndarray, values: np.ndarray, zero_years: np.ndarray, length: int,
+                 n_resamples: int = 10000, statistic: Literal['mean', 'median'] = 'mean', workers: int = 1,
+                 seed: int = 597, confidence: float = 95) -> pd.DataFrame:
+    """ Tests whether a yearly series moved differently around a set of events than around random years.  The observed
+    statistic across the events, for each year from -length to length around their zero points, is compared with the
+    same statistic for n_resamples sets of randomly drawn zero points.
+
+    :param years: The year of each value of the series
+    :param values: The values of the series, e.g. yearly average CPI
+    :param zero_years: The zero point year of each event (events without a whole window of changes are dropped)
+    :param length: The number of years before and after the zero point
+    :param n_resamples: The number of placebo draws
+    :param statistic: "mean" or "median" across events
+    :param workers: The number of processes to spread the batches of draws over
+    :param seed: The random seed
+    :param confidence: The width of the confidence band, in percent
+    :return: A dataframe indexed by relative year, with the observed statistic, the mean and band of the placebo
+             statistics, and the two-sided p-value of the observed statistic
+
+    >>> years = np.arange(1900, 2000)
+    >>> values = 100 * 1.02 ** (years - 1900)
+    >>> values[[50, 70, 90]] *= 1.5  # A jump in the series in the years of the events
+    >>> result = placebo_test(years, values, np.array([1950, 1970, 1990]), 2, n_resamples=2000)
+    >>> result.round(2)  # doctest: +NORMALIZE_WHITESPACE
+                   observed  placebo_mean  lower  upper  p_value
+    Relative year
+    -2                  2.0          2.56  -9.33   19.0      1.0
+    -1                  2.0          2.60  -9.33   19.0      1.0
+     0                 53.0          2.49  -9.33   19.0      0.0
+     1                -32.0          2.68  -9.33   19.0      0.0
+     2                  2.0          2.54  -9.33   19.0      1.0
+    """
+    first_year, changes = annual_changes(years, values)
+    offsets = np.arange(-length, length + 1)
+
+    # Observed windows, with NaN outside of the series.  Only events with a whole window are kept, so that every
+    # relative year's statistic is over as many events as each placebo draw has (a partial window, such as that of an
+    # event ending in the last year of data, would otherwise leave fewer events and a noisier statistic at the edges)
+    zero_positions = np.asarray(zero_years, dtype='int64') - first_year
+    zero_positions = zero_positions[(zero_positions >= 0) & (zero_positions < len(changes))]
+    padded = np.concatenate([[np.nan], changes, [np.nan]])
+    observed_positions = np.clip(zero_positions[:, np.newaxis] + offsets + 1, 0, len(padded) - 1)
+    observed_windows = padded[observed_positions]
+    whole = ~np.isnan(observed_windows).any(axis=1)
+    zero_positions, observed_windows = zero_positions[whole], observed_windows[whole]
+    if len(zero_positions) == 0:
+        raise ValueError('There are no events with a whole window of changes in the series')
+    observed = window_statistic(observed_windows, statistic)
+
+    # Placebo zero points must have a whole window of changes
+    candidates = np.arange(length, len(changes) - length)
+    complete = ~np.isnan(changes[candidates[:, np.newaxis] + offsets]).any(axis=1)
+    valid_zeros = candidates[complete]
+    if len(valid_zeros) == 0:
+        raise ValueError('There are no complete windows in the series')
+
+    batch_sizes = [min(BATCH_SIZE, n_resamples - start) for start in range(0, n_resamples, BATCH_SIZE)]
+    seeds = np.random.SeedSequence(seed).spawn(len(batch_sizes))
+    args = (changes, valid_zeros, offsets, len(zero_positions))
+    if workers > 1 and len(batch_sizes) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(placebo_batch, *args, size, batch_seed, statistic)
+                       for size, batch_seed in zip(batch_sizes, seeds)]
+            placebo = np.concatenate([future.result() for future in futures])
+    else:
+        placebo = np.concatenate([placebo_batch(*args, size, batch_seed, statistic)
+                                  for size, batch_seed in zip(batch_sizes, seeds)])
+
+    # Two-sided p-values, from how far each statistic is from the placebo mean, with the usual +1 correction
+    placebo_mean = placebo.mean(axis=0, dtype='float64')
+    distance = np.abs(placebo - placebo_mean.astype('float32'))
+    observed_distance = np.abs(observed - placebo_mean).astype('float32')
+    p_value = ((distance >= observed_distance).sum(axis=0) + 1) / (n_resamples + 1)
+    p_value[np.isnan(observed)] = np.nan
+
+    tail = (100 - confidence) / 2
+    lower, upper = np.percentile(placebo, [tail, 100 - tail], axis=0)
+
+    return pd.DataFrame({'observed': observed, 'placebo_mean': placebo_mean, 'lower': lower.astype('float64'),
+                         'upper': upper.astype('float64'), 'p_value': p_value},
+                        index=pd.Index(offsets, name='Relative year'))
+
+
+def cpi_series(cpi_file: str) -> tuple:
+    """ The yearly average US CPI, as used by analyze_cpi().
+
+    :param cpi_file: The BLS CPI file
+    :return: The years and their values
+    """
+    cpi_df = fp.read_us_cpi(cpi_file)
+    return cpi_df['Year'].to_numpy(), cpi_df['Value'].to_numpy(dtype='float64')
+
+
+def gdp_series(gdp_file: str) -> tuple:
+    """ The yearly US GDP, as used by analyze_gdp().
+
+    :param gdp_file: The USAFacts GDP file
+    :return: The years and their values
+    """
+    gdp = fp.read_gdp_line_items(gdp_file).loc[fp.GDP_COMPONENTS['GDP']].dropna()
+    return gdp.index.to_numpy(), gdp.to_numpy()
+
+
+def index_series(index_file: str, data_type: Literal['real', 'nominal'] = 'real') -> tuple:
+    """ The yearly average of a monthly stock market index, over the years with all twelve months of data.
+
+    :param index_file: The monthly index file, e.g. data/sp500_monthly.csv
+    :param data_type: "real" or "nominal"
+    :return: The years and their values
+    """
+    by_year = fp.read_index_monthly(index_file).groupby('year')[data_type].agg(['mean', 'count'])
+    by_year = by_year[by_year['count'] == 12]
+    return by_year.index.to_numpy(), by_year['mean'].to_numpy()
+
+
+def analyze_significance(inputs: Union[dict, None] = None, length: int = 10,
+                         t0: Literal['start_year', 'end_year', 'year_before_end_year',
+                                     'year_after_start_year'] = 'end_year',
+                         n_resamples: int = 10000, statistic: Literal['mean', 'median'] = 'mean',
+                         workers: int = 1) -> dict:
+    """ Runs placebo tests for pandemics and wars on the yearly CPI, GDP and real SP500 and Dow Jones series.
+
+    :param inputs: Data files to use instead of the ones in final_project.DEFAULT_INPUTS, by the same keys
+    :param length: The number of years before and after the zero point
+    :param t0: The zero point of each event, as in add_time_range()
+    :param n_resamples: The number of placebo draws for each test
+    :param statistic: "mean" or "median" across events
+    :param workers: The number of processes to spread the draws over
+    :return: A dict of the results from placebo_test() by (series, event type)
+
+    >>> results = analyze_significance(length=3, n_resamples=1000)
+    >>> sorted(results)  # doctest: +NORMALIZE_WHITESPACE
+    [('CPI', 'Pandemics'), ('CPI', 'War'), ('Dow Jones', 'Pandemics'), ('Dow Jones', 'War'), ('GDP', 'Pandemics'),
+     ('GDP', 'War'), ('SP500', 'Pandemics'), ('SP500', 'War')]
+    >>> results[('CPI', 'War')].shape
+    (7, 5)
+    """
+    inputs = dict(fp.DEFAULT_INPUTS, **(inputs or {}))
+    series = {'CPI': cpi_series(inputs['cpi']), 'GDP': gdp_series(inputs['gdp']),
+              'SP500': index_series(inputs['sp500']), 'Dow Jones': index_series(inputs['dowjones'])}
+    events = fp.read_event_facts(inputs['events'])
+
+    results = {}
+    for event_type in ['Pandemics', 'War']:
+        zero_years = fp.zero_point_years(events[events['Type'] == event_type], t0).to_numpy()
+        for name, (years, values) in series.items():
+            results[(name, event_type)] = placebo_test(years, values, zero_years, length, n_resamples, statistic,
+                                                       workers)
+
+    return results
+
+
+def main(argv: Union[list, None] = None) -> None:
+    """
+    Runs the placebo tests from the command line and prints the results.
+    :param argv: The command line arguments (defaults to sys.argv)
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description='Placebo tests of the wars/pandemics event window analyses.')
+    parser.add_argument('--resamples', type=int, default=10000, help='placebo draws per test (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='processes to spread the draws over (default: %(default)s)')
+    parser.add_argument('--length', type=int, default=10, help='years before and after the zero point')
+    parser.add_argument('--t0', default='end_year', choices=['start_year', 'end_year', 'year_before_end_year',
+                                                            'year_after_start_year'], help='zero point of each event')
+    parser.add_argument('--statistic', default='mean', choices=['mean', 'median'], help='statistic across events')
+    args = parser.parse_args(argv)
+
+    results = analyze_significance(length=args.length, t0=args.t0, n_resamples=args.resamples,
+                                   statistic=args.statistic, workers=args.workers)
+    for (name, event_type), result in results.items():
+        print('{} around {} ({} of the % change across events, {} placebo draws):'
+              .format(name, event_type, args.statistic, args.resamples))
+        print(result.round(3).to_string())
+        print()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
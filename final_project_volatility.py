@@ -0,0 +1,265 @@
+"""
+IS597 Spring 2021 Final Project
+Group members: Kangyang Wang, Wendy Zhu, and Kay Avila
+
+Volatility of the S&P 500 and Dow Jones around the events, for the second hypothesis: the indexes will be more volatile
+after the start of the wars/pandemics.  The plots only show the month to month changes, so this measures the
+volatility directly, comparing the years before each event started with the years after.
+
+A VolatilityIndex makes one pass over a series (monthly or daily) and keeps running sums of its log returns and their
+squares, and a table of the highs, lows and worst drop of every block of 1, 2, 4, ... periods.  After that, the
+standard deviation and realized volatility of any window are two subtractions, and its maximum drawdown combines at
+most log2(window) blocks.  All the windows are answered at once with array operations, so thousands of events and any
+number of window widths cost little more than the single pass.
+
+    python final_project_volatility.py --length 5
+"""
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+from typing import Union, Literal
+
+import final_project as fp
+
+
+class VolatilityIndex:
+    """ The running sums and drawdown table of one market index series, answering volatility questions about any
+    window of it.  Returns are log returns, so a window's returns add up to its overall change.
+
+    >>> prices = pd.DataFrame({'month_ordinal': np.arange(24000, 24008), \
+                               'real': [100., 110., 99., 104., 90., 95., 120., 108.]})
+    >>> index = VolatilityIndex.from_monthly(prices)
+    >>> stats = index.window_stats(np.array([0, 2]), np.array([8, 6]))
+    >>> stats['std'].round(6), stats['max_drawdown'].round(6)
+    (array([0.13618 , 0.113331]), array([0.181818, 0.134615]))
+    >>> returns = pd.Series(np.log(prices['real'])).diff()
+    >>> round(returns.std(), 6), round(returns[3:6].std(), 6)
+    (0.13618, 0.113331)
+    """
+    def __init__(self, periods: np.ndarray, values: np.ndarray, periods_per_year: int,
+                 resolution: Literal['monthly', 'daily']):
+        """ Makes the pass over the series.
+
+        :param periods: The period of each value, in increasing order: month ordinals for monthly data, days since
+                        1970-01-01 for daily data
+        :param values: The index value at each period (all positive)
+        :param periods_per_year: The number of periods in a year, to annualize the volatility
+        :param resolution: "monthly" or "daily", for finding the periods of a year
+        """
+        self.periods = np.asarray(periods, dtype='int64')
+        values = np.asarray(values, dtype='float64')
+        if np.any(np.diff(self.periods) <= 0):
+            raise ValueError('The periods must be in increasing order')
+        if np.any(~(values > 0)):
+            raise ValueError('The index values must all be positive')
+        self.periods_per_year = periods_per_year
+        self.resolution = resolution
+        self.log_values = np.log(values)
+
+        # returns[i] is the log return from position i - 1 to i, so a window of positions [first, last) has the
+        # returns first + 1 .. last - 1.  They are centered before being summed, which keeps the variances accurate.
+        returns = np.diff(self.log_values)
+        self.center = returns.mean() if len(returns) else 0.
+        centered = np.concatenate([[0.], returns - self.center])
+        self.sum_returns = np.concatenate([[0.], np.cumsum(centered)])
+        self.sum_squares = np.concatenate([[0.], np.cumsum(centered ** 2)])
+
+        # Level k holds, for the block of 2 ** k positions starting at each position, its highest and lowest log value
+        # and its largest drop from a high to a later low
+        self.highs, self.lows, self.drops = [self.log_values], [self.log_values], [np.zeros(len(values))]
+        width = 1
+        while 2 * width <= len(values):
+            high, low, drop = self.highs[-1], self.lows[-1], self.drops[-1]
+            n = len(values) - 2 * width + 1
+            self.highs.append(np.maximum(high[:n], high[width:width + n]))
+            self.lows.append(np.minimum(low[:n], low[width:width + n]))
+            self.drops.append(np.maximum(np.maximum(drop[:n], drop[width:width + n]), high[:n] - low[width:width + n]))
+            width *= 2
+
+    @classmethod
+    def from_monthly(cls, df_index: pd.DataFrame, data_type: Literal['real', 'nominal'] = 'real') \
+            -> 'VolatilityIndex':
+        """ Sets up the monthly data from read_index_monthly().
+
+        :param df_index: The monthly data, with "month_ordinal" and data_type columns
+        :param data_type: "real" or "nominal"
+        :return: The index
+        """
+        return cls(df_index['month_ordinal'].to_numpy(), df_index[data_type].to_numpy(), 12, 'monthly')
+
+    @classmethod
+    def from_daily(cls, df_index: pd.DataFrame) -> 'VolatilityIndex':
+        """ Sets up the daily data from read_index_daily(), which is nominal only.
+
+        :param df_index: The daily data, with "date" and "nominal" columns
+        :return: The index
+        """
+        days = df_index['date'].to_numpy().astype('datetime64[D]').astype('int64')
+        return cls(days, df_index['nominal'].to_numpy(), fp.TRADING_DAYS_PER_YEAR, 'daily')
+
+    def __len__(self) -> int:
+        return len(self.periods)
+
+    def year_positions(self, years: Union[np.ndarray, list]) -> np.ndarray:
+        """ Finds the first position in or after January 1 of each year.
+
+        :param years: The years
+        :return: The positions (the length of the series for years after its end)
+        """
+        years = np.asarray(years, dtype='int64')
+        if self.resolution == 'monthly':
+            first_periods = years * 12
+        else:
+            first_periods = (years - 1970).astype('datetime64[Y]').astype('datetime64[D]').astype('int64')
+        return np.searchsorted(self.periods, first_periods, side='left')
+
+    def year_windows(self, first_years: Union[np.ndarray, list], last_years: Union[np.ndarray, list]) -> tuple:
+        """ Finds the windows of positions running from the start of the first years to the end of the last years.
+        Windows not covered by the data (or with no returns in them) are marked as missing.
+
+        :param first_years: The first year of each window
+        :param last_years: The last year of each window
+        :return: The first positions, the positions after the last, and a mask of the windows that are covered
+        """
+        first_years, last_years = np.asarray(first_years, dtype='int64'), np.asarray(last_years, dtype='int64')
+        first, last = self.year_positions(first_years), self.year_positions(last_years + 1)
+
+        # The data has to reach back before the first year and on past the last one for the window to be whole
+        covered = (self.year_positions(first_years - 1) < first) & (last < len(self)) & (last - first > 1)
+        return first, last, covered
+
+    def window_stats(self, first: np.ndarray, last: np.ndarray) -> dict:
+        """ Measures the volatility of windows of the series, all at once.
+
+        :param first: The first position of each window
+        :param last: The position after the last one in each window
+        :return: A dict of arrays: "std", the standard deviation of the log returns in each window (as pandas, with
+                 ddof=1), "realized_volatility", the annualized root mean square of the log returns, and
+                 "max_drawdown", the largest fall from a high to a later low within the window as a fraction of the
+                 high.  Windows with fewer than two values (or two returns, for "std") are NaN.
+        """
+        first, last = np.asarray(first, dtype='int64'), np.asarray(last, dtype='int64')
+        valid = (first >= 0) & (last <= len(self)) & (last - first > 1)
+        first, last = np.where(valid, first, 0), np.where(valid, last, 0)
+
+        # The returns in the window are those at positions first + 1 .. last - 1
+        n_returns = (last - first - 1).astype('float64')
+        sums = self.sum_returns[last] - self.sum_returns[first + 1]
+        squares = self.sum_squares[last] - self.sum_squares[first + 1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            variance = np.maximum(squares - sums ** 2 / n_returns, 0) / (n_returns - 1)
+            mean_square = (squares + 2 * self.center * sums) / n_returns + self.center ** 2
+        std = np.where(valid & (n_returns > 1), np.sqrt(variance), np.nan)
+        realized = np.where(valid, np.sqrt(np.maximum(mean_square, 0) * self.periods_per_year), np.nan)
+
+        # Combine the blocks making up each window from left to right, largest first
+        high = np.full(len(first), -np.inf)
+        low = np.full(len(first), np.inf)
+        drop = np.zeros(len(first))
+        position, remaining = first.copy(), last - first
+        for level in range(len(self.highs) - 1, -1, -1):
+            take = remaining >= 2 ** level
+            if not take.any():
+                continue
+            at = position[take]
+            drop[take] = np.maximum(np.maximum(drop[take], self.drops[level][at]), high[take] - self.lows[level][at])
+            high[take] = np.maximum(high[take], self.highs[level][at])
+            position[take] += 2 ** level
+            remaining[take] -= 2 ** level
+        max_drawdown = np.where(valid, 1 - np.exp(-drop), np.nan)
+
+        return {'std': std, 'realized_volatility': realized, 'max_drawdown': max_drawdown}
+
+    def rolling_std(self, width: int) -> np.ndarray:
+        """ The rolling standard deviation of the log returns over the whole series, as pandas' rolling(width).std()
+        of the log returns would give.
+
+        :param width: The number of returns in each window
+        :return: The standard deviation of the width returns up to each position (NaN until there are enough)
+
+        >>> index = VolatilityIndex(np.arange(6), [100., 110., 99., 104., 90., 95.], 12, 'monthly')
+        >>> index.rolling_std(3).round(6)
+        array([     nan,      nan,      nan, 0.105118, 0.102492, 0.113331])
+        >>> pd.Series(np.log([100., 110., 99., 104., 90., 95.])).diff().rolling(3).std().round(6).tolist()[3:]
+        [0.105118, 0.102492, 0.113331]
+        """
+        positions = np.arange(len(self))
+        return self.window_stats(positions - width, positions + 1)['std']
+
+
+def event_volatility(index: VolatilityIndex, events: pd.DataFrame, length: int,
+                     t0: Literal['start_year', 'end_year', 'year_before_end_year', 'year_after_start_year']
+                     = 'start_year') -> pd.DataFrame:
+    """ Compares the volatility of an index in the years before each event with the years after.
+
+    :param index: The index
+    :param events: The events, with "Event_Name", "Start_Year" and "End_Year" columns, e.g. from read_event_facts()
+    :param length: The number of years in each window
+    :param t0: The year splitting the windows: "before" is the length years before it, "after" is it and the
+               length - 1 years after
+    :return: A dataframe indexed by event, with the std, realized_volatility and max_drawdown (as in
+             VolatilityIndex.window_stats()) before and after, for the events the data covers
+
+    >>> index = VolatilityIndex.from_monthly(fp.read_index_monthly('data/sp500_monthly.csv'))
+    >>> wars = fp.read_event_facts('data/event_facts.csv', types='War')
+    >>> event_volatility(index, wars, 5)[['realized_volatility_before', 'realized_volatility_after']].round(3) \
+        # doctest: +NORMALIZE_WHITESPACE
+                              realized_volatility_before  realized_volatility_after
+    Event_Name
+    Korean War                                     0.162                      0.123
+    Vietnam War                                    0.128                      0.101
+    World War II                                   0.262                      0.212
+    Gulf War                                       0.183                      0.122
+    Civil war in Afghanistan                       0.103                      0.165
+    War on Terror                                  0.165                      0.153
+    Iraq War                                       0.192                      0.092
+    War in Somalia                                 0.153                      0.181
+    """
+    zero_years = np.asarray(fp.zero_point_years(events, t0), dtype='int64')
+    covered = np.ones(len(events), dtype=bool)
+    stats = {}
+    for side, first_years in [('before', zero_years - length), ('after', zero_years)]:
+        first, last, side_covered = index.year_windows(first_years, first_years + length - 1)
+        covered &= side_covered
+        stats[side] = index.window_stats(first, last)
+
+    columns = {'{}_{}'.format(name, side): stats[side][name]
+               for name in ['std', 'realized_volatility', 'max_drawdown'] for side in ['before', 'after']}
+    df = pd.DataFrame(columns, index=pd.Index(events['Event_Name'].to_numpy(), name='Event_Name'))
+    return df[covered]
+
+
+def main(argv: Union[list, None] = None) -> None:
+    """
+    Prints how many wars and pandemics saw the indexes become more volatile after they started.
+    :param argv: The command line arguments (defaults to sys.argv)
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description='Compare index volatility before and after each event.')
+    parser.add_argument('--length', type=int, default=5, help='years in each window (default: %(default)s)')
+    parser.add_argument('--t0', default='start_year', choices=['start_year', 'end_year', 'year_before_end_year',
+                                                              'year_after_start_year'],
+                        help='year splitting the windows (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    events = fp.read_event_facts(fp.DEFAULT_INPUTS['events'])
+    indexes = {'S&P 500 monthly (real)':
+                   VolatilityIndex.from_monthly(fp.read_index_monthly(fp.DEFAULT_INPUTS['sp500'])),
+               'Dow Jones monthly (real)':
+                   VolatilityIndex.from_monthly(fp.read_index_monthly(fp.DEFAULT_INPUTS['dowjones'])),
+               'S&P 500 daily': VolatilityIndex.from_daily(fp.read_index_daily(fp.DAILY_INDEX_INPUTS['sp500'])),
+               'Dow Jones daily': VolatilityIndex.from_daily(fp.read_index_daily(fp.DAILY_INDEX_INPUTS['dowjones']))}
+
+    for name, index in indexes.items():
+        for event_type in ['War', 'Pandemics']:
+            df = event_volatility(index, events[events['Type'] == event_type], args.length, args.t0)
+            more_volatile = (df['realized_volatility_after'] > df['realized_volatility_before']).sum()
+            print('{}, {}: {} of {} events more volatile in the {} years after, median realized volatility {:.3f} '
+                  'before and {:.3f} after'.format(name, event_type, more_volatile, len(df), args.length,
+                                                   df['realized_volatility_before'].median(),
+                                                   df['realized_volatility_after'].median()))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,10 +1,17 @@
 from setuptools import setup, Extension
 
-module = Extension ('final_project_cython', sources=['final_project_cython_functions.pyx'])
+# Build from the .pyx file if Cython is installed, otherwise from the C file generated from it
+try:
+    from Cython.Build import cythonize
+except ImportError:
+    cythonize = None
+
+source = 'final_project_cython/final_project_cython_functions.' + ('pyx' if cythonize else 'c')
+module = Extension('final_project_cython.final_project_cython_functions', sources=[source])
 
 setup(
     name='cythonTest',
     version='1.0',
     author='Kay Avila, Kangyang Wang, Wendy Zhu',
-    ext_modules=[module]
-)
\ No newline at end of file
+    ext_modules=cythonize([module]) if cythonize else [module]
+)